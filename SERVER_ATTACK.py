@@ -1,26 +1,62 @@
 #!/usr/bin/env python3
 from fastapi import FastAPI, HTTPException, Header
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from typing import List
+import asyncio
 import subprocess
 import os
 import time
-import json
-from collections import defaultdict, deque
-import threading
+
+from jsonl_writer import JsonlWriter
+from binlog import BinaryLogWriter, log_format
+from rate_limit import make_limiter
 
 app = FastAPI(title="CAN API")
 
 # ====== RATE LIMIT CONFIG ======
-RATE_LIMIT_MAX = 100        # max allowed requests per window
+RATE_LIMIT_MAX = int(os.environ.get("RATE_LIMIT_MAX", "100"))   # max allowed requests per window
 RATE_LIMIT_WINDOW = 60.0    # seconds (sliding window)
 BAN_DURATION = 10.0         # seconds to ignore messages
+# "sliding_window" (default), "token_bucket" or "deque" (exact log, old design)
+RATE_LIMITER = os.environ.get("RATE_LIMITER", "sliding_window")
+
+_limiter = make_limiter(RATE_LIMITER, RATE_LIMIT_MAX, RATE_LIMIT_WINDOW, BAN_DURATION)
+
+# ====== BATCH CONFIG ======
+BATCH_MAX_FRAMES = RATE_LIMIT_MAX   # a bigger batch could never pass the limiter
+BATCH_MAX_DELAY = 10.0              # seconds of total inter-frame delay per batch
 
-_rate_lock = threading.Lock()
-_request_log = defaultdict(deque)   # secret_tag -> deque[timestamps]
-_banned_until = {}                  # secret_tag -> timestamp
+# Used when a client doesn't send X-Team-Id
+TEAM_ID_DEFAULT = os.environ.get("TEAM_ID_DEFAULT", "00")
 
 # ====== LOG FILE CONFIG ======
-LOG_PATH = "/opt/ctf_logs/logs/can_log.jsonl"
+LOG_PATH = os.environ.get("CAN_LOG_PATH", "/opt/ctf_logs/logs/can_log.jsonl")
+# fsync policy for LOG_PATH: never / always / records:N / ms:T (see jsonl_writer.py)
+LOG_FSYNC = os.environ.get("LOG_FSYNC", "never")
+# Optional compact binary log (see binlog.py), empty = off
+BIN_LOG_FILE = os.environ.get("BIN_LOG_FILE", "")
+# jsonl / binary / both (default both when BIN_LOG_FILE is set)
+LOG_FORMAT = log_format(BIN_LOG_FILE, "API")
+
+_log_writer = None
+_bin_writer = None
+
+# ====== CAN SEND BACKEND ======
+# "native"     -> python-can SocketCAN bus kept open per interface (default)
+# "subprocess" -> fork the can-utils `cansend` binary per frame (old behaviour)
+# "noop"       -> log only, nothing is put on a bus (load tests, see bench_servers.py)
+CANSEND_BACKEND = os.environ.get("CANSEND_BACKEND", "native")
+
+try:
+    import can
+    from can_native import BusPool, frame_to_message
+except ImportError as e:
+    if CANSEND_BACKEND == "native":
+        print(f"[API] python-can not available ({e}), falling back to subprocess cansend", flush=True)
+        CANSEND_BACKEND = "subprocess"
+
+_bus_pool = BusPool() if CANSEND_BACKEND == "native" else None
 
 
 class CanSendRequest(BaseModel):
@@ -28,31 +64,22 @@ class CanSendRequest(BaseModel):
     frame: str    # e.g. "123#DEADBEEF"
 
 
-def check_rate_limit(secret_tag: str):
-    """
-    Returns (allowed: bool, seconds_remaining: int)
-    """
-    now = time.time()
-    with _rate_lock:
-        # Already banned?
-        until = _banned_until.get(secret_tag)
-        if until and now < until:
-            return False, int(until - now)
+class CanBatchFrame(BaseModel):
+    frame: str              # e.g. "123#DEADBEEF"
+    delay_ms: float = 0.0   # wait this long after the previous frame
 
-        # Clean old timestamps
-        q = _request_log[secret_tag]
-        while q and now - q[0] > RATE_LIMIT_WINDOW:
-            q.popleft()
 
-        q.append(now)
+class CanSendBatchRequest(BaseModel):
+    interface: str = "can0"
+    frames: List[CanBatchFrame]
 
-        # Check if limit exceeded
-        if len(q) > RATE_LIMIT_MAX:
-            _banned_until[secret_tag] = now + BAN_DURATION
-            _request_log[secret_tag].clear()
-            return False, int(BAN_DURATION)
 
-    return True, 0
+def check_rate_limit(secret_tag: str, cost: int = 1):
+    """
+    Returns (allowed: bool, seconds_remaining: int)
+    cost = how many frames this request counts as (batch requests pay per frame)
+    """
+    return _limiter.check(secret_tag, cost)
 
 
 def parse_frame(frame: str):
@@ -88,7 +115,7 @@ def write_json_log(
     timestamp: float,
 ):
     """
-    Append one JSON line into /opt/ctf_logs/logs/can_log.jsonl
+    Queue one JSON line for /opt/ctf_logs/logs/can_log.jsonl
     """
     can_id, can_dlc, can_data = parse_frame(frame)
     can_time = f"{timestamp:.2f}"  # same style as your example
@@ -107,16 +134,30 @@ def write_json_log(
         "raw": raw,
     }
 
-    # Make sure directory exists
-    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+    # Queued for the group-commit writer; write errors are printed there
+    if LOG_FORMAT != "binary":
+        get_log_writer().write(record)
+
+    if LOG_FORMAT != "jsonl":
+        try:
+            # cansend syntax: 8-digit IDs are extended whatever their value
+            get_bin_writer().write_record(record, ts=timestamp, extended=len(can_id) == 8)
+        except Exception as e:
+            print(f"[API] binary log write failed: {e}", flush=True)
 
-    try:
-        with open(LOG_PATH, "a", encoding="utf-8") as f:
-            json.dump(record, f)
-            f.write("\n")
-    except Exception as e:
-        # Don't crash the API if log file write fails
-        print(f"[API] JSON log write failed: {e}", flush=True)
+
+def get_log_writer() -> JsonlWriter:
+    global _log_writer
+    if _log_writer is None:
+        _log_writer = JsonlWriter(LOG_PATH, fsync=LOG_FSYNC, tag="API")
+    return _log_writer
+
+
+def get_bin_writer() -> BinaryLogWriter:
+    global _bin_writer
+    if _bin_writer is None:
+        _bin_writer = BinaryLogWriter(BIN_LOG_FILE)
+    return _bin_writer
 
 
 def log_and_cansend(
@@ -139,6 +180,25 @@ def log_and_cansend(
         timestamp=now,
     )
 
+    send_frame(interface, frame)
+
+
+def send_frame(interface: str, frame: str):
+    """
+    Put one cansend-style frame on the bus.
+    Any failure (bad frame, missing interface, send error) raises RuntimeError.
+    """
+    if CANSEND_BACKEND == "noop":
+        return
+
+    if CANSEND_BACKEND == "native":
+        try:
+            msg = frame_to_message(frame)
+            _bus_pool.send(interface, msg)
+        except (ValueError, OSError, can.CanError) as e:
+            raise RuntimeError(f"cansend failed: {e}")
+        return
+
     try:
         subprocess.run(
             ["cansend", interface, frame],
@@ -148,15 +208,11 @@ def log_and_cansend(
         raise RuntimeError(f"cansend failed: {e}")
 
 
-@app.post("/api/cansend")
-def cansend_endpoint(
-    body: CanSendRequest,
-    x_secret_tag: str = Header(default=None),
-    x_team_id: str = Header(default=None),
-):
-    if not body.frame:
-        raise HTTPException(status_code=400, detail="Missing frame")
-
+def authorize(x_secret_tag: str, x_team_id: str, cost: int = 1):
+    """
+    Check headers and charge the rate limiter.
+    Returns (secret_tag, team_id) or raises 401 / 429.
+    """
     # Require secret tag
     if not x_secret_tag:
         raise HTTPException(
@@ -167,13 +223,28 @@ def cansend_endpoint(
     secret_tag = x_secret_tag.strip()
     team_id = (x_team_id or TEAM_ID_DEFAULT).strip()
     # Rate limit by secret_tag
-    allowed, wait_sec = check_rate_limit(secret_tag)
+    allowed, wait_sec = check_rate_limit(secret_tag, cost)
     if not allowed:
         raise HTTPException(
             status_code=429,
-            detail=f"Rate limit exceeded. Try again in {wait_sec} seconds."
+            detail=f"Rate limit exceeded. Try again in {wait_sec} seconds.",
+            headers={"Retry-After": str(wait_sec)},
         )
 
+    return secret_tag, team_id
+
+
+@app.post("/api/cansend")
+def cansend_endpoint(
+    body: CanSendRequest,
+    x_secret_tag: str = Header(default=None),
+    x_team_id: str = Header(default=None),
+):
+    if not body.frame:
+        raise HTTPException(status_code=400, detail="Missing frame")
+
+    secret_tag, team_id = authorize(x_secret_tag, x_team_id)
+
     # Process CAN message (log + cansend)
     try:
         log_and_cansend(
@@ -193,6 +264,93 @@ def cansend_endpoint(
     }
 
 
+@app.post("/api/cansend/batch")
+async def cansend_batch_endpoint(
+    body: CanSendBatchRequest,
+    x_secret_tag: str = Header(default=None),
+    x_team_id: str = Header(default=None),
+):
+    """
+    Send several frames in one request. Every frame is charged against the
+    rate limit. delay_ms is measured from the previous frame's scheduled
+    time, so the spacing does not drift with send/log overhead.
+    Delays are awaited on the event loop, so a waiting batch does not hold
+    a threadpool worker; the sends themselves run in the threadpool.
+    """
+    if not body.frames:
+        raise HTTPException(status_code=400, detail="Missing frames")
+    if len(body.frames) > BATCH_MAX_FRAMES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many frames in batch ({len(body.frames)} > {BATCH_MAX_FRAMES})"
+        )
+    for i, item in enumerate(body.frames):
+        if not item.frame:
+            raise HTTPException(status_code=400, detail=f"Missing frame at index {i}")
+        if item.delay_ms < 0:
+            raise HTTPException(status_code=400, detail=f"Negative delay_ms at index {i}")
+    total_delay = sum(item.delay_ms for item in body.frames) / 1000.0
+    if total_delay > BATCH_MAX_DELAY:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Total delay {total_delay:.1f}s exceeds {BATCH_MAX_DELAY:.1f}s"
+        )
+
+    secret_tag, team_id = authorize(x_secret_tag, x_team_id, cost=len(body.frames))
+
+    frames = body.frames
+    next_time = time.monotonic()
+    i = 0
+    while i < len(frames):
+        if frames[i].delay_ms > 0:
+            next_time += frames[i].delay_ms / 1000.0
+            sleep_time = next_time - time.monotonic()
+            if sleep_time > 0:
+                await asyncio.sleep(sleep_time)
+
+        # This frame and the undelayed ones right after it go out in one hop
+        end = i + 1
+        while end < len(frames) and frames[end].delay_ms <= 0:
+            end += 1
+        await run_in_threadpool(send_batch_frames, body, i, end, secret_tag, team_id)
+        i = end
+
+    return {
+        "status": "ok",
+        "interface": body.interface,
+        "sent": len(body.frames),
+    }
+
+
+def send_batch_frames(body: CanSendBatchRequest, start: int, end: int, secret_tag: str, team_id: str):
+    """Log + send body.frames[start:end]; a failure is a 500 saying how many went out."""
+    for i in range(start, end):
+        item = body.frames[i]
+        try:
+            log_and_cansend(
+                interface=body.interface,
+                frame=item.frame,
+                user="api",
+                secret_tag=secret_tag,
+                team_id=team_id,
+            )
+        except RuntimeError as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Frame {i} ({item.frame}): {e}. {i} of {len(body.frames)} frames were sent."
+            )
+
+
 @app.get("/api/health")
 def health():
     return {"status": "ok"}
+
+
+@app.on_event("shutdown")
+def close_buses():
+    if _bus_pool is not None:
+        _bus_pool.close()
+    if _log_writer is not None:
+        _log_writer.close()
+    if _bin_writer is not None:
+        _bin_writer.close()
@@ -15,18 +15,25 @@ Host-side:
         "secret_tag": "b6999312-7dda-44c3-bf90-e96aa60d27fa"
     }
 - Appends it as a JSON line to /opt/ctf_logs/ids_report.jsonl
+- Also listens on /api/report/batch for many reports per request
+  (JSON array, or NDJSON with Content-Type: application/x-ndjson)
+- All appends go through one writer thread that keeps the file open and
+  flushes every REPORT_FLUSH_RECORDS lines or REPORT_FLUSH_MS milliseconds
 
 
 RUN CODE : python3 -m uvicorn listener_api:app --host 0.0.0.0 --port 9000
 """
 
-from fastapi import FastAPI, HTTPException, status
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
 from datetime import datetime, timezone
 import os
 import json
 import sys
 
+from jsonl_writer import JsonlWriter
+
 #LOG_FILE = "/opt/ctf_logs/ids_report.jsonl"
 #os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
@@ -41,9 +48,24 @@ except OSError as e:
     LOG_FILE = os.path.join(LOG_DIR, "ids_report.jsonl")
     os.makedirs(LOG_DIR, exist_ok=True)
 
+REPORT_FLUSH_RECORDS = int(os.environ.get("REPORT_FLUSH_RECORDS", "1000"))
+REPORT_FLUSH_MS = float(os.environ.get("REPORT_FLUSH_MS", "100"))
+REPORT_BATCH_MAX = int(os.environ.get("REPORT_BATCH_MAX", "10000"))
+
 app = FastAPI(title="IDS Listener")
 
 
+# Single long-lived appender: request handlers only queue lines, the writer
+# thread coalesces them from every team into one write() per flush
+writer = JsonlWriter(LOG_FILE, flush_ms=REPORT_FLUSH_MS, flush_records=REPORT_FLUSH_RECORDS,
+                     tag="WRITER")
+
+
+@app.on_event("shutdown")
+def stop_writer():
+    writer.close()
+
+
 class CanReport(BaseModel):
     team_id: str
     can_time: str
@@ -58,15 +80,66 @@ def health():
     return {"status": "ok"}
 
 
-@app.post("/api/report")
-def report(body: CanReport):
-    entry = body.dict()
-    entry["server_ts"] = datetime.now(timezone.utc).isoformat()
+def to_line(report: CanReport, server_ts: str) -> str:
+    entry = report.dict()
+    entry["server_ts"] = server_ts
+    return json.dumps(entry, ensure_ascii=False) + "\n"
 
-    try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-    except Exception as e:
+
+def check_writer():
+    # Set while the log file is failing; the writer retries it every second
+    # and clears the error once it can write again
+    if writer.error is not None:
         # return a controlled 500 with error detail
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                            detail=f"Failed to write log file: {e}")
+                            detail=f"Failed to write log file: {writer.error}")
+
+
+@app.post("/api/report")
+def report(body: CanReport):
+    check_writer()
+    writer.write_line(to_line(body, datetime.now(timezone.utc).isoformat()))
+
+
+@app.post("/api/report/batch")
+async def report_batch(request: Request):
+    """
+    Accepts a JSON array of CanReport objects, or NDJSON (one CanReport per
+    line) when Content-Type is application/x-ndjson. All-or-nothing: if any
+    item is invalid nothing from the request is written.
+    """
+    check_writer()
+    raw = await request.body()
+    content_type = request.headers.get("content-type", "")
+    # Parsing / validating up to REPORT_BATCH_MAX items and write_lines()
+    # (which blocks when the writer is backed up) stay off the event loop
+    return await run_in_threadpool(accept_batch, raw, content_type)
+
+
+def accept_batch(raw: bytes, content_type: str) -> dict:
+    try:
+        if "ndjson" in content_type:
+            items = [json.loads(line) for line in raw.splitlines() if line.strip()]
+        else:
+            items = json.loads(raw)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of reports")
+    if len(items) > REPORT_BATCH_MAX:
+        raise HTTPException(status_code=413,
+                            detail=f"Batch too large ({len(items)} > {REPORT_BATCH_MAX})")
+
+    server_ts = datetime.now(timezone.utc).isoformat()
+    lines = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise HTTPException(status_code=422, detail=f"Item {i}: expected an object")
+        try:
+            lines.append(to_line(CanReport(**item), server_ts))
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Item {i}: {e}")
+
+    writer.write_lines(lines)
+    return {"status": "ok", "accepted": len(lines)}
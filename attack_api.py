@@ -4,6 +4,8 @@ from pydantic import BaseModel
 import subprocess
 import os
 
+from entry import log_cansend
+
 app = FastAPI(title="CAN API")
 
 API_KEY = os.environ.get("API_KEY", "")
@@ -15,14 +17,9 @@ class CanSendRequest(BaseModel):
 
 
 def log_and_cansend(interface: str, frame: str, user: str = 'api'):
-    msg = f'CMD=cansend IF={interface} ARGS="{interface} {frame}" USER={user}'
-
-    # Log the message 
+    # Log the message (in-process, queued to the shared log writer)
     try:
-        subprocess.run(
-            ["python3", "/app/entry.py", "log", msg],
-            check=False,
-        )
+        log_cansend(interface, frame, user)
     except Exception as e:
         # Don't kill API if logging fails
         print(f"[API] logging failed: {e}", flush=True)
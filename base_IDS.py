@@ -5,49 +5,140 @@ base_IDS.py  (core defense forwarder)
 - Listens on CAN_INPUT_IF (default can0)
 - Forwards to CAN_OUTPUT_IF (default vcan0)
 - Logs every frame and sends report to REPORT_URL
+  (batched in the background by ids_reporter.BatchReporter)
 - Uses a handle_frame() function provided by user_custom.py
+- Optional declarative rules (FILTER_RULES, see frame_filter.py) decide
+  forward / drop per frame from a precompiled table before handle_frame
+- Receive, filter / forward, logging and reporting run as separate
+  threads joined by bounded queues (FWD_PIPELINE, see fwd_pipeline.py)
+- IDs the rules always drop are filtered in the kernel (CAN_RAW_FILTER),
+  and can_time is the kernel receive timestamp (CAN_TIME_DECIMALS)
+- Batch receive (RECV_MODE, see batch_recv.py) drains whole bursts per
+  call and can hand them to an optional handle_frames(batch, ...) hook
+- `detector` (ids_detector.TimingDetector) flags per-ID timing anomalies;
+  handle_frame can call detector.observe(msg), DETECT=log/drop makes
+  the forwarder run it on every frame
 """
 
 import os
 import sys
-import json
-import requests
+import threading
+import time
 import can
 
+from ids_reporter import BatchReporter
+from jsonl_writer import JsonlWriter
+from binlog import BinaryLogWriter, log_format
+from frame_filter import FORWARD, DROP, load_filter
+from ids_detector import NEW_ID, TimingDetector
+from fwd_pipeline import Stage, format_stats
+from batch_recv import BatchReceiver
+
 # ===== ENVIRONMENT =====
 TEAM_ID    = os.environ.get("TEAM_ID") or os.environ.get("TEAM_NUM", "00")
 SECRET_TAG = os.environ.get("SECRET_TAG", "no-secret")
 
+CAN_INPUT_IF  = os.environ.get("CAN_INPUT_IF", "can0")
+CAN_OUTPUT_IF = os.environ.get("CAN_OUTPUT_IF", "vcan0")
+CAN_BUSTYPE   = os.environ.get("CAN_BUSTYPE", "socketcan")
+
 REPORT_URL = os.environ.get("REPORT_URL", "http://0.0.0.0:9000/api/report")
 LOG_FILE   = os.environ.get("LOG_FILE", "/logs/forwarder_log.jsonl")
+# Optional compact binary log (see binlog.py), empty = off
+BIN_LOG_FILE = os.environ.get("BIN_LOG_FILE", "")
+# jsonl / binary / both (default both when BIN_LOG_FILE is set)
+LOG_FORMAT = log_format(BIN_LOG_FILE, "LOG")
+# Optional JSON / YAML rule file (see frame_filter.py), empty = off
+FILTER_RULES = os.environ.get("FILTER_RULES", "")
+# Push the always-dropped IDs of FILTER_RULES down into the can0 socket (CAN_RAW_FILTER): on / off
+KERNEL_FILTER = os.environ.get("KERNEL_FILTER", "on")
+# Decimals of can_time; the value is the kernel receive timestamp (SO_TIMESTAMPNS),
+# 2 keeps the original report format, 6 keeps microseconds
+CAN_TIME_DECIMALS = int(os.environ.get("CAN_TIME_DECIMALS", "2"))
+# frame = one recv() per frame, batch = drain every waiting frame per call (batch_recv.py),
+# auto = batch when a handle_frames() hook is given
+RECV_MODE = os.environ.get("RECV_MODE", "auto")
+# Timing detector in the forwarder: off / log (print alerts) / drop (also drop flagged frames)
+DETECT = os.environ.get("DETECT", "off")
+ALERT_PRINT_S = 1.0     # at most one alert line per second
+# threads = receive / forward / log / report stages (fwd_pipeline.py), off = one loop
+FWD_PIPELINE = os.environ.get("FWD_PIPELINE", "threads")
+FWD_STATS_S = float(os.environ.get("FWD_STATS_S", "0"))    # print stage stats every N s, 0 = at exit only
+# Full log queue: block (back-pressure, every forwarded frame is logged) or drop
+FWD_LOG_QUEUE = os.environ.get("FWD_LOG_QUEUE", "block")
+DROP_PRINT_S = 1.0      # at most one "queue full" line per stage per second
+# GIL hand-over interval: short, so the forward thread isn't held up by log / report work
+FWD_SWITCH_INTERVAL = 0.001
+
+_log_writer = None
+_bin_writer = None
+_last_alert_print = 0.0
+_stages = []
+
+# Shared per-ID timing detector (see ids_detector.py), usable from handle_frame
+detector = TimingDetector()
 
 
 # -------- Build full log JSON (same format as original) --------
+class FrameRecord(dict):
+    """The JSON record, plus the unrounded frame time and ID type for the binary log."""
+    __slots__ = ("ts", "extended")
+
+
 def build_record(msg: can.Message):
-    return {
+    # msg.timestamp is when the kernel received the frame, not when we got to it
+    ts = msg.timestamp or time.time()
+    record = FrameRecord({
         "team_id": str(TEAM_ID),
         "secret_tag": SECRET_TAG,
-        "can_time": f"{msg.timestamp:.2f}",
+        "can_time": f"{ts:.{CAN_TIME_DECIMALS}f}",
         "can_id": f"{msg.arbitration_id:03X}",
         "can_dlc": str(msg.dlc),
         "can_data": msg.data.hex().upper(),
-    }
+    })
+    record.ts = ts
+    record.extended = msg.is_extended_id
+    return record
 
 
 # -------- Logger --------
 def write_log(record: dict):
-    log_path = LOG_FILE
-    log_dir = os.path.dirname(log_path) or "/"
-    os.makedirs(log_dir, exist_ok=True)
-
+    """
+    Queue one record for LOG_FILE and / or BIN_LOG_FILE (LOG_FORMAT). The
+    shared JsonlWriter keeps the file open and handles fsync / rotation
+    (LOG_FSYNC, LOG_ROTATE_* env vars).
+    """
+    global _log_writer, _bin_writer
+    if _log_writer is None and LOG_FORMAT != "binary":
+        _log_writer = JsonlWriter(LOG_FILE, tag="LOG")
+    if _bin_writer is None and LOG_FORMAT != "jsonl":
+        _bin_writer = BinaryLogWriter(BIN_LOG_FILE)
     try:
-        with open(log_path, "a", encoding="utf-8") as f:
-            json.dump(record, f)
-            f.write("\n")
+        if _log_writer is not None:
+            _log_writer.write(record)
+        if _bin_writer is not None:
+            # can_time is rounded to CAN_TIME_DECIMALS and can_id doesn't say
+            # extended; records from build_record carry both
+            _bin_writer.write_record(record, ts=getattr(record, "ts", None),
+                                     extended=getattr(record, "extended", None))
     except Exception as e:
         print(f"[LOG] write failed: {e}", file=sys.stderr)
 
 
+def log_alert(msg: can.Message, reason: str):
+    """Print a detector alert, rate-limited to one line per ALERT_PRINT_S."""
+    global _last_alert_print
+    now = time.monotonic()
+    if now - _last_alert_print < ALERT_PRINT_S:
+        return
+    _last_alert_print = now
+    baseline = detector.baseline(msg.arbitration_id, msg.is_extended_id)
+    period = f", baseline {baseline * 1000:.1f}ms" if baseline else ""
+    label = f"{msg.arbitration_id:08X}" if msg.is_extended_id else f"{msg.arbitration_id:03X}"
+    print(f"[IDS] {label} {reason}{period} "
+          f"(alerts so far: {detector.counts[reason]})", flush=True)
+
+
 # -------- Default handle_frame (if user doesn't provide one) --------
 def default_handle_frame(msg: can.Message, out_bus: can.BusABC, build_record_fn):
     """
@@ -63,63 +154,236 @@ def default_handle_frame(msg: can.Message, out_bus: can.BusABC, build_record_fn)
     return build_record_fn(msg)
 
 
-def run_forwarder(user_handle_frame=None):
+# -------- Pipeline (FWD_PIPELINE=threads) --------
+def start_pipeline(receive, process_batch, reporter, stop: threading.Event):
+    """
+    receive thread -> forward stage -> log stage
+                                    -> report stage
+
+    Items are lists: received frames (one per recv, or a whole burst in
+    batch mode) and the records built from them.
+
+    The receive thread blocks when the forward queue is full, so the
+    backlog stays in the kernel socket buffer. The log queue blocks too
+    (FWD_LOG_QUEUE=block): the log is the scoring record, so forwarding
+    slows down rather than losing lines. The report queue drops instead,
+    so can0 -> vcan0 never waits on the network. Drops are printed as
+    they happen.
+    """
+    global _stages
+    sys.setswitchinterval(FWD_SWITCH_INTERVAL)
+    def write_logs(records):
+        for record in records:
+            write_log(record)
+
+    def report(records):
+        for record in records:
+            reporter.submit(record)
+
+    log_stage = Stage("log", write_logs, block=FWD_LOG_QUEUE != "drop")
+    report_stage = Stage("report", report)
+    last_drop_print = {}
+
+    def put(stage, records):
+        if stage.put(records):
+            return
+        now = time.monotonic()
+        if now - last_drop_print.get(stage.name, 0.0) >= DROP_PRINT_S:
+            last_drop_print[stage.name] = now
+            print(f"[IDS] {stage.name} queue full, dropped {stage.dropped} batches so far",
+                  file=sys.stderr, flush=True)
+
+    def forward(msgs):
+        records = process_batch(msgs)
+        if records:
+            put(log_stage, records)
+            put(report_stage, records)
+
+    fwd_stage = Stage("forward", forward, block=True)
+    _stages = [fwd_stage, log_stage, report_stage]
+    for stage in _stages:
+        stage.start()
+
+    def receive_loop():
+        try:
+            while not stop.is_set():
+                msgs = receive(0.5)
+                if msgs:
+                    fwd_stage.put(msgs)
+        except Exception as e:
+            print(f"[FWD] ERROR in receive: {e}", file=sys.stderr)
+            stop.set()
+
+    recv_thread = threading.Thread(target=receive_loop, name="fwd-recv", daemon=True)
+    recv_thread.start()
+    return recv_thread
+
+
+def pipeline_stats() -> dict:
+    """Per-stage queue depth / counts / wait and service latency (empty when sequential)."""
+    return {stage.name: stage.stats() for stage in _stages}
+
+
+def print_pipeline_stats():
+    for stage in _stages:
+        print(f"[FWD] {format_stats(stage)}", flush=True)
+
+
+def run_forwarder(user_handle_frame=None, rules=None, user_handle_frames=None):
     """
     Core loop. Call this from user_custom with their handle_frame.
     If user_handle_frame is None, uses default_handle_frame.
+
+    rules (a path, dict or FrameFilter; default FILTER_RULES) is checked
+    first: "forward" / "drop" verdicts never reach handle_frame, "user"
+    ones go to it as usual.
+
+    user_handle_frames(batch, out_bus, build_record) -> records, if given,
+    gets every received burst as one list instead (frames the rules
+    forward themselves are sent first) and turns on batch receive.
     """
-    if user_handle_frame is None:
+    handle_batch_fn = user_handle_frames
+    if handle_batch_fn is not None:
+        handle_fn = None
+        print("[FWD] Using user_custom.handle_frames() (batch).", flush=True)
+    elif user_handle_frame is None:
         handle_fn = default_handle_frame
         print("[FWD] Using default_handle_frame (no user filter).", flush=True)
     else:
         handle_fn = user_handle_frame
         print("[FWD] Using user_custom.handle_frame().", flush=True)
 
+    try:
+        frame_filter = load_filter(rules if rules is not None else (FILTER_RULES or None))
+    except Exception as e:
+        print(f"[FWD] ERROR loading filter rules: {e}", file=sys.stderr)
+        sys.exit(1)
+    if frame_filter is not None:
+        print(f"[FWD] Filter rules: {frame_filter.summary()}", flush=True)
+    if DETECT != "off":
+        print(f"[FWD] Detector: {DETECT}, learning for {detector.learn_s:g}s", flush=True)
+
     # DEBUG
     print(f"[FWD] Team={TEAM_ID}, tag={SECRET_TAG}")
-    print("[FWD] In=can0, Out=van0")
+    print(f"[FWD] In={CAN_INPUT_IF}, Out={CAN_OUTPUT_IF}")
     print(f"[FWD] Reporting to {REPORT_URL}", flush=True)
+    print(f"[FWD] Pipeline: {FWD_PIPELINE}", flush=True)
+
+    # Reports go through a background queue so a slow server never stalls recv()
+    reporter = BatchReporter(REPORT_URL)
+    print(f"[FWD] Report batch={reporter.batch_size}, flush={reporter.flush_interval * 1000:.0f}ms, "
+          f"queue={reporter.queue_max}, overflow={reporter.overflow}", flush=True)
+
+    # Kernel-side drop: frames only the rules would drop never wake us up
+    kernel_filters = None
+    if frame_filter is not None and KERNEL_FILTER == "on":
+        kernel_filters = frame_filter.kernel_filters()
+        if kernel_filters is not None:
+            print(f"[FWD] Kernel filters on {CAN_INPUT_IF}: {len(kernel_filters)} id/mask entries",
+                  flush=True)
 
     # CAN input
     try:
-        in_bus = can.interface.Bus(channel="can0", bustype="socketcan")
+        in_bus = can.interface.Bus(channel=CAN_INPUT_IF, bustype=CAN_BUSTYPE, can_filters=kernel_filters)
     except Exception as e:
-        print(f"[FWD] ERROR opening input can0: {e}", file=sys.stderr)
+        print(f"[FWD] ERROR opening input {CAN_INPUT_IF}: {e}", file=sys.stderr)
         sys.exit(1)
 
     # CAN output
     try:
-        out_bus = can.interface.Bus(channel="vcan0", bustype="socketcan")
+        out_bus = can.interface.Bus(channel=CAN_OUTPUT_IF, bustype=CAN_BUSTYPE)
     except Exception as e:
-        print(f"[FWD] ERROR opening output vcan0: {e}", file=sys.stderr)
+        print(f"[FWD] ERROR opening output {CAN_OUTPUT_IF}: {e}", file=sys.stderr)
         sys.exit(1)
 
-    # Main loop
-    while True:
-        msg = in_bus.recv(timeout=1.0)
-        if msg is None:
-            continue
+    # Receive: whole bursts per call in batch mode, else one frame per recv()
+    if RECV_MODE == "batch" or (RECV_MODE == "auto" and handle_batch_fn is not None):
+        receiver = BatchReceiver(in_bus)
+        receive = receiver.recv_batch
+        print(f"[FWD] Batch receive ({receiver.mode}, up to {receiver.max_batch} frames)", flush=True)
+    else:
+        def receive(timeout):
+            msg = in_bus.recv(timeout=timeout)
+            return [msg] if msg is not None else []
 
-        try:
-            record = handle_fn(msg, out_bus, build_record)
-        except Exception as e:
-            # User code crash should not kill whole forwarder
-            print(f"[FWD] ERROR in handle_frame: {e}", file=sys.stderr)
-            continue
+    def process_batch(msgs):
+        """Detector, rules and handle_frame(s) for received frames -> records."""
+        records = []
+        user_msgs = []
+        for msg in msgs:
+            try:
+                if DETECT != "off":
+                    reason = detector.observe(msg)
+                    if reason is not None:
+                        log_alert(msg, reason)
+                        # new_id is log-only: a legitimate late ID must still get through
+                        if DETECT == "drop" and reason != NEW_ID:
+                            continue
 
-        if record is None:
-            # Dropped by user filter
-            continue
+                verdict = None
+                if frame_filter is not None:
+                    verdict = frame_filter.decide(msg.arbitration_id, msg.is_extended_id,
+                                                  msg.dlc, msg.data)
+                if verdict == DROP:
+                    continue
+                if verdict == FORWARD:
+                    record = default_handle_frame(msg, out_bus, build_record)
+                elif handle_batch_fn is not None:
+                    user_msgs.append(msg)
+                    continue
+                else:
+                    record = handle_fn(msg, out_bus, build_record)
+            except Exception as e:
+                # User code crash should not kill whole forwarder
+                print(f"[FWD] ERROR in handle_frame: {e}", file=sys.stderr)
+                continue
+            if record is not None:
+                records.append(record)
 
-        # Core logging + report (same as original)
-        write_log(record)
+        if user_msgs:
+            try:
+                records.extend(r for r in handle_batch_fn(user_msgs, out_bus, build_record) or ()
+                               if r is not None)
+            except Exception as e:
+                print(f"[FWD] ERROR in handle_frames: {e}", file=sys.stderr)
+        return records
 
-        try:
-            r = requests.post(REPORT_URL, json=record, timeout=1.0)
-            if r.status_code != 200:
-                print(f"[FWD] report error {r.status_code}: {r.text}", file=sys.stderr)
-        except Exception as e:
-            print(f"[FWD] HTTP error: {e}", file=sys.stderr)
+    stop = threading.Event()
+    recv_thread = None
+    try:
+        if FWD_PIPELINE == "threads":
+            recv_thread = start_pipeline(receive, process_batch, reporter, stop)
+            last_stats = time.monotonic()
+            while not stop.wait(1.0):
+                if FWD_STATS_S and time.monotonic() - last_stats >= FWD_STATS_S:
+                    print_pipeline_stats()
+                    last_stats = time.monotonic()
+        else:
+            # Sequential loop: frames dropped by the filters produce no record
+            while True:
+                for record in process_batch(receive(1.0)):
+                    write_log(record)
+                    reporter.submit(record)
+    except KeyboardInterrupt:
+        print("[FWD] Stopping, flushing reports...", flush=True)
+    finally:
+        stop.set()
+        if recv_thread is not None:
+            recv_thread.join(2.0)
+            for stage in _stages:      # upstream first, so each drains into a live stage
+                stage.close()
+            print_pipeline_stats()
+        reporter.close()
+        print(f"[FWD] Report stats: {reporter.stats}", flush=True)
+        if detector.frames:
+            print(f"[FWD] Detector stats: {detector.stats()}", flush=True)
+            for can_id, extended, alerts in detector.top(5):
+                label = f"{can_id:08X}" if extended else f"{can_id:03X}"
+                print(f"[FWD]   {label}: {alerts} alerts", flush=True)
+        if _log_writer is not None:
+            _log_writer.close()
+        if _bin_writer is not None:
+            _bin_writer.close()
 
 
 if __name__ == "__main__":
@@ -127,11 +391,18 @@ if __name__ == "__main__":
     Optional: allow running base_IDS.py directly.
     In that case we *try* to import user_custom.handle_frame.
     """
+    # user_custom's `from base_IDS import ...` must get this module, not a second copy
+    sys.modules.setdefault("base_IDS", sys.modules[__name__])
     try:
         from user_custom import handle_frame as user_handle_frame
         print("[FWD] Loaded handle_frame() from user_custom.py", flush=True)
     except Exception as e:
         print(f"[FWD] WARNING: could not import user_custom.handle_frame: {e}", file=sys.stderr)
         user_handle_frame = None
+    try:
+        from user_custom import handle_frames as user_handle_frames
+        print("[FWD] Loaded handle_frames() from user_custom.py", flush=True)
+    except Exception:
+        user_handle_frames = None
 
-    run_forwarder(user_handle_frame)
+    run_forwarder(user_handle_frame, user_handle_frames=user_handle_frames)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+batch_recv.py  (drain every waiting CAN frame in one go for base_IDS)
+
+BatchReceiver.recv_batch(timeout) waits until the socket is readable and
+then returns everything already queued (up to max_batch) as a list of
+python-can Messages:
+
+- SocketCAN bus: reads the bus's raw socket directly. One recvmmsg(2)
+  call fetches the whole burst, each frame with its SO_TIMESTAMPNS
+  kernel receive time (set on the socket by python-can). Without
+  recvmmsg in libc it loops non-blocking recvmsg() instead.
+- Any other python-can bus (virtual, ...): one blocking recv() and then
+  recv(timeout=0) until the bus is empty.
+
+Kernel filters set on the bus (can_filters) still apply; python-can's
+software fallback filtering does not, so callers must not rely on it.
+"""
+
+import ctypes
+import errno
+import os
+import select
+import socket
+import struct
+
+import can
+
+RECV_BATCH_MAX = int(os.environ.get("RECV_BATCH_MAX", "256"))
+
+CAN_FRAME = struct.Struct("=IB3x8s")   # struct can_frame: can_id, len, pad, data[8]
+CAN_EFF_FLAG = 0x80000000
+CAN_RTR_FLAG = 0x40000000
+CAN_ERR_FLAG = 0x20000000
+CAN_SFF_MASK = 0x7FF
+CAN_EFF_MASK = 0x1FFFFFFF
+
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35)
+TIMESPEC = struct.Struct("@ll")
+_CMSG_ALIGN = ctypes.sizeof(ctypes.c_size_t)
+_CMSG_HDR = ctypes.sizeof(ctypes.c_size_t) + 2 * ctypes.sizeof(ctypes.c_int)   # cmsg_len, level, type
+_CMSG_DATA = (_CMSG_HDR + _CMSG_ALIGN - 1) & ~(_CMSG_ALIGN - 1)
+CMSG_SPACE = _CMSG_DATA + ((TIMESPEC.size + _CMSG_ALIGN - 1) & ~(_CMSG_ALIGN - 1))
+_CMSG_HEAD = struct.Struct("@Nii")
+
+
+def unpack_frame(frame, offset: int, timestamp: float, channel=None) -> can.Message:
+    """python-can Message from a packed struct can_frame."""
+    can_id, dlc, data = CAN_FRAME.unpack_from(frame, offset)
+    extended = bool(can_id & CAN_EFF_FLAG)
+    remote = bool(can_id & CAN_RTR_FLAG)
+    return can.Message(
+        timestamp=timestamp,
+        arbitration_id=can_id & (CAN_EFF_MASK if extended else CAN_SFF_MASK),
+        is_extended_id=extended,
+        is_remote_frame=remote,
+        is_error_frame=bool(can_id & CAN_ERR_FLAG),
+        dlc=dlc,
+        data=None if remote else data[:dlc],
+        channel=channel,
+    )
+
+
+def _timestamp(control, offset: int, length: int) -> float:
+    """SO_TIMESTAMPNS from a control buffer, 0.0 if it isn't there."""
+    if length >= _CMSG_DATA + TIMESPEC.size:
+        _, level, kind = _CMSG_HEAD.unpack_from(control, offset)
+        if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+            sec, nsec = TIMESPEC.unpack_from(control, offset + _CMSG_DATA)
+            return sec + nsec * 1e-9
+    return 0.0
+
+
+# -------- recvmmsg(2) through ctypes --------
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+try:
+    _libc = ctypes.CDLL(None, use_errno=True)
+    _recvmmsg = _libc.recvmmsg
+    _recvmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    _recvmmsg.restype = ctypes.c_int
+except (OSError, AttributeError):
+    _recvmmsg = None
+
+
+class MMsgRecv:
+    """
+    Preallocated recvmmsg(2) vector: frame slots, control slots, iovecs
+    and headers are linked once. The headers are restored from a pristine
+    copy with one memmove per call, since the kernel rewrites msg_controllen.
+    """
+
+    def __init__(self, record_size: int, capacity: int):
+        self.record_size = record_size
+        self.capacity = capacity
+        self.buf = ctypes.create_string_buffer(capacity * record_size)
+        self.control = ctypes.create_string_buffer(capacity * CMSG_SPACE)
+        self.iov = (_IoVec * capacity)()
+        self.msgs = (_MMsgHdr * capacity)()
+        base = ctypes.addressof(self.buf)
+        control = ctypes.addressof(self.control)
+        for i in range(capacity):
+            self.iov[i].iov_base = base + i * record_size
+            self.iov[i].iov_len = record_size
+            hdr = self.msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(self.iov[i])
+            hdr.msg_iovlen = 1
+            hdr.msg_control = control + i * CMSG_SPACE
+            hdr.msg_controllen = CMSG_SPACE
+        self._pristine = ctypes.string_at(self.msgs, ctypes.sizeof(self.msgs))
+
+    def recv(self, fd: int):
+        """[(record offset, timestamp)] for what is waiting now ([] if nothing)."""
+        ctypes.memmove(self.msgs, self._pristine, len(self._pristine))
+        n = _recvmmsg(fd, ctypes.addressof(self.msgs), self.capacity, socket.MSG_DONTWAIT, None)
+        if n < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return []
+            raise OSError(err, f"recvmmsg: {os.strerror(err)}")
+        out = []
+        for i in range(n):
+            if self.msgs[i].msg_len < self.record_size:
+                continue
+            ts = _timestamp(self.control, i * CMSG_SPACE, self.msgs[i].msg_hdr.msg_controllen)
+            out.append((i * self.record_size, ts))
+        return out
+
+
+class BatchReceiver:
+    """
+        rx = BatchReceiver(in_bus)
+        for msg in rx.recv_batch(timeout=1.0):
+            ...
+
+    `sock` overrides the bus socket (tests can pass any datagram socket).
+    """
+
+    def __init__(self, bus=None, sock: socket.socket = None, max_batch: int = RECV_BATCH_MAX,
+                 channel=None):
+        self.bus = bus
+        self.max_batch = max(1, max_batch)
+        if sock is None:
+            sock = getattr(bus, "socket", None)
+        self.sock = sock if isinstance(sock, socket.socket) else None
+        self.channel = channel if channel is not None else getattr(bus, "channel", None)
+        self._mmsg = None
+        if self.sock is not None and _recvmmsg is not None:
+            self._mmsg = MMsgRecv(CAN_FRAME.size, self.max_batch)
+        self.mode = "recvmmsg" if self._mmsg else "recvmsg" if self.sock else "bus"
+        self.calls = 0
+        self.frames = 0
+
+    def recv_batch(self, timeout: float = None) -> list:
+        """Block up to timeout for the first frame, then return everything waiting."""
+        if self.sock is None:
+            batch = self._drain_bus(timeout)
+        else:
+            readable, _, _ = select.select([self.sock], [], [], timeout)
+            if not readable:
+                return []
+            batch = self._drain_mmsg() if self._mmsg else self._drain_socket()
+        self.calls += 1
+        self.frames += len(batch)
+        return batch
+
+    def _drain_mmsg(self) -> list:
+        channel = self.channel
+        buf = self._mmsg.buf
+        return [unpack_frame(buf, offset, ts, channel)
+                for offset, ts in self._mmsg.recv(self.sock.fileno())]
+
+    def _drain_socket(self) -> list:
+        batch = []
+        recvmsg = self.sock.recvmsg
+        while len(batch) < self.max_batch:
+            try:
+                data, ancdata, _, _ = recvmsg(CAN_FRAME.size, CMSG_SPACE, socket.MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                break
+            if len(data) < CAN_FRAME.size:
+                continue
+            ts = 0.0
+            for level, kind, cdata in ancdata:
+                if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+                    sec, nsec = TIMESPEC.unpack_from(cdata)
+                    ts = sec + nsec * 1e-9
+            batch.append(unpack_frame(data, 0, ts, self.channel))
+        return batch
+
+    def _drain_bus(self, timeout) -> list:
+        msg = self.bus.recv(timeout)
+        if msg is None:
+            return []
+        batch = [msg]
+        recv = self.bus.recv
+        while len(batch) < self.max_batch:
+            msg = recv(0)
+            if msg is None:
+                break
+            batch.append(msg)
+        return batch
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+bcm_sender.py  (kernel-side cyclic CAN transmission through SocketCAN BCM)
+
+Registers one broadcast-manager task per CAN ID with python-can's
+send_periodic(). The kernel sends the frames on its own timer, so the
+Python process doesn't wake up per frame and sub-millisecond periods
+work.
+
+A task may hold several frames for the same ID. The kernel sends them in
+turn, one per period, so a batch of drifted payloads keeps varying with
+no Python involvement. update() replaces a task's frames in place
+(BCM TX_SETUP without restarting the timer) for fresh drift.
+
+On interfaces without BCM (e.g. python-can's virtual bus), python-can
+falls back to a thread per task. That is fine for testing, but the
+timing is no longer kernel-side.
+"""
+
+import can
+
+
+def make_frames(can_id: int, payloads, is_extended_id: bool = None):
+    """python-can Messages for one ID from a list of byte payloads."""
+    if is_extended_id is None:
+        is_extended_id = can_id > 0x7FF
+    return [can.Message(arbitration_id=can_id, data=bytes(p), is_extended_id=is_extended_id)
+            for p in payloads]
+
+
+class CyclicSender:
+    """
+        sender = CyclicSender("can0")
+        sender.start(0x018, [b"\\x01\\x02", b"\\x01\\x03"], period=0.010)
+        sender.update(0x018, [b"\\x01\\x04", b"\\x01\\x05"])
+        sender.close()
+    """
+
+    def __init__(self, channel: str, bustype: str = "socketcan", bus=None):
+        self.channel = channel
+        self.bus = bus if bus is not None else can.interface.Bus(channel=channel, bustype=bustype)
+        self._own_bus = bus is None
+        self.tasks = {}          # can_id -> (task, number of frames, period)
+
+    def start(self, can_id: int, payloads, period: float, is_extended_id: bool = None):
+        """Start (or restart) the cyclic task for can_id."""
+        self.stop(can_id)
+        frames = make_frames(can_id, payloads, is_extended_id)
+        if not frames:
+            raise ValueError(f"no payloads for ID {can_id:X}")
+        task = self.bus.send_periodic(frames, period, store_task=False)
+        self.tasks[can_id] = (task, len(frames), period)
+        return task
+
+    def update(self, can_id: int, payloads, is_extended_id: bool = None):
+        """
+        Swap the payloads of a running task without restarting it. A
+        different number of frames needs a restart, which resets the
+        phase of that task.
+        """
+        task, count, period = self.tasks[can_id]
+        frames = make_frames(can_id, payloads, is_extended_id)
+        if len(frames) != count:
+            self.start(can_id, payloads, period, is_extended_id)
+            return
+        task.modify_data(frames)
+
+    def stop(self, can_id: int):
+        entry = self.tasks.pop(can_id, None)
+        if entry is not None:
+            entry[0].stop()
+
+    def stop_all(self):
+        for can_id in list(self.tasks):
+            self.stop(can_id)
+
+    def close(self):
+        self.stop_all()
+        if self._own_bus:
+            self.bus.shutdown()
+
+    def frame_rate(self) -> float:
+        """Frames per second the kernel is sending across all tasks."""
+        return sum(1.0 / period for _, _, period in self.tasks.values())
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+bench_forwarder.py
+
+Replay benchmark for base_IDS.run_forwarder with different handle_frame
+filters.
+
+- Replays a synthetic workload (or a TRC trace with --trc) onto the
+  forwarder's input interface at each of --rates frames/s
+- The forwarder runs as a child process (python3 bench_forwarder.py
+  --child) with CAN_INPUT_IF / CAN_OUTPUT_IF pointed at two vcan
+  interfaces and REPORT_URL at a stub server in this process
+- Listens on both interfaces and pairs every forwarded frame with its
+  input copy: latency = output minus input kernel receive timestamp
+- drop rate = 1 - forwarded / frames the scenario should forward,
+  CPU per frame = child utime + stime during the replay / frames sent
+- Writes everything to --out as JSON
+
+Scenarios (--scenarios, comma separated):
+    default          default_handle_frame, forward everything
+    python_allow     handle_frame with a Python `if id in ALLOW` check
+    rules_allow      the same allow list as FILTER_RULES (frame_filter.py)
+    rules_mask       rules dropping standard frames whose first byte is odd
+    detector         default handler with DETECT=log (ids_detector.py)
+    batch            handle_frames() hook, forward everything
+
+--bustype virtual runs the forwarder in this process on python-can
+virtual buses instead (no vcan needed). Latency is then the python-can
+send time difference, and CPU includes the replay and capture threads.
+
+RUN CODE : sudo python3 bench_forwarder.py --setup [--rates 1000,5000,20000] [--duration 10]
+           python3 bench_forwarder.py --bustype virtual --rates 500,2000 --duration 3
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import can
+
+from batch_recv import BatchReceiver
+
+SCENARIOS = ("default", "python_allow", "rules_allow", "rules_mask", "detector", "batch")
+WORKLOAD_FRAMES = 100000        # replay cycles through at most this many frames
+TICK_S = 0.001                  # pacing granularity of the replay
+READY_TIMEOUT_S = 10.0
+DRAIN_S = 1.0                   # wait after the last frame before stopping
+
+
+# -------- Workload --------
+def synthetic_frames(count: int, n_ids: int, seed: int):
+    """[(can_id, extended, data)] over n_ids random standard IDs."""
+    rng = random.Random(seed)
+    ids = rng.sample(range(0x800), n_ids)
+    return [(rng.choice(ids), False, bytes(rng.getrandbits(8) for _ in range(rng.randint(0, 8))))
+            for _ in range(count)]
+
+
+def trc_frames(path: str, count: int):
+    from trc_loader import load_trc
+
+    ids, id_lens, dlc, data, _, _ = load_trc(path)
+    frames = []
+    for i in range(min(count, len(ids))):
+        can_id = int(ids[i])
+        frames.append((can_id, bool(id_lens[i] > 4 or can_id > 0x7FF), bytes(data[i, :dlc[i]])))
+    return frames
+
+
+def allow_list(frames):
+    """Every other ID of the workload: the policy of the *_allow scenarios."""
+    return sorted({can_id for can_id, extended, _ in frames if not extended})[::2]
+
+
+def expects(scenario: str, allow: set):
+    """Predicate: should the forwarder send this frame on in this scenario?"""
+    if scenario in ("python_allow", "rules_allow"):
+        return lambda can_id, extended, data: not extended and can_id in allow
+    if scenario == "rules_mask":
+        return lambda can_id, extended, data: extended or not (data[:1] and data[0] & 1)
+    return lambda can_id, extended, data: True
+
+
+# -------- Forwarder side (child process / in-process) --------
+def forwarder_args(scenario: str, allow):
+    """(handle_frame, rules, handle_frames) for base_IDS.run_forwarder."""
+    if scenario == "python_allow":
+        allowed = set(allow)
+
+        def handle_frame(msg, out_bus, build_record):
+            if msg.is_extended_id or msg.arbitration_id not in allowed:
+                return None
+            out_bus.send(msg)
+            return build_record(msg)
+        return handle_frame, None, None
+    if scenario == "rules_allow":
+        return None, {"default": "drop",
+                      "rules": [{"ids": [f"{i:03X}" for i in allow], "action": "forward"}]}, None
+    if scenario == "rules_mask":
+        return None, {"default": "forward",
+                      "rules": [{"ids": ["000-7FF"], "dlc": list(range(1, 9)), "mask": "01",
+                                 "value": "01", "action": "drop"}]}, None
+    if scenario == "batch":
+        def handle_frames(batch, out_bus, build_record):
+            for msg in batch:
+                out_bus.send(msg)
+            return [build_record(msg) for msg in batch]
+        return None, None, handle_frames
+    return None, None, None
+
+
+def child_main():
+    spec = json.loads(os.environ["BENCH_SCENARIO"])
+    import base_IDS
+    handle_frame, rules, handle_frames = forwarder_args(spec["scenario"], spec["allow"])
+    base_IDS.run_forwarder(handle_frame, rules=rules, user_handle_frames=handle_frames)
+
+
+# -------- Stub REPORT_URL server --------
+class ReportStub:
+    """Accepts /api/report and /api/report/batch, counts records."""
+
+    def __init__(self):
+        stub = self
+        self.records = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                try:
+                    payload = json.loads(body or b"null")
+                except ValueError:
+                    payload = None
+                n = len(payload) if isinstance(payload, list) else 1     # /batch posts a list
+                with stub._lock:
+                    stub.records += n
+                    stub.requests += 1
+                reply = b'{"status":"ok"}'
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/report"
+        threading.Thread(target=self.server.serve_forever, name="report-stub", daemon=True).start()
+
+    def take(self) -> int:
+        with self._lock:
+            n, self.records = self.records, 0
+        return n
+
+    def close(self):
+        self.server.shutdown()
+
+
+# -------- Capture / replay --------
+class Capture:
+    """Background listener: (key, timestamp) for every frame on one bus / socket."""
+
+    def __init__(self, receiver: BatchReceiver):
+        self.receiver = receiver
+        self.frames = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        append = self.frames.append
+        while not self._stop.is_set():
+            for msg in self.receiver.recv_batch(0.2):
+                append(((msg.arbitration_id, msg.is_extended_id, bytes(msg.data)), msg.timestamp))
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(2.0)
+        return self.frames
+
+
+def raw_socket(interface: str):
+    import socket
+    sock = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+    sock.setsockopt(socket.SOL_SOCKET, getattr(socket, "SO_TIMESTAMPNS", 35), 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+    sock.bind((interface,))
+    return sock
+
+
+def replay(send_many, frames, rate: float, duration: float) -> tuple:
+    """Send frames (cycling) at `rate` for `duration` seconds -> (frames sent, wall seconds)."""
+    total = int(rate * duration)
+    start = time.perf_counter()
+    sent = 0
+    k = 0
+    while sent < total:
+        k += 1
+        due = min(total, int(k * TICK_S * rate))
+        if due > sent:
+            chunk = [frames[i % len(frames)] for i in range(sent, due)]
+            try:
+                sent += send_many(chunk)
+            except OSError:
+                time.sleep(TICK_S)          # tx queue full: retry next tick
+        delay = start + k * TICK_S - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    return sent, time.perf_counter() - start
+
+
+def percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return {**{f"p{p}_us": None for p in points}, "max_us": None}
+    values = sorted(values)
+    out = {f"p{p}_us": values[min(len(values) - 1, int(len(values) * p / 100))] * 1e6 for p in points}
+    out["max_us"] = values[-1] * 1e6
+    return out
+
+
+def pair_latencies(inputs, outputs):
+    """Match each output frame to the oldest unmatched identical input frame."""
+    pending = defaultdict(deque)
+    for key, ts in inputs:
+        pending[key].append(ts)
+    latencies = []
+    unmatched = 0
+    for key, ts in outputs:
+        queue = pending.get(key)
+        if queue:
+            latencies.append(ts - queue.popleft())
+        else:
+            unmatched += 1
+    return latencies, unmatched
+
+
+def proc_cpu(pid: int) -> float:
+    """utime + stime of a process (all threads) in seconds."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+# -------- Runs --------
+def run_vcan(args, scenario, rate, frames, allow, stub, tmp):
+    from can_backends import SocketBackend
+
+    env = dict(os.environ, CAN_INPUT_IF=args.in_if, CAN_OUTPUT_IF=args.out_if, CAN_BUSTYPE="socketcan",
+               REPORT_URL=stub.url, LOG_FILE=os.path.join(tmp, f"{scenario}_{rate}.jsonl"),
+               DETECT="log" if scenario == "detector" else "off",
+               BENCH_SCENARIO=json.dumps({"scenario": scenario, "allow": allow}))
+    out_path = os.path.join(tmp, f"{scenario}_{rate}.out")
+    with open(out_path, "w") as out:
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child"],
+                                 env=env, stdout=out, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + READY_TIMEOUT_S
+        while "Report batch=" not in open(out_path).read():
+            if child.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"forwarder did not start:\n{open(out_path).read()}")
+            time.sleep(0.05)
+        time.sleep(0.5)       # buses are opened right after that line
+        if child.poll() is not None:
+            raise RuntimeError(f"forwarder exited:\n{open(out_path).read()}")
+
+        cap_in = Capture(BatchReceiver(sock=raw_socket(args.in_if), max_batch=1024))
+        cap_out = Capture(BatchReceiver(sock=raw_socket(args.out_if), max_batch=1024))
+        sender = SocketBackend(args.in_if)
+        cpu0 = proc_cpu(child.pid)
+        sent, wall = replay(sender.send_many, frames, rate, args.duration)
+        time.sleep(DRAIN_S)
+        cpu = proc_cpu(child.pid) - cpu0
+        sender.close()
+        inputs, outputs = cap_in.stop(), cap_out.stop()
+    finally:
+        child.send_signal(signal.SIGINT)
+        try:
+            child.wait(10)
+        except subprocess.TimeoutExpired:
+            child.kill()
+    return sent, wall, cpu, inputs, outputs
+
+
+def run_virtual(args, scenario, rate, frames, allow, stub, tmp):
+    import _thread
+    import base_IDS
+    from ids_detector import TimingDetector
+
+    base_IDS.CAN_INPUT_IF, base_IDS.CAN_OUTPUT_IF, base_IDS.CAN_BUSTYPE = "bench_in", "bench_out", "virtual"
+    base_IDS.REPORT_URL = stub.url
+    base_IDS.LOG_FILE = os.path.join(tmp, f"{scenario}_{rate}.jsonl")
+    base_IDS.DETECT = "log" if scenario == "detector" else "off"
+    base_IDS.detector = TimingDetector()
+    base_IDS._log_writer = base_IDS._bin_writer = None
+
+    cap_in = Capture(BatchReceiver(can.Bus(channel="bench_in", interface="virtual")))
+    cap_out = Capture(BatchReceiver(can.Bus(channel="bench_out", interface="virtual")))
+    tx = can.Bus(channel="bench_in", interface="virtual")
+    result = {}
+
+    def send_many(chunk):
+        for can_id, extended, data in chunk:
+            tx.send(can.Message(arbitration_id=can_id, is_extended_id=extended, data=data))
+        return len(chunk)
+
+    def drive():
+        time.sleep(1.0)
+        cpu0 = time.process_time()
+        result["sent"], result["wall"] = replay(send_many, frames, rate, args.duration)
+        time.sleep(DRAIN_S)
+        result["cpu"] = time.process_time() - cpu0
+        _thread.interrupt_main()
+
+    threading.Thread(target=drive, daemon=True).start()
+    handle_frame, rules, handle_frames = forwarder_args(scenario, allow)
+    base_IDS.run_forwarder(handle_frame, rules=rules, user_handle_frames=handle_frames)
+    tx.shutdown()
+    return result["sent"], result["wall"], result["cpu"], cap_in.stop(), cap_out.stop()
+
+
+def setup_vcan(names):
+    for name in names:
+        if subprocess.run(["ip", "link", "show", name], capture_output=True).returncode != 0:
+            subprocess.run(["ip", "link", "add", "dev", name, "type", "vcan"], check=True)
+        subprocess.run(["ip", "link", "set", "up", name], check=True)
+        print(f"[BENCH] {name} up")
+
+
+def main():
+    if "--child" in sys.argv:
+        child_main()
+        return
+
+    ap = argparse.ArgumentParser(description="Replay throughput / latency benchmark for base_IDS")
+    ap.add_argument("--rates", default="1000,5000,20000", help="frames/s, comma separated")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per rate")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("--trc", help="replay frames from this trace instead of synthetic ones")
+    ap.add_argument("--ids", type=int, default=50, help="distinct IDs in the synthetic workload")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--bustype", choices=("socketcan", "virtual"), default="socketcan")
+    ap.add_argument("--in-if", default="vcan_fwd_in")
+    ap.add_argument("--out-if", default="vcan_fwd_out")
+    ap.add_argument("--setup", action="store_true", help="create / bring up the vcan interfaces (root)")
+    ap.add_argument("--out", default="bench_forwarder.json")
+    args = ap.parse_args()
+
+    rates = [float(r) for r in args.rates.split(",")]
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        ap.error(f"unknown scenarios {sorted(unknown)}, choose from {SCENARIOS}")
+    if args.setup and args.bustype == "socketcan":
+        setup_vcan([args.in_if, args.out_if])
+
+    frames = trc_frames(args.trc, WORKLOAD_FRAMES) if args.trc else \
+        synthetic_frames(WORKLOAD_FRAMES, args.ids, args.seed)
+    allow = allow_list(frames)
+    print(f"[BENCH] {len(frames)} workload frames, {len({f[0] for f in frames})} IDs, "
+          f"{len(allow)} allowed, bus={args.bustype}")
+
+    stub = ReportStub()
+    run = run_vcan if args.bustype == "socketcan" else run_virtual
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_fwd_") as tmp:
+        for scenario in scenarios:
+            expect = expects(scenario, set(allow))
+            for rate in rates:
+                stub.take()
+                try:
+                    sent, wall, cpu, inputs, outputs = run(args, scenario, rate, frames, allow, stub, tmp)
+                except (OSError, RuntimeError) as e:
+                    print(f"[BENCH] {scenario} @ {rate:.0f}/s failed: {e}", file=sys.stderr)
+                    if args.bustype == "socketcan":
+                        print("[BENCH] vcan interfaces missing? Run with --setup as root, "
+                              "or --bustype virtual", file=sys.stderr)
+                    sys.exit(1)
+                expected = sum(1 for key, _ in inputs if expect(*key))
+                latencies, unmatched = pair_latencies(inputs, outputs)
+                forwarded = len(latencies)
+                row = {
+                    "scenario": scenario,
+                    "rate": rate,
+                    "achieved_rate": sent / wall if wall else 0.0,
+                    "sent": sent,
+                    "seen_on_input": len(inputs),
+                    "expected": expected,
+                    "forwarded": forwarded,
+                    "unexpected": unmatched,
+                    "drop_rate": max(0.0, 1.0 - forwarded / expected) if expected else 0.0,
+                    "latency": percentiles(latencies),
+                    "cpu_s": cpu,
+                    "cpu_us_per_frame": cpu / sent * 1e6 if sent else None,
+                    "reports_received": stub.take(),
+                }
+                results.append(row)
+                lat = row["latency"]
+                print(f"[BENCH] {scenario:<13} {rate:>8.0f}/s  sent {sent:>7}  fwd {forwarded:>7}/{expected:<7} "
+                      f"drop {row['drop_rate'] * 100:5.1f}%  p50 {lat['p50_us'] or 0:7.0f}us  "
+                      f"p99 {lat['p99_us'] or 0:8.0f}us  cpu {row['cpu_us_per_frame'] or 0:6.1f}us/frame",
+                      flush=True)
+    stub.close()
+
+    with open(args.out, "w") as f:
+        json.dump({
+            "meta": {
+                "bustype": args.bustype,
+                "interfaces": [args.in_if, args.out_if] if args.bustype == "socketcan" else None,
+                "duration_s": args.duration,
+                "workload": args.trc or f"synthetic:{args.ids}ids:seed{args.seed}",
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+                "cpu_includes_replay": args.bustype == "virtual",
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"[BENCH] Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+bench_rate_limit.py
+
+Micro-benchmark for the SERVER_ATTACK rate limiters (rate_limit.py) against
+the original design: one global lock + defaultdict(deque) of timestamps.
+
+- Throughput: THREADS threads calling check() on TAGS secret tags
+- Memory: bytes held per tag after filling each tag to just under the limit
+
+RUN CODE : python3 bench_rate_limit.py [--threads 8] [--tags 13] [--ops 200000] [--limit 1000]
+"""
+
+import argparse
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+
+from rate_limit import LIMITERS
+
+BAN_DURATION = 10.0
+
+
+class GlobalLockDequeLimiter:
+    """Copy of the original check_rate_limit from SERVER_ATTACK.py."""
+
+    def __init__(self, max_requests: int, window: float, ban_duration: float, **_):
+        self.max_requests = max_requests
+        self.window = window
+        self.ban_duration = ban_duration
+        self._rate_lock = threading.Lock()
+        self._request_log = defaultdict(deque)
+        self._banned_until = {}
+
+    def check(self, tag: str, cost: int = 1):
+        now = time.time()
+        with self._rate_lock:
+            until = self._banned_until.get(tag)
+            if until and now < until:
+                return False, int(until - now)
+
+            q = self._request_log[tag]
+            while q and now - q[0] > self.window:
+                q.popleft()
+
+            q.append(now)
+
+            if len(q) > self.max_requests:
+                self._banned_until[tag] = now + self.ban_duration
+                self._request_log[tag].clear()
+                return False, int(self.ban_duration)
+
+        return True, 0
+
+
+IMPLEMENTATIONS = {"original (global lock)": GlobalLockDequeLimiter}
+IMPLEMENTATIONS.update(LIMITERS)
+
+
+def bench_throughput(cls, threads: int, tags: int, ops: int, limit: int, window: float):
+    limiter = cls(limit, window, BAN_DURATION)
+    tag_names = [f"tag-{i:04d}" for i in range(tags)]
+    per_thread = ops // threads
+    start = threading.Barrier(threads + 1)
+
+    def worker(n):
+        my_tags = tag_names[n::threads] or tag_names
+        start.wait()
+        check = limiter.check
+        k = len(my_tags)
+        for i in range(per_thread):
+            check(my_tags[i % k])
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    return per_thread * threads / elapsed
+
+
+def bench_memory(cls, tags: int, limit: int, window: float):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    limiter = cls(limit, window, BAN_DURATION)
+    for i in range(tags):
+        tag = f"tag-{i:04d}"
+        for _ in range(limit - 1):
+            limiter.check(tag)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / tags
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--tags", type=int, default=13, help="distinct secret tags (13 teams by default)")
+    ap.add_argument("--ops", type=int, default=200000, help="total check() calls per implementation")
+    ap.add_argument("--limit", type=int, default=1000, help="RATE_LIMIT_MAX")
+    ap.add_argument("--window", type=float, default=60.0, help="RATE_LIMIT_WINDOW (seconds)")
+    args = ap.parse_args()
+
+    print(f"threads={args.threads} tags={args.tags} ops={args.ops} "
+          f"limit={args.limit}/{args.window:.0f}s")
+    print(f"{'limiter':<24} {'checks/s':>12} {'bytes/tag':>12}")
+    for name, cls in IMPLEMENTATIONS.items():
+        rate = bench_throughput(cls, args.threads, args.tags, args.ops, args.limit, args.window)
+        mem = bench_memory(cls, min(args.tags, 100), args.limit, args.window)
+        print(f"{name:<24} {rate:>12,.0f} {mem:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+bench_servers.py
+
+Load test for the central HTTP APIs: SERVER_ATTACK /api/cansend and
+SERVER_DEFENSE /api/report, with N teams sending at the same time.
+
+- Every team has its own secret_tag / team_id and sends at a fixed rate
+  (--rates, requests/s per team). Requests are scheduled on a clock
+  (open loop), so a slow server shows up as latency instead of quietly
+  lowering the offered rate
+- Latency = response received minus the request's scheduled send time,
+  as percentiles plus a histogram; service latency = minus the actual
+  send time (without the client-side backlog)
+- Status codes per team: 429 = refused by check_rate_limit
+- Tails the server's JSONL log and matches every accepted request to its
+  line: log lag = line visible in the file minus response received
+- By default each run starts the server as a child uvicorn process on a
+  free port with its log in a temp dir. SERVER_ATTACK runs with
+  CANSEND_BACKEND=noop (log only); --cansend native --interface vcan0
+  puts the frames on a vcan instead (--setup creates it, root)
+- --attack-url / --defense-url load an already running server instead
+  (--attack-log / --defense-log to also measure log lag). Rate limiter
+  state then carries over from one run to the next
+- Writes everything to --out as JSON
+
+The load generator shares the machine with the server, so at high rates
+the client's own CPU use is part of what is measured.
+
+RUN CODE : python3 bench_servers.py [--teams 13] [--rates 1,5,20] [--duration 10]
+           python3 bench_servers.py --target attack --rate-limit-max 1000000 --rates 50,200
+           sudo python3 bench_servers.py --target attack --cansend native --interface vcan0 --setup
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from urllib.parse import urlsplit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+TARGETS = {
+    # name: (uvicorn module, endpoint)
+    "attack": ("SERVER_ATTACK", "/api/cansend"),
+    "defense": ("SERVER_DEFENSE", "/api/report"),
+}
+HISTOGRAM_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)   # bucket upper bounds
+HTTP_TIMEOUT_S = 10.0
+READY_TIMEOUT_S = 15.0
+START_DELAY_S = 0.2          # lets every team thread reach its first slot
+LOG_POLL_S = 0.005
+LOG_DRAIN_S = 2.0            # wait for the last log lines after the load stops
+
+
+# -------- Teams / requests --------
+class Team:
+    def __init__(self, index: int):
+        self.index = index
+        self.team_id = f"{index + 1:02d}"
+        self.secret_tag = str(uuid.uuid4())
+        self.can_id = f"{0x100 + index:03X}"
+
+
+def attack_request(team: Team, seq: int, interface: str):
+    """(body, headers) for /api/cansend. The sequence number is the frame data."""
+    body = {"interface": interface, "frame": f"{team.can_id}#{seq:016X}"}
+    headers = {"X-Secret-Tag": team.secret_tag, "X-Team-Id": team.team_id}
+    return body, headers
+
+
+def defense_request(team: Team, seq: int, interface: str):
+    """(body, headers) for /api/report, shaped like ids_reporter's records."""
+    body = {
+        "team_id": team.team_id,
+        "can_time": f"{time.time():.2f}",
+        "can_id": team.can_id,
+        "can_dlc": "8",
+        "can_data": f"{seq:016X}",
+        "secret_tag": team.secret_tag,
+    }
+    return body, {}
+
+
+REQUESTS = {"attack": attack_request, "defense": defense_request}
+
+
+class WorkerResult:
+    def __init__(self):
+        self.status = Counter()      # HTTP status -> count, 0 = connection error / timeout
+        self.latency = []            # seconds from scheduled time to response
+        self.service = []            # seconds from actual send to response
+        self.acked = []              # (log key, wall time of the 200 response)
+        self.last_done = 0.0
+
+
+def run_worker(url, path, make_request, team, interface, slots, t0, result: WorkerResult):
+    """Send one team's requests at the scheduled perf_counter() offsets `slots`."""
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=HTTP_TIMEOUT_S)
+    clock = time.perf_counter
+    for seq, offset in slots:
+        due = t0 + offset
+        delay = due - clock()
+        if delay > 0:
+            time.sleep(delay)
+        body, headers = make_request(team, seq, interface)
+        headers["Content-Type"] = "application/json"
+        payload = json.dumps(body)
+        sent = clock()
+        try:
+            conn.request("POST", path, payload, headers)
+            resp = conn.getresponse()
+            resp.read()
+            status = resp.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            status = 0
+        done = clock()
+        result.status[status] += 1
+        result.latency.append(done - due)
+        result.service.append(done - sent)
+        result.last_done = done
+        if status == 200:
+            result.acked.append(((team.secret_tag, f"{seq:016X}"), time.time()))
+    conn.close()
+
+
+# -------- Server log --------
+class LogTail:
+    """Polls a JSONL log and records when each (secret_tag, can_data) line first appears."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.seen = {}
+        self.offset = os.path.getsize(path) if os.path.exists(path) else 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-tail", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        f = None
+        partial = b""
+        while True:
+            stopping = self._stop.is_set()
+            if f is None and os.path.exists(self.path):
+                f = open(self.path, "rb")
+                f.seek(self.offset)
+            if f is not None:
+                data = f.read()
+                if data:
+                    now = time.time()
+                    lines = (partial + data).split(b"\n")
+                    partial = lines.pop()
+                    for line in lines:
+                        try:
+                            rec = json.loads(line)
+                        except ValueError:
+                            continue
+                        self.seen.setdefault((rec.get("secret_tag"), rec.get("can_data")), now)
+            if stopping:
+                break
+            self._stop.wait(LOG_POLL_S)
+        if f is not None:
+            f.close()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+# -------- Server process --------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def proc_cpu(pid: int) -> float:
+    """utime + stime of a process in seconds."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class ServerProcess:
+    """One `python3 -m uvicorn <module>:app` child on a free localhost port."""
+
+    def __init__(self, module: str, env: dict):
+        port = free_port()
+        self.url = f"http://127.0.0.1:{port}"
+        cmd = [sys.executable, "-m", "uvicorn", f"{module}:app", "--host", "127.0.0.1",
+               "--port", str(port), "--log-level", "warning", "--no-access-log"]
+        self.proc = subprocess.Popen(cmd, cwd=HERE, env={**os.environ, **env})
+        self._wait_ready(port)
+
+    def _wait_ready(self, port: int):
+        deadline = time.monotonic() + READY_TIMEOUT_S
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {self.proc.returncode}")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1.0)
+                conn.request("GET", "/api/health")
+                if conn.getresponse().status == 200:
+                    conn.close()
+                    return
+            except OSError:
+                pass
+            time.sleep(0.1)
+        self.close()
+        raise RuntimeError(f"server not ready after {READY_TIMEOUT_S:.0f}s")
+
+    def cpu(self) -> float:
+        try:
+            return proc_cpu(self.proc.pid)
+        except OSError:
+            return 0.0
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+
+
+# -------- Summaries --------
+def percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return {**{f"p{p}_ms": None for p in points}, "max_ms": None}
+    values = sorted(values)
+    out = {f"p{p}_ms": values[min(len(values) - 1, int(len(values) * p / 100))] * 1e3 for p in points}
+    out["max_ms"] = values[-1] * 1e3
+    return out
+
+
+def histogram(values) -> dict:
+    """{"<=0.5ms": n, ..., ">5000ms": n} over HISTOGRAM_MS."""
+    counts = [0] * (len(HISTOGRAM_MS) + 1)
+    for v in values:
+        ms = v * 1e3
+        i = 0
+        while i < len(HISTOGRAM_MS) and ms > HISTOGRAM_MS[i]:
+            i += 1
+        counts[i] += 1
+    out = {f"<={b:g}ms": n for b, n in zip(HISTOGRAM_MS, counts)}
+    out[f">{HISTOGRAM_MS[-1]:g}ms"] = counts[-1]
+    return out
+
+
+def print_histogram(hist: dict, width: int = 40):
+    peak = max(hist.values()) or 1
+    for label, n in hist.items():
+        if n:
+            print(f"[BENCH]     {label:>10} {n:>8} {'#' * max(1, round(n * width / peak))}")
+
+
+# -------- Runs --------
+def run_load(url: str, target: str, teams, rate: float, duration: float, conns: int,
+             interface: str, log_path: str = None):
+    """Offer `rate` req/s per team for `duration` s. Returns (per team results, log tail, t0)."""
+    path = TARGETS[target][1]
+    make_request = REQUESTS[target]
+    parsed = urlsplit(url)
+    interval = 1.0 / rate
+    tail = LogTail(log_path) if log_path else None
+    threads = []
+    per_team = []
+    t0 = time.perf_counter() + START_DELAY_S
+    for team in teams:
+        # teams are spread over one interval instead of all firing on the same tick
+        first = interval * team.index / len(teams)
+        slots = [(seq, first + seq * interval) for seq in range(int(duration * rate))]
+        results = []
+        for c in range(conns):
+            result = WorkerResult()
+            results.append(result)
+            threads.append(threading.Thread(
+                target=run_worker, name=f"team{team.team_id}-{c}",
+                args=(parsed, path, make_request, team, interface, slots[c::conns], t0, result),
+                daemon=True))
+        per_team.append(results)
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if tail is not None:
+        time.sleep(LOG_DRAIN_S)
+        tail.close()
+    return per_team, tail, t0
+
+
+def summarize(target, rate, teams, per_team, tail, t0, cpu) -> dict:
+    status = Counter()
+    latency, service, lags = [], [], []
+    missing = 0
+    last_done = t0
+    team_rows = []
+    for team, results in zip(teams, per_team):
+        team_status = Counter()
+        team_latency = []
+        for r in results:
+            team_status.update(r.status)
+            team_latency.extend(r.latency)
+            service.extend(r.service)
+            last_done = max(last_done, r.last_done)
+            if tail is not None:
+                for key, acked in r.acked:
+                    seen = tail.seen.get(key)
+                    if seen is None:
+                        missing += 1
+                    else:
+                        lags.append(max(0.0, seen - acked))
+        status.update(team_status)
+        latency.extend(team_latency)
+        requests = sum(team_status.values())
+        team_rows.append({
+            "team_id": team.team_id,
+            "requests": requests,
+            "ok": team_status[200],
+            "rate_limited": team_status[429],
+            "p99_ms": percentiles(team_latency)["p99_ms"],
+        })
+    requests = sum(status.values())
+    wall = last_done - t0
+    return {
+        "target": target,
+        "rate_per_team": rate,
+        "offered_rate": rate * len(teams),
+        "achieved_rate": requests / wall if wall > 0 else 0.0,
+        "requests": requests,
+        "status": {str(k): v for k, v in sorted(status.items())},
+        "ok": status[200],
+        "rate_limited": status[429],
+        "rate_limited_pct": status[429] / requests * 100 if requests else 0.0,
+        "errors": requests - status[200] - status[429],
+        "latency": percentiles(latency),
+        "service_latency": percentiles(service),
+        "histogram": histogram(latency),
+        "log_lag": percentiles(lags) if tail is not None else None,
+        "log_missing": missing if tail is not None else None,
+        "server_cpu_s": cpu,
+        "teams": team_rows,
+    }
+
+
+def server_env(target: str, args, tmp: str):
+    """(env, log path) for a server child started by this script."""
+    if target == "attack":
+        log_path = os.path.join(tmp, "can_log.jsonl")
+        env = {"CANSEND_BACKEND": args.cansend, "CAN_LOG_PATH": log_path, "BIN_LOG_FILE": "",
+               "LOG_FORMAT": "jsonl"}
+        if args.rate_limit_max:
+            env["RATE_LIMIT_MAX"] = str(args.rate_limit_max)
+        return env, log_path
+    log_dir = os.path.join(tmp, "defense")
+    return {"CTF_LOG_DIR": log_dir}, os.path.join(log_dir, "ids_report.jsonl")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--target", default="attack,defense", help="attack, defense or both (comma separated)")
+    ap.add_argument("--teams", type=int, default=13)
+    ap.add_argument("--rates", default="1,5,20", help="requests/s per team, comma separated")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per rate")
+    ap.add_argument("--conns", type=int, default=1, help="keep-alive connections per team")
+    ap.add_argument("--cansend", choices=("noop", "native", "subprocess"), default="noop",
+                    help="CANSEND_BACKEND for the SERVER_ATTACK child")
+    ap.add_argument("--interface", default="can0", help="interface named in /api/cansend requests")
+    ap.add_argument("--setup", action="store_true", help="create / bring up --interface as a vcan (root)")
+    ap.add_argument("--rate-limit-max", type=int, default=0,
+                    help="RATE_LIMIT_MAX for the SERVER_ATTACK child (default: the server's own)")
+    ap.add_argument("--attack-url", help="load this running SERVER_ATTACK instead of starting one")
+    ap.add_argument("--defense-url", help="load this running SERVER_DEFENSE instead of starting one")
+    ap.add_argument("--attack-log", help="can_log.jsonl of --attack-url, for log lag")
+    ap.add_argument("--defense-log", help="ids_report.jsonl of --defense-url, for log lag")
+    ap.add_argument("--out", default="bench_servers.json")
+    args = ap.parse_args()
+
+    targets = [t for t in args.target.split(",") if t]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        ap.error(f"unknown targets {sorted(unknown)}, choose from {tuple(TARGETS)}")
+    rates = [float(r) for r in args.rates.split(",")]
+    if args.teams < 1 or args.conns < 1 or min(rates) <= 0:
+        ap.error("--teams, --conns and --rates must be positive")
+    if args.setup:
+        from bench_forwarder import setup_vcan
+        setup_vcan([args.interface])
+
+    teams = [Team(i) for i in range(args.teams)]
+    external = {"attack": (args.attack_url, args.attack_log), "defense": (args.defense_url, args.defense_log)}
+    print(f"[BENCH] {args.teams} teams, targets {targets}, cansend={args.cansend}")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_srv_") as tmp:
+        for target in targets:
+            for rate in rates:
+                url, log_path = external[target]
+                server = None
+                if url is None:
+                    run_dir = os.path.join(tmp, f"{target}_{rate:g}")
+                    os.makedirs(run_dir)
+                    env, log_path = server_env(target, args, run_dir)
+                    try:
+                        server = ServerProcess(TARGETS[target][0], env)
+                    except (OSError, RuntimeError) as e:
+                        print(f"[BENCH] {target} server failed to start: {e}", file=sys.stderr)
+                        sys.exit(1)
+                    url = server.url
+                try:
+                    cpu0 = server.cpu() if server else 0.0
+                    per_team, tail, t0 = run_load(url, target, teams, rate, args.duration, args.conns,
+                                                  args.interface, log_path)
+                    cpu = server.cpu() - cpu0 if server else None
+                finally:
+                    if server is not None:
+                        server.close()
+
+                row = summarize(target, rate, teams, per_team, tail, t0, cpu)
+                results.append(row)
+                lat, lag = row["latency"], row["log_lag"]
+                lag_text = f"log lag p99 {lag['p99_ms']:.0f}ms, {row['log_missing']} missing" \
+                    if lag and lag["p99_ms"] is not None else "log lag n/a"
+                print(f"[BENCH] {target:<7} {rate:>6g}/s/team  {row['achieved_rate']:8.1f} req/s  "
+                      f"ok {row['ok']:>6}  429 {row['rate_limited_pct']:5.1f}%  err {row['errors']:>4}  "
+                      f"p50 {lat['p50_ms'] or 0:7.1f}ms  p99 {lat['p99_ms'] or 0:7.1f}ms  {lag_text}",
+                      flush=True)
+                print_histogram(row["histogram"])
+
+    with open(args.out, "w") as f:
+        json.dump({
+            "meta": {
+                "teams": args.teams,
+                "duration_s": args.duration,
+                "conns_per_team": args.conns,
+                "cansend": args.cansend if not args.attack_url else None,
+                "interface": args.interface,
+                "rate_limit_max": args.rate_limit_max or None,
+                "external": {t: url for t, (url, _) in external.items() if url},
+                "log_poll_ms": LOG_POLL_S * 1e3,
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"[BENCH] Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+bench_trc_parse.py
+
+Scaling benchmark for trc_loader.load_trc across process counts.
+
+- Writes a synthetic PEAK-style trace of --size-gb (unless --file is given)
+- Parses it with 1, 2, 4, ... up to --max-workers processes, capped
+  (MAX_MESSAGES_PER_ID) and uncapped
+- Checks every parallel result is identical to the single-process one
+
+The page cache is warmed by the first run, so times are CPU bound; drop
+caches between runs if you want cold-disk numbers.
+
+RUN CODE : python3 bench_trc_parse.py [--size-gb 2] [--max-workers 8] [--cap 50] [--file trace.trc] [--keep]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from trc_loader import load_trc
+
+IDS = ["0018", "0034", "0153", "0370", "0440", "02B0", "0164", "0165", "018F", "01F1",
+       "0220", "0260", "02A0", "02C0", "0316", "0329", "0350", "0382", "043F", "04B0",
+       "04F0", "04F1", "04F2", "0545", "18FEF100", "0CF00400"]
+BLOCK_LINES = 100000
+
+
+def make_block(rng: random.Random, first_line: int) -> bytes:
+    lines = []
+    t = 0.0
+    for n in range(first_line, first_line + BLOCK_LINES):
+        can_id = rng.choice(IDS)
+        dlc = rng.choice((8, 8, 8, 6, 4, 2))
+        data = " ".join(f"{rng.randrange(256):02X}" for _ in range(dlc))
+        t += rng.random()
+        lines.append(f"{n:>8})  {t:>12.1f}  Rx         {can_id:<8}  {dlc}  {data}\n")
+    return "".join(lines).encode("ascii")
+
+
+def write_trace(path: str, size: int):
+    rng = random.Random(1)
+    blocks = [make_block(rng, i * BLOCK_LINES) for i in range(4)]
+    written = 0
+    with open(path, "wb") as f:
+        f.write(b";$FILEVERSION=1.1\n;   Message Number\n")
+        i = 0
+        while written < size:
+            block = blocks[i % len(blocks)]
+            f.write(block)
+            written += len(block)
+            i += 1
+
+
+def same(a, b) -> bool:
+    return all(np.array_equal(x, y, equal_nan=x.dtype.kind == "f") for x, y in zip(a[:5], b[:5]))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--size-gb", type=float, default=2.0, help="synthetic trace size")
+    ap.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--cap", type=int, default=50, help="MAX_MESSAGES_PER_ID for the capped runs")
+    ap.add_argument("--file", default=None, help="benchmark an existing trace instead")
+    ap.add_argument("--keep", action="store_true", help="don't delete the synthetic trace")
+    args = ap.parse_args()
+
+    path = args.file
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".trc")
+        os.close(fd)
+        t0 = time.perf_counter()
+        write_trace(path, int(args.size_gb * 1e9))
+        print(f"wrote {path} ({os.path.getsize(path) / 1e9:.2f} GB) in {time.perf_counter() - t0:.1f}s")
+
+    counts = [1]
+    while counts[-1] * 2 <= args.max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != args.max_workers:
+        counts.append(args.max_workers)
+
+    size_mb = os.path.getsize(path) / 1e6
+    print(f"cpus={os.cpu_count()}  file={size_mb:,.0f} MB")
+    print(f"{'cap':>6} {'workers':>8} {'seconds':>9} {'MB/s':>8} {'speedup':>8} {'rows':>12}")
+    try:
+        for cap in (args.cap, None):
+            base = base_time = None
+            for workers in counts:
+                t0 = time.perf_counter()
+                result = load_trc(path, cap, workers=workers)
+                elapsed = time.perf_counter() - t0
+                if base is None:
+                    base, base_time = result, elapsed
+                elif not same(base, result):
+                    raise SystemExit(f"workers={workers} cap={cap}: result differs from single process")
+                print(f"{cap or '-':>6} {workers:>8} {elapsed:>9.2f} {size_mb / elapsed:>8.0f} "
+                      f"{base_time / elapsed:>7.2f}x {len(result[0]):>12,}")
+                del result
+    finally:
+        if args.file is None and not args.keep:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+binlog.py  (compact fixed-width binary CAN frame log)
+
+Optional companion to, or replacement for, the JSONL logs. Enabled by
+setting BIN_LOG_FILE for base_IDS / SERVER_ATTACK; LOG_FORMAT picks what
+gets written:
+
+    jsonl    JSONL only (default without BIN_LOG_FILE)
+    both     JSONL + binary (default with BIN_LOG_FILE)
+    binary   binary only, no JSONL lines at all
+
+One writer process per file.
+
+File layout:
+  [0, HEADER_SIZE)   JSON header padded with spaces:
+                       {"magic": "CANBIN", "version": 1, "record_size": 24,
+                        "teams": [{"team_id": "01", "secret_tag": "..."}, ...]}
+                     rewritten in place whenever a new team / tag shows up
+  [HEADER_SIZE, ...) 24-byte little-endian records:
+                       ts      float64   epoch seconds
+                       can_id  uint32    arbitration id
+                       flags   uint8     FLAG_* bits below
+                       dlc     uint8
+                       team    uint16    index into header["teams"]
+                       data    8 x uint8 payload, zero padded
+
+Writing needs only the standard library; BinaryLogReader needs NumPy and
+exposes the records as a memory-mapped structured array.
+
+RUN CODE : python3 binlog.py dump  /opt/ctf_logs/logs/can_log.bin   (as JSONL)
+           python3 binlog.py stats /opt/ctf_logs/logs/can_log.bin
+"""
+
+import argparse
+import atexit
+import json
+import os
+import struct
+import sys
+import threading
+import time
+
+MAGIC = "CANBIN"
+VERSION = 1
+HEADER_SIZE = 65536
+RECORD = struct.Struct("<dIBBH8s")
+RECORD_SIZE = RECORD.size   # 24
+
+FLAG_EXTENDED = 0x01
+FLAG_REMOTE = 0x02
+FLAG_ERROR = 0x04
+FLAG_FD = 0x08
+
+UNKNOWN_TEAM = 0xFFFF       # header full, team not recorded
+
+BIN_FLUSH_BYTES = 64 * 1024
+BIN_FLUSH_MS = float(os.environ.get("BIN_FLUSH_MS", "200"))
+
+LOG_FORMATS = ("jsonl", "binary", "both")
+
+
+def log_format(bin_path: str, tag: str = "LOG") -> str:
+    """LOG_FORMAT for a process whose binary log path is bin_path ("" = none)."""
+    fmt = os.environ.get("LOG_FORMAT", "both" if bin_path else "jsonl").strip().lower()
+    if fmt not in LOG_FORMATS:
+        raise ValueError(f"LOG_FORMAT must be one of {LOG_FORMATS}, got {fmt!r}")
+    if fmt != "jsonl" and not bin_path:
+        print(f"[{tag}] LOG_FORMAT={fmt} needs BIN_LOG_FILE, writing JSONL only", file=sys.stderr)
+        return "jsonl"
+    return fmt
+
+
+def _header_bytes(teams: list) -> bytes:
+    header = json.dumps({
+        "magic": MAGIC,
+        "version": VERSION,
+        "record_size": RECORD_SIZE,
+        "teams": teams,
+    }, ensure_ascii=False).encode("utf-8")
+    if len(header) >= HEADER_SIZE:
+        raise OverflowError("binlog header full")
+    return header + b" " * (HEADER_SIZE - len(header) - 1) + b"\n"
+
+
+def read_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    header = json.loads(raw.decode("utf-8"))
+    if header.get("magic") != MAGIC:
+        raise ValueError(f"{path} is not a {MAGIC} file")
+    if header.get("record_size") != RECORD_SIZE:
+        raise ValueError(f"{path}: unsupported record size {header.get('record_size')}")
+    return header
+
+
+class BinaryLogWriter:
+    """
+    Appends fixed-width frame records. Records are buffered and written
+    once BIN_FLUSH_BYTES have piled up or BIN_FLUSH_MS have passed since the
+    last write (checked on each call), and on flush() / close().
+    """
+
+    def __init__(self, path: str, flush_ms: float = BIN_FLUSH_MS):
+        self.path = path
+        self.flush_interval = max(0.0, flush_ms) / 1000.0
+        self._lock = threading.Lock()
+        self._buf = bytearray()
+        self._last_flush = time.monotonic()
+
+        directory = os.path.dirname(path) or "/"
+        os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o664)
+
+        size = os.fstat(self._fd).st_size
+        if size >= HEADER_SIZE:
+            self.teams = read_header(path)["teams"]
+            # Drop a torn record at the end (crash mid-write)
+            tail = (size - HEADER_SIZE) % RECORD_SIZE
+            if tail:
+                os.ftruncate(self._fd, size - tail)
+        else:
+            self.teams = []
+            os.ftruncate(self._fd, 0)
+            os.pwrite(self._fd, _header_bytes(self.teams), 0)
+        self._team_index = {(t["team_id"], t["secret_tag"]): i for i, t in enumerate(self.teams)}
+        os.lseek(self._fd, 0, os.SEEK_END)
+        atexit.register(self.close)
+
+    def _team(self, team_id: str, secret_tag: str) -> int:
+        key = (str(team_id), str(secret_tag))
+        idx = self._team_index.get(key)
+        if idx is not None:
+            return idx
+        teams = self.teams + [{"team_id": key[0], "secret_tag": key[1]}]
+        try:
+            header = _header_bytes(teams)
+        except OverflowError:
+            return UNKNOWN_TEAM
+        os.pwrite(self._fd, header, 0)
+        self.teams = teams
+        idx = self._team_index[key] = len(teams) - 1
+        return idx
+
+    def write(self, ts: float, can_id: int, data: bytes, team_id: str, secret_tag: str,
+              flags: int = 0, dlc: int = None):
+        data = bytes(data)
+        if dlc is None:
+            dlc = len(data)
+        with self._lock:
+            if self._fd is None:
+                return
+            team = self._team(team_id, secret_tag)
+            self._buf += RECORD.pack(ts, can_id, flags, dlc, team, data[:8])
+            if len(self._buf) >= BIN_FLUSH_BYTES or \
+                    time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def write_message(self, msg, team_id: str, secret_tag: str):
+        """Write a python-can Message."""
+        flags = 0
+        if msg.is_extended_id:
+            flags |= FLAG_EXTENDED
+        if msg.is_remote_frame:
+            flags |= FLAG_REMOTE
+        if msg.is_error_frame:
+            flags |= FLAG_ERROR
+        if getattr(msg, "is_fd", False):
+            flags |= FLAG_FD
+        self.write(msg.timestamp, msg.arbitration_id, msg.data or b"", team_id, secret_tag,
+                   flags, msg.dlc)
+
+    def write_record(self, record: dict, ts: float = None, extended: bool = None):
+        """
+        Write a JSON log record (team_id, secret_tag, can_time, can_id,
+        can_dlc, can_data as the JSONL logs store them). ts / extended
+        default to can_time and "ID above 0x7FF"; pass them when known,
+        since can_id strings don't say whether a low ID was extended.
+        """
+        can_id_str = record.get("can_id", "")
+        can_data = record.get("can_data", "")
+        flags = 0
+        try:
+            can_id = int(can_id_str, 16)
+        except ValueError:
+            can_id, flags = 0, FLAG_ERROR
+        if extended if extended is not None else can_id > 0x7FF:
+            flags |= FLAG_EXTENDED
+        if can_data[:1] in ("R", "r"):
+            flags |= FLAG_REMOTE
+            data = b""
+        else:
+            try:
+                data = bytes.fromhex(can_data.replace(".", ""))
+            except ValueError:
+                data, flags = b"", flags | FLAG_ERROR
+        try:
+            dlc = int(record.get("can_dlc", len(data)))
+        except ValueError:
+            dlc = len(data)
+        if ts is None:
+            try:
+                ts = float(record.get("can_time", 0.0))
+            except ValueError:
+                ts = 0.0
+        self.write(ts, can_id, data, record.get("team_id", ""), record.get("secret_tag", ""),
+                   flags, min(dlc, 255))
+
+    def _flush_locked(self):
+        if self._buf:
+            os.write(self._fd, self._buf)
+            self._buf.clear()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            if self._fd is not None:
+                self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            if self._fd is None:
+                return
+            self._flush_locked()
+            os.close(self._fd)
+            self._fd = None
+
+
+class BinaryLogReader:
+    """
+    Memory-mapped view of a binary log.
+
+        log = BinaryLogReader("/opt/ctf_logs/logs/can_log.bin")
+        rec = log.records                   # numpy structured array (ts, can_id, flags, dlc, team, data)
+        team3 = log.select(team_id="03")    # filtered copy
+        ids, counts = np.unique(rec["can_id"], return_counts=True)
+    """
+
+    def __init__(self, path: str):
+        import numpy as np
+        self.np = np
+        self.path = path
+        header = read_header(path)
+        self.teams = header["teams"]
+        self.dtype = np.dtype([
+            ("ts", "<f8"),
+            ("can_id", "<u4"),
+            ("flags", "u1"),
+            ("dlc", "u1"),
+            ("team", "<u2"),
+            ("data", "u1", (8,)),
+        ])
+        assert self.dtype.itemsize == RECORD_SIZE
+
+        n = (os.path.getsize(path) - HEADER_SIZE) // RECORD_SIZE
+        if n > 0:
+            self.records = np.memmap(path, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(n,))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def team_indexes(self, team_id: str = None, secret_tag: str = None):
+        return [i for i, t in enumerate(self.teams)
+                if (team_id is None or t["team_id"] == str(team_id))
+                and (secret_tag is None or t["secret_tag"] == secret_tag)]
+
+    def select(self, team_id: str = None, secret_tag: str = None, can_id: int = None,
+               since: float = None, until: float = None):
+        """Records matching every given filter (a new array, not a view)."""
+        np = self.np
+        rec = self.records
+        mask = np.ones(len(rec), dtype=bool)
+        if team_id is not None or secret_tag is not None:
+            mask &= np.isin(rec["team"], self.team_indexes(team_id, secret_tag))
+        if can_id is not None:
+            mask &= rec["can_id"] == can_id
+        if since is not None:
+            mask &= rec["ts"] >= since
+        if until is not None:
+            mask &= rec["ts"] <= until
+        return rec[mask]
+
+    def iter_dicts(self, records=None):
+        """Records in the same shape as the JSONL logs."""
+        for r in (self.records if records is None else records):
+            team = self.teams[r["team"]] if r["team"] < len(self.teams) else {}
+            dlc = int(r["dlc"])
+            width = 8 if r["flags"] & FLAG_EXTENDED else 3
+            yield {
+                "team_id": team.get("team_id", ""),
+                "secret_tag": team.get("secret_tag", ""),
+                "can_time": f"{r['ts']:.2f}",
+                "can_id": f"{int(r['can_id']):0{width}X}",
+                "can_dlc": str(dlc),
+                "can_data": "R" if r["flags"] & FLAG_REMOTE else bytes(r["data"][:min(dlc, 8)]).hex().upper(),
+            }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect binary CAN frame logs")
+    ap.add_argument("command", choices=["dump", "stats"])
+    ap.add_argument("path")
+    args = ap.parse_args()
+
+    log = BinaryLogReader(args.path)
+    if args.command == "dump":
+        try:
+            for d in log.iter_dicts():
+                sys.stdout.write(json.dumps(d) + "\n")
+        except BrokenPipeError:
+            pass
+        return
+
+    np = log.np
+    rec = log.records
+    print(f"records: {len(rec)}  ({os.path.getsize(args.path)} bytes on disk)")
+    if len(rec):
+        print(f"time:    {rec['ts'].min():.3f} .. {rec['ts'].max():.3f}")
+    teams, counts = np.unique(rec["team"], return_counts=True)
+    for t, c in zip(teams, counts):
+        name = log.teams[t]["team_id"] if t < len(log.teams) else "?"
+        print(f"team {name:>4}: {c} frames")
+
+
+if __name__ == "__main__":
+    main()
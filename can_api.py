@@ -1,5 +1,9 @@
 import os
+import re
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 
 ########################################################
 #                                                      #
@@ -20,29 +24,207 @@ if not SECRET_TAG:
     # Optional: fail early so it's obvious if env is not set correctly
     raise RuntimeError("SECRET_TAG environment variable is not set")
 
+# Frames per /api/cansend/batch request (the server caps this at its rate limit)
+BATCH_SIZE = 50
+
+# Keep-alive connections kept open to the API (raise it if you send from threads)
+POOL_SIZE = 10
+# Retries on 429 / 502 / 503 / 504 / connection errors before giving up
+MAX_RETRIES = 3
+# First retry waits BACKOFF seconds, then doubles, capped at MAX_BACKOFF
+BACKOFF = 0.2
+MAX_BACKOFF = 15.0
+# Not 500: the API uses it for errors a retry can't fix (bad frame) and for
+# half-sent batches, where a retry would put frames on the bus twice
+RETRY_STATUSES = (429, 502, 503, 504)
+
+_BAN_RE = re.compile(r"Try again in (\d+) seconds")
+
+
+def connect_failed(error: Exception) -> bool:
+    """True if a requests error happened before the connection was made (nothing was sent)."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    cause = error.args[0] if error.args else None
+    return isinstance(cause, NewConnectionError) or \
+        isinstance(getattr(cause, "reason", None), NewConnectionError)
+
+
+def retry_delay(response, attempt: int, backoff: float = BACKOFF, max_backoff: float = MAX_BACKOFF) -> float:
+    """
+    Seconds to wait before the next attempt.
+    For 429 the server's ban time wins (Retry-After header or the
+    "Try again in N seconds." detail); otherwise exponential backoff.
+    """
+    delay = backoff * (2 ** attempt)
+    if response is not None and response.status_code == 429:
+        ban = response.headers.get("Retry-After")
+        if ban is None:
+            try:
+                m = _BAN_RE.search(response.json().get("detail", ""))
+            except ValueError:
+                m = None
+            ban = m.group(1) if m else None
+        if ban is not None:
+            # +1: the server rounds the remaining ban time down
+            delay = max(delay, float(ban) + 1)
+    return min(delay, max_backoff)
+
+
+class CanApiClient:
+    """
+    Reusable client for the central CAN API.
+
+    Keeps one keep-alive requests.Session (pool_size connections) with the
+    auth headers preset, and retries 429 / 502 / 503 / 504 / connection
+    errors up to max_retries times. cansend() and cansend_many() below use a shared
+    instance, so you only need this if you want different settings.
+    """
+
+    def __init__(
+        self,
+        api_base: str = API_BASE,
+        secret_tag: str = SECRET_TAG,
+        team_id: str = TEAM_ID,
+        pool_size: int = POOL_SIZE,
+        max_retries: int = MAX_RETRIES,
+        backoff: float = BACKOFF,
+        max_backoff: float = MAX_BACKOFF,
+        timeout: float = 2,
+    ):
+        self.api_base = api_base
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "X-Secret-Tag": secret_tag,
+            "X-Team-Id": team_id,
+        })
+
+    def _post(self, url: str, data: dict, timeout: float, resend: bool = True):
+        """
+        resend=False: for batches whose frames may already be out. Only
+        429 (refused before anything is sent) and failures to connect are
+        retried; 5xx, resets and read timeouts are raised.
+        """
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self.session.post(url, json=data, timeout=timeout)
+                retry = response.status_code in RETRY_STATUSES if resend else response.status_code == 429
+                if not retry:
+                    response.raise_for_status()
+                    return response.json()
+                error = requests.HTTPError(
+                    f"{response.status_code} Error: {response.text} for url: {url}",
+                    response=response,
+                )
+            except requests.HTTPError:
+                raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not resend and not connect_failed(e):
+                    raise
+                error = e
+
+            if attempt >= self.max_retries:
+                raise error
+            delay = retry_delay(response, attempt, self.backoff, self.max_backoff)
+            print(f"[CAN_API] {error}, retrying in {delay:.1f}s "
+                  f"({attempt + 1}/{self.max_retries})", flush=True)
+            time.sleep(delay)
+            attempt += 1
+
+    def cansend(self, frame: str, interface: str = "can0"):
+        """
+        Send one CAN frame via the central CAN API.
+        frame example: '123#DEADBEEF'
+        """
+        url = f"{self.api_base}/api/cansend"
+        data = {"interface": interface, "frame": frame}
+
+        try:
+            return self._post(url, data, self.timeout)
+        except Exception as e:
+            # This will show up in docker logs
+            print(f"[CAN_API] request failed: {e} (url={url})", flush=True)
+            raise
+
+    def cansend_many(self, frames, interface: str = "can0", batch_size: int = BATCH_SIZE):
+        """
+        Send many CAN frames via the central CAN API, batch_size frames per request.
+        frames: iterable of '123#DEADBEEF' strings or ('123#DEADBEEF', delay_ms)
+                tuples, where delay_ms is the wait after the previous frame.
+        Every frame counts against your rate limit, same as cansend().
+        Returns {"status": "ok", "sent": <total frames>}.
+        """
+        url = f"{self.api_base}/api/cansend/batch"
+        sent = 0
+
+        def post(batch):
+            data = {"interface": interface, "frames": batch}
+            # Allow for the inter-frame delays the server will wait out
+            timeout = self.timeout + sum(item["delay_ms"] for item in batch) / 1000.0
+            try:
+                return self._post(url, data, timeout, resend=False)["sent"]
+            except Exception as e:
+                # This will show up in docker logs
+                print(f"[CAN_API] batch request failed after {sent} frames: {e} (url={url})", flush=True)
+                raise
+
+        batch = []
+        for item in frames:
+            if isinstance(item, str):
+                batch.append({"frame": item, "delay_ms": 0.0})
+            else:
+                frame, delay_ms = item
+                batch.append({"frame": frame, "delay_ms": float(delay_ms)})
+
+            if len(batch) >= batch_size:
+                sent += post(batch)
+                batch = []
+
+        if batch:
+            sent += post(batch)
+
+        return {"status": "ok", "sent": sent}
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+
+
+def get_client() -> CanApiClient:
+    """Shared client used by cansend() / cansend_many()."""
+    global _client
+    if _client is None:
+        _client = CanApiClient()
+    return _client
+
+
 def cansend(frame: str, interface: str = "can0"):
     """
     Send one CAN frame via the central CAN API.
     frame example: '123#DEADBEEF'
     """
-    url = f"{API_BASE}/api/cansend"
-    headers = {
-        "Content-Type": "application/json",
-        "X-Secret-Tag": SECRET_TAG,
-        "X-Team-Id": TEAM_ID,
-    }
-
-    data = {"interface": interface, "frame": frame}
+    return get_client().cansend(frame, interface)
 
-    try:
-        r = requests.post(url, json=data, headers=headers, timeout=2)
-        r.raise_for_status()
-    except Exception as e:
-        # This will show up in docker logs
-        print(f"[CAN_API] request failed: {e} (url={url})", flush=True)
-        raise
 
-    return r.json()
+def cansend_many(frames, interface: str = "can0", batch_size: int = BATCH_SIZE):
+    """
+    Send many CAN frames in /api/cansend/batch requests.
+    See CanApiClient.cansend_many for the frame format.
+    """
+    return get_client().cansend_many(frames, interface, batch_size)
 '''
 def send_attack():
     # this is purely example, you decide IDs/data
@@ -0,0 +1,260 @@
+import asyncio
+import httpx
+import requests
+
+from can_api import (
+    API_BASE, SECRET_TAG, TEAM_ID, BATCH_SIZE,
+    MAX_RETRIES, BACKOFF, MAX_BACKOFF, RETRY_STATUSES, retry_delay,
+)
+
+########################################################
+#                                                      #
+#   asyncio version of can_api.py                      #
+#                                                      #
+#   import asyncio                                     #
+#   from can_api_async import AsyncCanApiClient        #
+#                                                      #
+#   async def main():                                  #
+#       async with AsyncCanApiClient() as api:         #
+#           await api.cansend("123#DEADBEEF")          #
+#           async for frame, resp in api.send_iter(    #
+#                   my_frame_generator()):             #
+#               print(frame, resp)                     #
+#                                                      #
+#   asyncio.run(main())                                #
+#                                                      #
+########################################################
+
+# Requests in flight at the same time
+CONCURRENCY = 10
+
+
+class AsyncCanApiClient:
+    """
+    asyncio counterpart of can_api.CanApiClient.
+
+    Same endpoints, retries and return values; errors are raised as the
+    same requests exceptions (HTTPError / ConnectionError / Timeout) so
+    existing except-blocks keep working. At most `concurrency` requests
+    are in flight at once, however many coroutines call it.
+    """
+
+    def __init__(
+        self,
+        api_base: str = API_BASE,
+        secret_tag: str = SECRET_TAG,
+        team_id: str = TEAM_ID,
+        concurrency: int = CONCURRENCY,
+        max_retries: int = MAX_RETRIES,
+        backoff: float = BACKOFF,
+        max_backoff: float = MAX_BACKOFF,
+        timeout: float = 2,
+    ):
+        self.api_base = api_base
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self._sem = asyncio.Semaphore(self.concurrency)
+        self.client = httpx.AsyncClient(
+            headers={
+                "Content-Type": "application/json",
+                "X-Secret-Tag": secret_tag,
+                "X-Team-Id": team_id,
+            },
+            limits=httpx.Limits(
+                max_connections=self.concurrency,
+                max_keepalive_connections=self.concurrency,
+            ),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def _post(self, url: str, data: dict, timeout: float, resend: bool = True):
+        """See can_api.CanApiClient._post."""
+        attempt = 0
+        while True:
+            response = None
+            try:
+                async with self._sem:
+                    response = await self.client.post(url, json=data, timeout=timeout)
+                if response.status_code < 400:
+                    return response.json()
+                error = requests.HTTPError(
+                    f"{response.status_code} Error: {response.text} for url: {url}",
+                    response=response,
+                )
+                retry = response.status_code in RETRY_STATUSES if resend else response.status_code == 429
+                if not retry:
+                    raise error
+            except (httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                error = requests.ConnectTimeout(str(e))
+            except httpx.ConnectError as e:
+                error = requests.ConnectionError(str(e))
+            except httpx.TimeoutException as e:
+                if not resend:
+                    raise requests.Timeout(str(e))
+                error = requests.Timeout(str(e))
+            except httpx.TransportError as e:
+                # the request may have reached the server (reset, closed mid-response)
+                if not resend:
+                    raise requests.ConnectionError(str(e))
+                error = requests.ConnectionError(str(e))
+
+            if attempt >= self.max_retries:
+                raise error
+            delay = retry_delay(response, attempt, self.backoff, self.max_backoff)
+            print(f"[CAN_API] {error}, retrying in {delay:.1f}s "
+                  f"({attempt + 1}/{self.max_retries})", flush=True)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def cansend(self, frame: str, interface: str = "can0"):
+        """
+        Send one CAN frame via the central CAN API.
+        frame example: '123#DEADBEEF'
+        """
+        url = f"{self.api_base}/api/cansend"
+        data = {"interface": interface, "frame": frame}
+
+        try:
+            return await self._post(url, data, self.timeout)
+        except Exception as e:
+            print(f"[CAN_API] request failed: {e} (url={url})", flush=True)
+            raise
+
+    async def cansend_many(self, frames, interface: str = "can0", batch_size: int = BATCH_SIZE,
+                           parallel: int = 1):
+        """
+        Same as can_api.cansend_many: batches go out one after another, in
+        order, reading `frames` (a normal or async iterable) as it goes.
+        parallel > 1 keeps up to that many batches in flight (capped at
+        `concurrency`); frame order and inter-frame delays then only hold
+        within a batch. If a batch fails, the ones still in flight are
+        cancelled and the error is raised.
+        """
+        url = f"{self.api_base}/api/cansend/batch"
+        parallel = max(1, min(parallel, self.concurrency))
+        sent = 0
+        pending = set()
+
+        async def post(batch):
+            data = {"interface": interface, "frames": batch}
+            timeout = self.timeout + sum(item["delay_ms"] for item in batch) / 1000.0
+            try:
+                return (await self._post(url, data, timeout, resend=False))["sent"]
+            except Exception as e:
+                print(f"[CAN_API] batch request failed after {sent} frames: {e} (url={url})", flush=True)
+                raise
+
+        async def wait_one():
+            nonlocal sent, pending
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                sent += task.result()
+
+        async def submit(batch):
+            while len(pending) >= parallel:
+                await wait_one()
+            pending.add(asyncio.ensure_future(post(batch)))
+
+        batch = []
+        try:
+            async for item in _aiter(frames):
+                if isinstance(item, str):
+                    batch.append({"frame": item, "delay_ms": 0.0})
+                else:
+                    frame, delay_ms = item
+                    batch.append({"frame": frame, "delay_ms": float(delay_ms)})
+                if len(batch) >= batch_size:
+                    await submit(batch)
+                    batch = []
+            if batch:
+                await submit(batch)
+            while pending:
+                await wait_one()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return {"status": "ok", "sent": sent}
+
+    async def send_iter(self, frames, interface: str = "can0", return_exceptions: bool = False):
+        """
+        Async iterator: send every frame from `frames` (a normal or async
+        iterable / generator), keeping up to `concurrency` requests in
+        flight. Yields (frame, response) in completion order.
+        With return_exceptions=True a failed frame yields (frame, exception)
+        instead of stopping the iteration.
+        """
+        async def send_one(frame):
+            try:
+                return frame, await self.cansend(frame, interface)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                return frame, e
+
+        pending = set()
+        try:
+            async for frame in _aiter(frames):
+                if len(pending) >= self.concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+                pending.add(asyncio.ensure_future(send_one(frame)))
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+async def _aiter(frames):
+    """Iterate a normal or async iterable the same way."""
+    if hasattr(frames, "__aiter__"):
+        async for item in frames:
+            yield item
+    else:
+        for item in frames:
+            yield item
+
+
+_client = None
+_client_loop = None
+
+
+def get_client() -> AsyncCanApiClient:
+    """Shared client for the running event loop (used by cansend() below)."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = AsyncCanApiClient()
+        _client_loop = loop
+    return _client
+
+
+async def cansend(frame: str, interface: str = "can0"):
+    """
+    Send one CAN frame via the central CAN API.
+    frame example: '123#DEADBEEF'
+    """
+    return await get_client().cansend(frame, interface)
+
+
+async def cansend_many(frames, interface: str = "can0", batch_size: int = BATCH_SIZE,
+                       parallel: int = 1):
+    """Send many CAN frames in /api/cansend/batch requests (see AsyncCanApiClient.cansend_many)."""
+    return await get_client().cansend_many(frames, interface, batch_size, parallel)
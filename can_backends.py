@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+can_backends.py  (interchangeable CAN frame senders for attack1.CANSender)
+
+Every backend has the same interface:
+
+    backend.send(can_id, data, extended)      one frame, raises on failure
+    backend.send_many([(can_id, data, extended), ...]) -> frames sent
+    backend.stats()                           frames, errors, throughput
+    backend.close()
+
+- subprocess  fork + exec can-utils `cansend` per frame (the original way)
+- socket      raw AF_CAN socket writing packed struct can_frame; send_many
+              hands the whole batch to the kernel with one sendmmsg(2)
+- python_can  python-can SocketCAN bus, one Message per frame
+- api         central attack API, POST /api/cansend per frame (can_api.py)
+- batch_api   central attack API, send_many goes through /api/cansend/batch
+
+`extended` None means "extended if the ID doesn't fit in 11 bits".
+"""
+
+import abc
+import ctypes
+import os
+import socket
+import struct
+import subprocess
+import time
+
+CAN_SFF_MASK = 0x7FF
+CAN_EFF_FLAG = 0x80000000
+CAN_FRAME = struct.Struct("=IB3x8s")   # struct can_frame: can_id, len, pad, data[8]
+
+
+def frame_string(can_id: int, data: bytes, extended: bool = None) -> str:
+    """cansend-style '123#DEADBEEF' (3 hex digits standard, 8 extended)."""
+    if extended is None:
+        extended = can_id > CAN_SFF_MASK
+    return f"{can_id:08X}#{data.hex().upper()}" if extended else f"{can_id:03X}#{data.hex().upper()}"
+
+
+class SenderBackend(abc.ABC):
+    """Base class: timing / counters around _send() and _send_many()."""
+
+    name = "base"
+
+    def __init__(self, interface: str):
+        self.interface = interface
+        self.frames = 0
+        self.errors = 0
+        self.calls = 0
+        self.busy = 0.0          # seconds spent inside send calls
+        self.first = None
+        self.last = None
+
+    def _account(self, t0: float, sent: int, failed: int):
+        t1 = time.perf_counter()
+        if self.first is None:
+            self.first = t0
+        self.last = t1
+        self.busy += t1 - t0
+        self.calls += 1
+        self.frames += sent
+        self.errors += failed
+
+    def send(self, can_id: int, data: bytes, extended: bool = None):
+        if extended is None:
+            extended = can_id > CAN_SFF_MASK
+        t0 = time.perf_counter()
+        try:
+            self._send(can_id, data, extended)
+        except Exception:
+            self._account(t0, 0, 1)
+            raise
+        self._account(t0, 1, 0)
+
+    def send_many(self, frames) -> int:
+        frames = [(can_id, data, can_id > CAN_SFF_MASK if extended is None else extended)
+                  for can_id, data, extended in frames]
+        if not frames:
+            return 0
+        t0 = time.perf_counter()
+        try:
+            sent = self._send_many(frames)
+        except Exception:
+            self._account(t0, 0, len(frames))
+            raise
+        self._account(t0, sent, len(frames) - sent)
+        return sent
+
+    @abc.abstractmethod
+    def _send(self, can_id: int, data: bytes, extended: bool):
+        """Put one frame on the bus; raise on failure."""
+
+    def _send_many(self, frames) -> int:
+        for can_id, data, extended in frames:
+            self._send(can_id, data, extended)
+        return len(frames)
+
+    def stats(self) -> dict:
+        wall = (self.last - self.first) if self.first is not None else 0.0
+        return {
+            "backend": self.name,
+            "frames": self.frames,
+            "errors": self.errors,
+            "calls": self.calls,
+            "busy_s": self.busy,
+            # frames / wall time between first and last send, and per second actually spent sending
+            "frames_per_s": self.frames / wall if wall > 0 else 0.0,
+            "frames_per_busy_s": self.frames / self.busy if self.busy > 0 else 0.0,
+            "us_per_frame": self.busy / self.frames * 1e6 if self.frames else 0.0,
+        }
+
+    def close(self):
+        pass
+
+
+class SubprocessBackend(SenderBackend):
+    name = "subprocess"
+
+    def _send(self, can_id, data, extended):
+        frame = frame_string(can_id, data, extended)
+        result = subprocess.run(["cansend", self.interface, frame], capture_output=True, timeout=1)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode().strip() or f"cansend exited {result.returncode}")
+
+
+# -------- sendmmsg(2) through ctypes --------
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+try:
+    _libc = ctypes.CDLL(None, use_errno=True)
+    _sendmmsg = _libc.sendmmsg
+    _sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    _sendmmsg.restype = ctypes.c_int
+except (OSError, AttributeError):
+    _sendmmsg = None
+
+
+class MMsgBatch:
+    """
+    Preallocated sendmmsg(2) vector for fixed-size datagrams: the iovecs
+    and headers are linked once, each send() only copies the records in.
+    """
+
+    def __init__(self, record_size: int, capacity: int = 256):
+        self.record_size = record_size
+        self.capacity = 0
+        self._grow(capacity)
+
+    def _grow(self, capacity: int):
+        self.buf = ctypes.create_string_buffer(capacity * self.record_size)
+        self.iov = (_IoVec * capacity)()
+        self.msgs = (_MMsgHdr * capacity)()
+        base = ctypes.addressof(self.buf)
+        for i in range(capacity):
+            self.iov[i].iov_base = base + i * self.record_size
+            self.iov[i].iov_len = self.record_size
+            self.msgs[i].msg_hdr.msg_iov = ctypes.pointer(self.iov[i])
+            self.msgs[i].msg_hdr.msg_iovlen = 1
+        self.capacity = capacity
+
+    def send(self, fd: int, records: bytes) -> int:
+        """
+        Send back-to-back records with as few syscalls as the kernel allows.
+        Returns how many were sent; raises OSError if the first one fails.
+        """
+        count = len(records) // self.record_size
+        if count > self.capacity:
+            self._grow(max(count, self.capacity * 2))
+        ctypes.memmove(self.buf, records, count * self.record_size)
+
+        msgs = ctypes.addressof(self.msgs)
+        sent = 0
+        while sent < count:
+            n = _sendmmsg(fd, msgs + sent * ctypes.sizeof(_MMsgHdr), count - sent, 0)
+            if n < 0:
+                err = ctypes.get_errno()
+                if sent:
+                    return sent
+                raise OSError(err, f"sendmmsg: {os.strerror(err)}")
+            sent += n
+        return sent
+
+
+class SocketBackend(SenderBackend):
+    """Raw CAN_RAW socket; `sock` lets tests pass any datagram socket."""
+
+    name = "socket"
+
+    def __init__(self, interface: str, sock: socket.socket = None):
+        super().__init__(interface)
+        if sock is None:
+            sock = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+            try:
+                sock.bind((interface,))
+            except OSError:
+                sock.close()
+                raise
+        self.sock = sock
+        self._batch = MMsgBatch(CAN_FRAME.size) if _sendmmsg is not None else None
+
+    @staticmethod
+    def pack(can_id: int, data: bytes, extended: bool) -> bytes:
+        if extended:
+            can_id |= CAN_EFF_FLAG
+        return CAN_FRAME.pack(can_id, len(data), data)
+
+    def _send(self, can_id, data, extended):
+        self.sock.send(self.pack(can_id, data, extended))
+
+    def _send_many(self, frames) -> int:
+        pack = self.pack
+        if self._batch is None:
+            for frame in frames:
+                self.sock.send(pack(*frame))
+            return len(frames)
+        return self._batch.send(self.sock.fileno(), b"".join(pack(*frame) for frame in frames))
+
+    def close(self):
+        self.sock.close()
+
+
+class PythonCanBackend(SenderBackend):
+    name = "python_can"
+
+    def __init__(self, interface: str, bustype: str = "socketcan"):
+        super().__init__(interface)
+        import can
+        self.can = can
+        self.bus = can.interface.Bus(channel=interface, bustype=bustype)
+
+    def _send(self, can_id, data, extended):
+        self.bus.send(self.can.Message(arbitration_id=can_id, data=data, is_extended_id=extended))
+
+    def close(self):
+        self.bus.shutdown()
+
+
+class ApiBackend(SenderBackend):
+    """Through the central attack API (needs SECRET_TAG / TEAM_ID like can_api.py)."""
+
+    name = "api"
+
+    def __init__(self, interface: str, client=None):
+        super().__init__(interface)
+        if client is None:
+            from can_api import get_client
+            client = get_client()
+        self.client = client
+
+    def _send(self, can_id, data, extended):
+        self.client.cansend(frame_string(can_id, data, extended), self.interface)
+
+
+class BatchApiBackend(ApiBackend):
+    name = "batch_api"
+
+    def _send_many(self, frames) -> int:
+        result = self.client.cansend_many([frame_string(*frame) for frame in frames], self.interface)
+        return int(result.get("sent", len(frames)))
+
+
+BACKENDS = {
+    "subprocess": SubprocessBackend,
+    "socket": SocketBackend,
+    "python_can": PythonCanBackend,
+    "api": ApiBackend,
+    "batch_api": BatchApiBackend,
+}
+
+
+def make_backend(kind: str, interface: str, **kwargs) -> SenderBackend:
+    try:
+        cls = BACKENDS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown sender backend {kind!r}, choose one of {sorted(BACKENDS)}")
+    return cls(interface, **kwargs)
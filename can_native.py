@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+can_native.py  (in-process replacement for forking `cansend`)
+
+- frame_to_message() understands the same frame strings as can-utils cansend:
+    123#DEADBEEF         standard 11-bit ID, up to 8 data bytes
+    12345678#DE.AD.BE.EF extended 29-bit ID, '.' separators allowed
+    123#R  / 123#R4      remote frame (optional DLC after R)
+    123##1DEADBEEF       CAN FD, first nibble after ## is the flags field
+- BusPool keeps one python-can SocketCAN bus per interface and reuses it
+  across calls, so a send is one socket write instead of fork + exec.
+"""
+
+import threading
+
+import can
+
+CAN_SFF_ID_LEN = 3
+CAN_EFF_ID_LEN = 8
+CAN_SFF_MASK = 0x7FF
+CAN_EFF_MASK = 0x1FFFFFFF
+CAN_MAX_DLEN = 8
+CANFD_MAX_DLEN = 64
+CANFD_BRS = 0x01
+CANFD_ESI = 0x02
+
+
+def _parse_hex_bytes(data: str, max_len: int) -> bytes:
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        if data[i] == ".":
+            i += 1
+            continue
+        pair = data[i:i + 2]
+        if len(pair) != 2:
+            raise ValueError(f"odd number of hex digits in data '{data}'")
+        out.append(int(pair, 16))
+        i += 2
+        if len(out) > max_len:
+            raise ValueError(f"too many data bytes (max {max_len})")
+    return bytes(out)
+
+
+def frame_to_message(frame: str) -> can.Message:
+    """
+    Parse a cansend-style frame string into a can.Message.
+    Raises ValueError on anything cansend would reject as a wrong frame format.
+    """
+    frame = frame.strip()
+    if "#" not in frame:
+        raise ValueError(f"Wrong CAN-frame format: '{frame}' (missing '#')")
+
+    id_str, rest = frame.split("#", 1)
+
+    if len(id_str) == CAN_SFF_ID_LEN:
+        is_extended = False
+        mask = CAN_SFF_MASK
+    elif len(id_str) == CAN_EFF_ID_LEN:
+        is_extended = True
+        mask = CAN_EFF_MASK
+    else:
+        raise ValueError(f"Wrong CAN-frame format: '{frame}' (ID must be 3 or 8 hex digits)")
+
+    try:
+        arb_id = int(id_str, 16)
+    except ValueError:
+        raise ValueError(f"Wrong CAN-frame format: '{frame}' (bad ID)")
+    if arb_id > mask:
+        raise ValueError(f"Wrong CAN-frame format: '{frame}' (ID out of range)")
+
+    try:
+        # CAN FD: 123##<flags><data>
+        if rest.startswith("#"):
+            if len(rest) < 2:
+                raise ValueError("missing FD flags")
+            flags = int(rest[1], 16)
+            data = _parse_hex_bytes(rest[2:], CANFD_MAX_DLEN)
+            return can.Message(
+                arbitration_id=arb_id,
+                is_extended_id=is_extended,
+                is_fd=True,
+                bitrate_switch=bool(flags & CANFD_BRS),
+                error_state_indicator=bool(flags & CANFD_ESI),
+                data=data,
+            )
+
+        # Remote frame: 123#R or 123#R<dlc>
+        if rest[:1] in ("R", "r"):
+            dlc_str = rest[1:]
+            dlc = int(dlc_str) if dlc_str else 0
+            if not 0 <= dlc <= CAN_MAX_DLEN:
+                raise ValueError("RTR length must be 0..8")
+            return can.Message(
+                arbitration_id=arb_id,
+                is_extended_id=is_extended,
+                is_remote_frame=True,
+                dlc=dlc,
+            )
+
+        data = _parse_hex_bytes(rest, CAN_MAX_DLEN)
+    except ValueError as e:
+        raise ValueError(f"Wrong CAN-frame format: '{frame}' ({e})")
+
+    return can.Message(
+        arbitration_id=arb_id,
+        is_extended_id=is_extended,
+        data=data,
+    )
+
+
+class BusPool:
+    """
+    One long-lived SocketCAN bus per interface, opened on first use.
+
+    A bus whose send fails is closed and dropped, so the next call reopens
+    it (e.g. after the interface was taken down and brought back up).
+    """
+
+    def __init__(self, bustype: str = "socketcan", fd: bool = True):
+        self.bustype = bustype
+        self.fd = fd
+        self._buses = {}
+        self._lock = threading.Lock()
+
+    def get(self, interface: str) -> can.BusABC:
+        bus = self._buses.get(interface)
+        if bus is not None:
+            return bus
+        with self._lock:
+            bus = self._buses.get(interface)
+            if bus is None:
+                bus = can.interface.Bus(channel=interface, bustype=self.bustype, fd=self.fd)
+                self._buses[interface] = bus
+            return bus
+
+    def discard(self, interface: str):
+        with self._lock:
+            bus = self._buses.pop(interface, None)
+        if bus is not None:
+            try:
+                bus.shutdown()
+            except Exception:
+                pass
+
+    def send(self, interface: str, msg: can.Message):
+        bus = self.get(interface)
+        try:
+            bus.send(msg)
+        except can.CanError:
+            self.discard(interface)
+            raise
+
+    def close(self):
+        with self._lock:
+            buses = list(self._buses.values())
+            self._buses.clear()
+        for bus in buses:
+            try:
+                bus.shutdown()
+            except Exception:
+                pass
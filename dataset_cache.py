@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+dataset_cache.py  (parsed dataset snapshots for attack1.py)
+
+Parsing a multi-GB trace dominates attack1 startup, so the parsed columns
+are saved once and memory-mapped on later runs. The OS page cache then
+shares the pages between every process using the same dataset.
+
+One file per (source path, loader parameters) in DATASET_CACHE_DIR:
+
+  [0, 16)          magic b"TRCCACHE", uint32 version, uint32 header length
+  [16, ...)        JSON header:
+                     {"source": {"path", "mtime_ns", "size"}, "params": {...},
+                      "count": n, "stats": {...},
+                      "index": [[key, start, count], ...]}
+  [data_offset, )  n fixed-width records (id uint32, id_len uint8, dlc uint8,
+                   data 8 x uint8, ts float64), grouped by ID, file order
+                   within an ID
+
+`key` is trc_loader.id_keys() (ID value | digit count << 32), so each ID's
+messages are the contiguous rows [start, start + count).
+
+A cache whose source mtime / size / params don't match is treated as a
+miss and overwritten by the next save().
+"""
+
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+from trc_loader import id_keys
+
+MAGIC = b"TRCCACHE"
+VERSION = 2
+PREAMBLE = struct.Struct("<8sII")
+ALIGN = 64
+
+DATASET_CACHE_DIR = os.environ.get(
+    "DATASET_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "attack1"))
+
+RECORD_DTYPE = np.dtype([
+    ("id", "<u4"),
+    ("id_len", "u1"),
+    ("dlc", "u1"),
+    ("data", "u1", (8,)),
+    ("ts", "<f8"),
+])
+
+
+def _source_info(path: str) -> dict:
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+class DatasetCache:
+    """
+        cache = DatasetCache("dataset200.trc", {"format": "trc", "cap": 50})
+        hit = cache.load()             # (columns, index, stats) or None
+        if hit is None:
+            cache.save(columns, stats)
+            hit = cache.load()
+    """
+
+    def __init__(self, source_path: str, params: dict, cache_dir: str = DATASET_CACHE_DIR):
+        self.source_path = source_path
+        self.params = params
+        abspath = os.path.abspath(source_path)
+        digest = hashlib.sha1(
+            json.dumps([abspath, params], sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(cache_dir, f"{os.path.basename(abspath)}.{digest}.cache")
+
+    def _read_header(self):
+        with open(self.path, "rb") as f:
+            magic, version, header_len = PREAMBLE.unpack(f.read(PREAMBLE.size))
+            if magic != MAGIC or version != VERSION:
+                return None
+            return json.loads(f.read(header_len).decode("utf-8"))
+
+    def load(self):
+        """
+        Memory-map the snapshot if it matches the current source file.
+        Returns ((ids, id_lens, dlc, data, ts), {key: range(rows)}, stats) or None.
+        """
+        try:
+            header = self._read_header()
+            source = _source_info(self.source_path)
+        except (OSError, ValueError, struct.error):
+            return None
+        if not header or header.get("source") != source or header.get("params") != self.params:
+            return None
+
+        count = header["count"]
+        offset = header["data_offset"]
+        if os.path.getsize(self.path) != offset + count * RECORD_DTYPE.itemsize:
+            return None
+        if count:
+            rec = np.memmap(self.path, dtype=RECORD_DTYPE, mode="r", offset=offset, shape=(count,))
+        else:
+            rec = np.zeros(0, dtype=RECORD_DTYPE)
+
+        columns = (rec["id"], rec["id_len"], rec["dlc"], rec["data"], rec["ts"])
+        index = {key: range(start, start + n) for key, start, n in header["index"]}
+        return columns, index, header.get("stats", {})
+
+    def save(self, columns, stats: dict = None):
+        """Write the snapshot (atomically replacing an old one)."""
+        ids, id_lens, dlc, data, ts = columns
+        keys = id_keys(ids, id_lens)
+        order = np.argsort(keys, kind="stable")
+        uniq, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+        rec = np.empty(len(order), dtype=RECORD_DTYPE)
+        rec["id"] = ids[order]
+        rec["id_len"] = id_lens[order]
+        rec["dlc"] = dlc[order]
+        rec["data"] = data[order]
+        rec["ts"] = ts[order]
+
+        header = {
+            "source": _source_info(self.source_path),
+            "params": self.params,
+            "count": len(rec),
+            "stats": stats or {},
+            "index": [[int(k), int(s), int(n)] for k, s, n in zip(uniq, starts, counts)],
+        }
+        # data_offset depends on the header length, which includes data_offset
+        header["data_offset"] = 0
+        while True:
+            raw = json.dumps(header).encode("utf-8")
+            offset = -(-(PREAMBLE.size + len(raw)) // ALIGN) * ALIGN
+            if offset == header["data_offset"]:
+                break
+            header["data_offset"] = offset
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp.{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(PREAMBLE.pack(MAGIC, VERSION, len(raw)))
+            f.write(raw)
+            f.write(b"\0" * (offset - PREAMBLE.size - len(raw)))
+            rec.tofile(f)
+        os.replace(tmp, self.path)
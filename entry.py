@@ -1,10 +1,35 @@
 #!/usr/bin/env python3
 import sys
 import os
-import json
 import shlex
 import time
 
+from jsonl_writer import JsonlWriter
+
+
+# fsync policy for the CAN log: never / always / records:N / ms:T (see jsonl_writer.py)
+# "always" keeps the old fsync-per-line durability for the one-shot CLI. Own
+# variable name: LOG_FSYNC (default never) is the servers' setting.
+CANLOG_FSYNC = os.environ.get("CANLOG_FSYNC", "always")
+
+_writers = {}
+
+
+def get_writer(log_file: str) -> JsonlWriter:
+    """One shared writer per log file for this process."""
+    writer = _writers.get(log_file)
+    if writer is None:
+        # writeable for owner/group; adjust if you want stricter perms
+        writer = JsonlWriter(log_file, fsync=CANLOG_FSYNC, file_mode=0o664, tag="CANLOG")
+        _writers[log_file] = writer
+    return writer
+
+
+def close_writers():
+    for writer in _writers.values():
+        writer.close()
+    _writers.clear()
+
 
 def get_common_meta():
     """Metadata that is constant for this container."""
@@ -44,34 +69,52 @@ def parse_cansend_line(raw_line: str):
 
     # Expected args: ["can0", "4B3#1122334455667788"]
     if len(args) >= 2:
-        frame = args[1]
-        if "#" in frame:
-            can_id_str, data_hex = frame.split("#", 1)
-            can_id_str = can_id_str.strip()
-            data_hex = data_hex.strip().upper()
-            can_data = data_hex
-            can_dlc = len(can_data) // 2  # each pair of hex is 1 byte
-        else:
-            # No data part, just an ID
-            can_id_str = frame.strip()
-            can_data = ""
-            can_dlc = 0
-
-        result.update(
-            {
-                "can_id": can_id_str.upper(),
-                "can_dlc": str(can_dlc),
-                "can_data": can_data,
-            }
-        )
+        result.update(parse_frame(args[1]))
 
     return result
 
 
+def parse_frame(frame: str):
+    """
+    '4B3#1122334455667788' -> {"can_id": "4B3", "can_dlc": "8", "can_data": "1122334455667788"}
+    """
+    if "#" in frame:
+        can_id_str, data_hex = frame.split("#", 1)
+        can_id_str = can_id_str.strip()
+        data_hex = data_hex.strip().upper()
+        can_data = data_hex
+        can_dlc = len(can_data) // 2  # each pair of hex is 1 byte
+    else:
+        # No data part, just an ID
+        can_id_str = frame.strip()
+        can_data = ""
+        can_dlc = 0
+
+    return {
+        "can_id": can_id_str.upper(),
+        "can_dlc": str(can_dlc),
+        "can_data": can_data,
+    }
+
+
 def write_log(raw_line: str):
-    meta = get_common_meta()
+    """Log one wrapper line like the cansend() shell function produces."""
+    _write_record(parse_cansend_line(raw_line), raw_line)
+
+
+def log_cansend(interface: str, frame: str, user: str = "api"):
+    """
+    In-process equivalent of `entry.py log 'CMD=cansend IF=... ARGS="..." USER=...'`.
+    Builds the same record without quoting the fields only to shlex them back.
+    """
+    raw_line = f'CMD=cansend IF={interface} ARGS="{interface} {frame}" USER={user}'
+    parsed = {"raw": raw_line, "if": interface, "user": user}
+    parsed.update(parse_frame(frame))
+    _write_record(parsed, raw_line)
+
 
-    parsed = parse_cansend_line(raw_line)
+def _write_record(parsed: dict, raw_line: str):
+    meta = get_common_meta()
 
     now = time.time()
     can_time = f"{now:.2f}"  # fake "CAN time" from epoch seconds
@@ -89,36 +132,21 @@ def write_log(raw_line: str):
         "raw": parsed.get("raw", raw_line),
     }
 
-    line = json.dumps(record, ensure_ascii=False)
-
-    log_file = meta["log_file"]
-    log_dir = os.path.dirname(log_file) or "/"
-    os.makedirs(log_dir, exist_ok=True)
-
-    existed_before = os.path.exists(log_file)
-
     try:
-        with open(log_file, "a", buffering=1) as f:
-            if not existed_before:
-                try:
-                    # writeable for owner/group; adjust if you want stricter perms
-                    os.chmod(log_file, 0o664)
-                except PermissionError:
-                    pass
-            f.write(line + "\n")
-            f.flush()
-            os.fsync(f.fileno())
+        get_writer(meta["log_file"]).write(record)
     except Exception as e:
         print(f"[CANLOG] Failed to write log: {e}", file=sys.stderr, flush=True)
 
 
 def main():
+    """CLI shim for shell users: entry.py log <message>"""
     if len(sys.argv) < 2 or sys.argv[1] != "log":
         print("Usage: entry.py log <message>", file=sys.stderr)
         sys.exit(1)
 
     msg = " ".join(sys.argv[2:]) if len(sys.argv) > 2 else ""
     write_log(msg)
+    close_writers()
 
 
 if __name__ == "__main__":
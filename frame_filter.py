@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+frame_filter.py  (declarative, precompiled frame filter for base_IDS)
+
+Rules are JSON (or YAML when PyYAML is installed):
+
+    {
+      "default": "drop",                  # forward / drop / user
+      "rules": [
+        {"ids": ["0x018", "0x034"], "action": "forward"},
+        {"ids": ["0x100-0x1FF"], "dlc": [8], "action": "forward"},
+        {"ids": ["0x1F1"], "mask": "FF00000000000000", "value": "0000000000000000",
+         "action": "forward"},
+        {"ids": ["18FEF100"], "extended": true, "action": "user"}
+      ]
+    }
+
+For each frame, the rules that list its ID are tried in file order. The
+first one whose checks pass (DLC in "dlc", data & mask == value) decides.
+If none passes, "default" decides. Actions:
+
+    forward   send it on and log / report it
+    drop      discard it
+    user      hand it to the team's handle_frame as before
+
+Compiled form:
+- a 2048-entry table over the standard IDs, one byte each, holding the
+  action directly when an ID's only rule has no checks;
+- for extended IDs, the rules' IDs and ranges split into disjoint
+  intervals, each holding the checks of every rule covering it in file
+  order: single IDs in a dict, the rest in a sorted list searched with
+  bisect on a dict miss.
+Checks are precomputed ints (DLC bitmask, 64-bit data mask / value), so
+deciding a frame is one table lookup plus at most a few int operations.
+
+kernel_filters() turns the IDs that are always dropped into SocketCAN
+CAN_RAW_FILTER entries (aligned id / mask blocks covering everything
+else), so those frames are discarded by the kernel and never reach
+Python. The cover is a superset; decide() still runs on what arrives.
+
+RUN CODE : python3 frame_filter.py rules.json          (validate + summary)
+"""
+
+import json
+import sys
+from bisect import bisect_right
+
+USER = 0
+FORWARD = 1
+DROP = 2
+_CHECKED = 3          # table marker: look the ID up in _std_checks
+
+ACTIONS = {"user": USER, "forward": FORWARD, "drop": DROP}
+ACTION_NAMES = {v: k for k, v in ACTIONS.items()}
+
+CAN_SFF_MASK = 0x7FF
+CAN_EFF_MASK = 0x1FFFFFFF
+MAX_STD_IDS = CAN_SFF_MASK + 1
+KERNEL_FILTER_MAX = 512       # CAN_RAW_FILTER_MAX in the kernel
+
+
+def _int(value, what: str) -> int:
+    if isinstance(value, int):
+        return value
+    try:
+        return int(str(value).strip(), 16)
+    except ValueError:
+        raise ValueError(f"bad {what} {value!r} (expected hex)")
+
+
+def _id_range(spec, extended: bool):
+    """'0x123' / '123' / 0x123 / '0x100-0x1FF'  ->  (lo, hi)"""
+    limit = CAN_EFF_MASK if extended else CAN_SFF_MASK
+    if isinstance(spec, str) and "-" in spec:
+        lo, hi = (_int(part, "ID") for part in spec.split("-", 1))
+    else:
+        lo = hi = _int(spec, "ID")
+    if not 0 <= lo <= hi <= limit:
+        raise ValueError(f"ID {spec!r} out of range for {'extended' if extended else 'standard'} frames")
+    return lo, hi
+
+
+def _data_int(value, what: str) -> int:
+    """Hex payload string ('FF00', 'FF 00', 'FF.00') as a big-endian 64-bit int, zero padded."""
+    text = str(value).replace(" ", "").replace(".", "")
+    if len(text) > 16 or len(text) % 2:
+        raise ValueError(f"bad {what} {value!r} (up to 8 whole bytes of hex)")
+    return int(text.ljust(16, "0"), 16)
+
+
+class _Check:
+    __slots__ = ("dlc_mask", "mask", "value", "action")
+
+    def __init__(self, rule: dict, action: int):
+        dlcs = rule.get("dlc")
+        self.dlc_mask = -1 if dlcs is None else sum(1 << int(d) for d in dlcs)
+        if "value" in rule and "mask" not in rule:
+            raise ValueError('"value" needs "mask"')
+        self.mask = _data_int(rule["mask"], "mask") if "mask" in rule else 0
+        self.value = _data_int(rule.get("value", ""), "value") & self.mask
+        self.action = action
+
+    @property
+    def unconditional(self) -> bool:
+        return self.dlc_mask == -1 and self.mask == 0
+
+    def matches(self, dlc: int, data: bytes) -> bool:
+        if not (self.dlc_mask >> dlc) & 1:
+            return False
+        if self.mask:
+            return int.from_bytes(bytes(data[:8]).ljust(8, b"\0"), "big") & self.mask == self.value
+        return True
+
+
+class FrameFilter:
+    """
+        rules = FrameFilter.from_file("rules.json")
+        verdict = rules.decide(msg.arbitration_id, msg.is_extended_id, msg.dlc, msg.data)
+        # FORWARD / DROP / USER
+    """
+
+    def __init__(self, spec: dict):
+        if not isinstance(spec, dict) or not isinstance(spec.get("rules", []), list):
+            raise ValueError('rules must be an object with a "rules" list')
+        self.default = self._action(spec.get("default", "user"))
+        self.rule_count = len(spec.get("rules", []))
+
+        std = {}        # id -> [_Check, ...] in rule order
+        ext = []        # (lo, hi, _Check) in rule order
+        for n, rule in enumerate(spec.get("rules", [])):
+            try:
+                check = _Check(rule, self._action(rule.get("action", "forward")))
+                extended = bool(rule.get("extended", False))
+                ids = rule.get("ids")
+                if not ids:
+                    raise ValueError('missing "ids"')
+                for spec_id in ids:
+                    lo, hi = _id_range(spec_id, extended)
+                    if not extended:
+                        for can_id in range(lo, hi + 1):
+                            std.setdefault(can_id, []).append(check)
+                    else:
+                        ext.append((lo, hi, check))
+            except (ValueError, TypeError, KeyError) as e:
+                raise ValueError(f"rule {n}: {e}") from None
+
+        # Standard IDs: action byte per ID, _CHECKED when checks must run
+        table = bytearray([self.default]) * MAX_STD_IDS
+        self._std_checks = {}
+        for can_id, checks in std.items():
+            if checks[0].unconditional:
+                table[can_id] = checks[0].action
+            else:
+                table[can_id] = _CHECKED
+                self._std_checks[can_id] = checks
+        self._std_table = bytes(table)
+
+        # Extended IDs: plain action int, or a check list, per disjoint interval
+        self._ext = {}
+        self._ext_ranges = []    # (lo, hi, action or [_Check]), sorted by lo
+        for lo, hi, checks in _split_intervals(ext):
+            entry = checks[0].action if checks[0].unconditional else checks
+            if lo == hi:
+                self._ext[lo] = entry
+            else:
+                self._ext_ranges.append((lo, hi, entry))
+        self._ext_lo = [lo for lo, _, _ in self._ext_ranges]
+
+    @staticmethod
+    def _action(name) -> int:
+        try:
+            return ACTIONS[str(name).lower()]
+        except KeyError:
+            raise ValueError(f"unknown action {name!r}, choose one of {sorted(ACTIONS)}") from None
+
+    @classmethod
+    def from_file(cls, path: str) -> "FrameFilter":
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith((".yaml", ".yml")):
+                try:
+                    import yaml
+                except ImportError:
+                    raise RuntimeError(f"{path} is YAML, pip install pyyaml (or use JSON)") from None
+                return cls(yaml.safe_load(f))
+            return cls(json.load(f))
+
+    def _run_checks(self, checks, dlc: int, data) -> int:
+        for check in checks:
+            if check.matches(dlc, data):
+                return check.action
+        return self.default
+
+    def decide(self, can_id: int, extended: bool, dlc: int, data) -> int:
+        """FORWARD, DROP or USER for one frame."""
+        if not extended:
+            action = self._std_table[can_id & CAN_SFF_MASK]
+            if action != _CHECKED:
+                return action
+            return self._run_checks(self._std_checks[can_id & CAN_SFF_MASK], dlc, data)
+
+        entry = self._ext.get(can_id)
+        if entry is None:
+            i = bisect_right(self._ext_lo, can_id) - 1
+            if i < 0 or can_id > self._ext_ranges[i][1]:
+                return self.default
+            entry = self._ext_ranges[i][2]
+        if entry.__class__ is int:
+            return entry
+        return self._run_checks(entry, dlc, data)
+
+    def kernel_filters(self, max_filters: int = KERNEL_FILTER_MAX):
+        """
+        python-can can_filters passing every frame this filter might not
+        drop, or None when nothing can be dropped in the kernel. Above
+        max_filters entries, standard IDs are grouped into coarser aligned
+        chunks (more frames reach Python, decide() still drops them).
+        """
+        if self.default != DROP:
+            ext = [{"can_id": 0, "can_mask": 0, "extended": True}]
+        else:
+            ext_blocks = [(can_id, CAN_EFF_MASK) for can_id, entry in self._ext.items() if entry != DROP]
+            for lo, hi, entry in self._ext_ranges:
+                if entry != DROP:
+                    ext_blocks += _aligned_range(lo, hi, 29)
+            ext = [{"can_id": base, "can_mask": mask, "extended": True} for base, mask in ext_blocks]
+            if len(ext) > max_filters // 2:
+                ext = [{"can_id": 0, "can_mask": 0, "extended": True}]
+
+        passing = [can_id for can_id in range(MAX_STD_IDS) if self._std_table[can_id] != DROP]
+        if len(passing) == MAX_STD_IDS and ext[0]["can_mask"] == 0:
+            return None
+
+        budget = max_filters - len(ext)
+        shift = 0
+        while True:
+            chunks = sorted({can_id >> shift for can_id in passing})
+            blocks = [(base << shift, (mask << shift) & CAN_SFF_MASK)
+                      for base, mask in _aligned_blocks(chunks, 11 - shift)]
+            if len(blocks) <= budget:
+                break
+            shift += 1
+        return [{"can_id": base, "can_mask": mask, "extended": False} for base, mask in blocks] + ext
+
+    def summary(self) -> str:
+        counts = {name: self._std_table.count(code) for code, name in ACTION_NAMES.items()}
+        return (f"{self.rule_count} rules, default={ACTION_NAMES[self.default]}; standard IDs: "
+                + ", ".join(f"{n}={c}" for n, c in counts.items())
+                + f", checked={len(self._std_checks)}; extended IDs: {len(self._ext)}"
+                + f" (+{len(self._ext_ranges)} ranges)")
+
+
+def _split_intervals(entries):
+    """
+    [(lo, hi, check)] in rule order -> sorted disjoint [(lo, hi, [check, ...])]
+    where each interval lists, in rule order, the checks of every entry
+    covering all of it. Neighbours with the same list are merged.
+    """
+    bounds = sorted({lo for lo, _, _ in entries} | {hi + 1 for _, hi, _ in entries})
+    out = []
+    for lo, end in zip(bounds, bounds[1:]):
+        checks = [check for a, b, check in entries if a <= lo and end - 1 <= b]
+        if not checks:
+            continue
+        if out and out[-1][1] == lo - 1 and out[-1][2] == checks:
+            out[-1] = (out[-1][0], end - 1, checks)
+        else:
+            out.append((lo, end - 1, checks))
+    return out
+
+
+def _aligned_range(lo: int, hi: int, bits: int):
+    """[lo, hi] -> [(base, mask)] aligned power-of-two blocks (like CIDR aggregation)."""
+    full = (1 << bits) - 1
+    blocks = []
+    while lo <= hi:
+        size = lo & -lo if lo else 1 << bits
+        while size > hi - lo + 1:
+            size >>= 1
+        blocks.append((lo, full & ~(size - 1)))
+        lo += size
+    return blocks
+
+
+def _aligned_blocks(ids, bits: int):
+    """Sorted IDs -> [(base, mask)] covering exactly those IDs."""
+    blocks = []
+    i = 0
+    while i < len(ids):
+        lo = ids[i]
+        while i + 1 < len(ids) and ids[i + 1] == ids[i] + 1:
+            i += 1
+        blocks += _aligned_range(lo, ids[i], bits)
+        i += 1
+    return blocks
+
+
+def load_filter(source):
+    """FrameFilter from a FrameFilter, a rules dict or a file path (None -> None)."""
+    if source is None or isinstance(source, FrameFilter):
+        return source
+    if isinstance(source, dict):
+        return FrameFilter(source)
+    return FrameFilter.from_file(source)
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(f"usage: {sys.argv[0]} rules.json", file=sys.stderr)
+        sys.exit(2)
+    try:
+        rules = FrameFilter.from_file(sys.argv[1])
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"[FILTER] {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"[FILTER] OK: {rules.summary()}")
+
+
+if __name__ == "__main__":
+    main()
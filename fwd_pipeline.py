@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+fwd_pipeline.py  (bounded-queue thread stages for base_IDS.run_forwarder)
+
+A Stage is one worker thread draining one bounded queue. Every item is
+stamped when queued, so each stage knows
+
+    wait     time an item sat in the queue
+    service  time the handler spent on it
+
+and keeps the last LATENCY_SAMPLES of both for percentiles, plus queue
+depth, max depth, processed / dropped / error counts.
+
+When the queue is full, put() either blocks (backpressure, used where the
+producer can afford to wait) or drops the item and counts it (used so
+the forwarding path never waits on disk or network).
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+
+QUEUE_MAX = int(os.environ.get("FWD_QUEUE_MAX", "10000"))
+LATENCY_SAMPLES = 4096
+
+_STOP = object()
+
+
+class LatencyStats:
+    """Fixed ring of recent samples (seconds) plus exact count / max."""
+
+    def __init__(self, size: int = LATENCY_SAMPLES):
+        self.samples = [0.0] * size
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.samples[self.count % len(self.samples)] = value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def summary(self) -> dict:
+        """p50 / p99 over the recent samples and overall max, in microseconds."""
+        recent = sorted(self.samples[:min(self.count, len(self.samples))])
+        if not recent:
+            return {"p50_us": 0.0, "p99_us": 0.0, "max_us": 0.0}
+        return {
+            "p50_us": recent[len(recent) // 2] * 1e6,
+            "p99_us": recent[min(len(recent) - 1, int(len(recent) * 0.99))] * 1e6,
+            "max_us": self.max * 1e6,
+        }
+
+
+class Stage:
+    """
+        log = Stage("log", write_log, block=False)
+        log.start()
+        log.put(record)       # False if dropped
+        log.close()
+        log.stats()
+    """
+
+    def __init__(self, name: str, handler, maxsize: int = QUEUE_MAX, block: bool = False):
+        self.name = name
+        self.handler = handler
+        self.block = block
+        self.queue = queue.Queue(maxsize=max(1, maxsize))
+        self.wait = LatencyStats()
+        self.service = LatencyStats()
+        self.queued = 0
+        self.done = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self._thread = threading.Thread(target=self._run, name=f"fwd-{name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def put(self, item) -> bool:
+        entry = (time.perf_counter(), item)
+        if self.block:
+            self.queue.put(entry)
+        else:
+            try:
+                self.queue.put_nowait(entry)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        self.queued += 1
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def _run(self):
+        clock = time.perf_counter
+        get = self.queue.get
+        while True:
+            t_in, item = get()
+            if item is _STOP:
+                return
+            t0 = clock()
+            try:
+                self.handler(item)
+            except Exception as e:
+                self.errors += 1
+                print(f"[FWD] ERROR in {self.name} stage: {e}", file=sys.stderr)
+            t1 = clock()
+            self.wait.add(t0 - t_in)
+            self.service.add(t1 - t0)
+            self.done += 1
+
+    def close(self, timeout: float = 5.0):
+        """Process what is queued (within timeout), then stop the thread."""
+        if not self._thread.is_alive():
+            return
+        self.queue.put((time.perf_counter(), _STOP))
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "queued": self.queued,
+            "done": self.done,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "wait": self.wait.summary(),
+            "service": self.service.summary(),
+        }
+
+
+def format_stats(stage: Stage) -> str:
+    s = stage.stats()
+    return (f"{stage.name}: depth={s['depth']} (max {s['max_depth']}), done={s['done']}, "
+            f"dropped={s['dropped']}, errors={s['errors']}, "
+            f"wait p50/p99={s['wait']['p50_us']:.0f}/{s['wait']['p99_us']:.0f}us, "
+            f"service p50/p99={s['service']['p50_us']:.0f}/{s['service']['p99_us']:.0f}us")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+ids_detector.py  (streaming per-ID timing anomaly detector for base_IDS)
+
+Keeps inter-arrival statistics for every arbitration ID in preallocated
+arrays indexed by ID (standard IDs directly, extended IDs through a
+slot dict), so each frame costs a handful of array reads and writes.
+
+1. Learning: for the first DETECT_LEARN_S seconds of traffic, every ID
+   keeps an EWMA mean / variance of its inter-arrival time.
+2. At the end of the window each ID's baseline is frozen. The std is
+   floored at MIN_STD_RATIO of the mean so low-jitter IDs don't alert
+   on normal scheduling noise.
+3. Detection, one verdict per frame:
+
+    "injection"  the frame arrived more than DETECT_SIGMA std earlier
+                 than the baseline period after the last normal frame
+                 of its ID (an extra frame squeezed between the real
+                 ones, like attack1.py's drift frames)
+    "frequency"  the ID's running EWMA interval is more than
+                 DETECT_FREQ_TOL away from its baseline (flood / rate change)
+    "new_id"     first frame of an ID that never appeared during
+                 learning; the ID then learns its own baseline for
+                 DETECT_LEARN_S and is judged like the others after that
+    None         normal
+
+An injection frame does not advance the ID's "last normal frame" time,
+so the real frame after it is still measured against the real one
+before it.
+
+    from base_IDS import detector
+    reason = detector.observe(msg)      # None / "injection" / ...
+"""
+
+import math
+import os
+from array import array
+
+LEARN_S = float(os.environ.get("DETECT_LEARN_S", "30"))
+ALPHA = float(os.environ.get("DETECT_ALPHA", "0.05"))
+SIGMA = float(os.environ.get("DETECT_SIGMA", "5"))
+FREQ_TOL = float(os.environ.get("DETECT_FREQ_TOL", "0.25"))
+MIN_SAMPLES = 5          # intervals needed during learning for a baseline
+MIN_STD_RATIO = 0.1      # std floor as a fraction of the baseline period
+EXT_SLOTS = 4096         # extended IDs tracked (first come, first served)
+OBSERVED_CACHE = 1024    # recent messages whose verdict observe() remembers
+
+STD_IDS = 0x800
+
+# per-slot state
+_UNSEEN, _LEARNING, _BASELINE, _SPARSE = range(4)
+
+INJECTION = "injection"
+FREQUENCY = "frequency"
+NEW_ID = "new_id"
+REASONS = (INJECTION, FREQUENCY, NEW_ID)
+
+
+class TimingDetector:
+    """
+        det = TimingDetector()
+        for msg in frames:
+            reason = det.observe(msg)
+    """
+
+    def __init__(self, learn_s: float = LEARN_S, alpha: float = ALPHA, sigma: float = SIGMA,
+                 freq_tol: float = FREQ_TOL, ext_slots: int = EXT_SLOTS):
+        self.learn_s = learn_s
+        self.alpha = alpha
+        self.sigma = sigma
+        self.freq_tol = freq_tol
+        self.learn_end = None            # set from the first frame's timestamp
+        self.new_ids = 0                 # IDs first seen after learning
+
+        size = STD_IDS + ext_slots
+        self.state = bytearray(size)
+        self.last = array("d", bytes(8 * size))       # last arrival, any frame
+        self.last_ok = array("d", bytes(8 * size))    # last arrival not flagged as injection
+        self.until = array("d", bytes(8 * size))      # end of this ID's learning
+        self.mean = array("d", bytes(8 * size))       # EWMA interval (learning), then baseline
+        self.var = array("d", bytes(8 * size))
+        self.low = array("d", bytes(8 * size))        # injection threshold
+        self.rate = array("d", bytes(8 * size))       # running EWMA interval after learning
+        self.samples = array("l", bytes(array("l").itemsize * size))
+        self.alerts = array("l", bytes(array("l").itemsize * size))
+
+        self._ext_slots = {}
+        self._ext_ids = []
+        self.ext_capacity = ext_slots
+        self.untracked = 0               # extended frames beyond EXT_SLOTS
+        self.counts = dict.fromkeys(REASONS, 0)
+        self.frames = 0
+        self._observed = {}              # id(msg) -> (msg, verdict), oldest first
+
+    # -------- per frame --------
+    def observe(self, msg):
+        """
+        Verdict for a python-can Message. Calling it again with the same
+        message (e.g. the forwarder, then handle_frame / handle_frames for
+        a whole batch) returns the first verdict and counts the frame once,
+        for the last OBSERVED_CACHE messages.
+        """
+        seen = self._observed.get(id(msg))
+        if seen is not None and seen[0] is msg:
+            return seen[1]
+        result = self.observe_frame(msg.arbitration_id, msg.is_extended_id, msg.timestamp)
+        # holding msg keeps its id() from being reused while it is cached
+        self._observed[id(msg)] = (msg, result)
+        if len(self._observed) > OBSERVED_CACHE:
+            del self._observed[next(iter(self._observed))]
+        return result
+
+    def _slot(self, can_id: int, extended: bool):
+        if not extended:
+            return can_id & (STD_IDS - 1)
+        slot = self._ext_slots.get(can_id)
+        if slot is None:
+            if len(self._ext_ids) >= self.ext_capacity:
+                return None
+            slot = STD_IDS + len(self._ext_ids)
+            self._ext_slots[can_id] = slot
+            self._ext_ids.append(can_id)
+        return slot
+
+    def observe_frame(self, can_id: int, extended: bool, ts: float):
+        """Verdict for one frame given its ID and arrival time (seconds)."""
+        self.frames += 1
+        slot = self._slot(can_id, extended)
+        if slot is None:
+            self.untracked += 1
+            return None
+        if self.learn_end is None:
+            self.learn_end = ts + self.learn_s
+
+        state = self.state[slot]
+        if state == _UNSEEN:
+            self.state[slot] = _LEARNING
+            self.last[slot] = self.last_ok[slot] = ts
+            if ts < self.learn_end:
+                self.until[slot] = self.learn_end
+                return None
+            # Late newcomer: alert once, then learn it like the rest
+            self.until[slot] = ts + self.learn_s
+            self.new_ids += 1
+            return self._alert(slot, NEW_ID)
+
+        if state == _LEARNING:
+            if ts < self.until[slot]:
+                self._learn(slot, ts - self.last[slot])
+                self.last[slot] = self.last_ok[slot] = ts
+                return None
+            state = self._freeze(slot)
+
+        if state == _BASELINE:
+            return self._check(slot, ts)
+        self.last[slot] = ts
+        return None                          # _SPARSE: too few samples to judge
+
+    def _learn(self, slot: int, dt: float):
+        n = self.samples[slot]
+        if n == 0:
+            self.mean[slot] = dt
+        else:
+            diff = dt - self.mean[slot]
+            incr = self.alpha * diff
+            self.mean[slot] += incr
+            self.var[slot] = (1.0 - self.alpha) * (self.var[slot] + diff * incr)
+        self.samples[slot] = n + 1
+
+    def _freeze(self, slot: int) -> int:
+        if self.samples[slot] < MIN_SAMPLES:
+            self.state[slot] = _SPARSE
+            return _SPARSE
+        mean = self.mean[slot]
+        std = max(math.sqrt(self.var[slot]), mean * MIN_STD_RATIO)
+        self.low[slot] = mean - self.sigma * std
+        self.rate[slot] = mean
+        self.state[slot] = _BASELINE
+        return _BASELINE
+
+    def _check(self, slot: int, ts: float):
+        rate = self.rate[slot] + self.alpha * ((ts - self.last[slot]) - self.rate[slot])
+        self.rate[slot] = rate
+        self.last[slot] = ts
+        if ts - self.last_ok[slot] < self.low[slot]:
+            return self._alert(slot, INJECTION)
+        self.last_ok[slot] = ts
+        mean = self.mean[slot]
+        if abs(rate - mean) > self.freq_tol * mean:
+            return self._alert(slot, FREQUENCY)
+        return None
+
+    def _alert(self, slot: int, reason: str) -> str:
+        self.alerts[slot] += 1
+        self.counts[reason] += 1
+        return reason
+
+    # -------- reporting --------
+    def slot_id(self, slot: int):
+        """(can_id, extended) for a slot."""
+        if slot < STD_IDS:
+            return slot, False
+        return self._ext_ids[slot - STD_IDS], True
+
+    def baseline(self, can_id: int, extended: bool = False):
+        """Frozen baseline period in seconds, or None (still learning / too few samples / unknown)."""
+        slot = self._ext_slots.get(can_id) if extended else can_id & (STD_IDS - 1)
+        if slot is None or self.state[slot] != _BASELINE:
+            return None
+        return self.mean[slot]
+
+    def top(self, n: int = 10):
+        """[(can_id, extended, alerts), ...] for the n IDs with the most alerts."""
+        used = STD_IDS + len(self._ext_ids)
+        slots = sorted((s for s in range(used) if self.alerts[s]), key=lambda s: -self.alerts[s])[:n]
+        return [(*self.slot_id(s), self.alerts[s]) for s in slots]
+
+    def stats(self) -> dict:
+        states = self.state[:STD_IDS + len(self._ext_ids)]
+        return {
+            "frames": self.frames,
+            "learning": self.learn_end is None or any(s == _LEARNING for s in states),
+            "ids_baseline": states.count(_BASELINE),
+            "ids_sparse": states.count(_SPARSE),
+            "ids_new": self.new_ids,
+            "untracked": self.untracked,
+            **self.counts,
+        }
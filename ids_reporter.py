@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+ids_reporter.py  (background report sender for base_IDS)
+
+- run_forwarder() hands records to a BatchReporter and moves on
+- A worker thread batches records by size / time and POSTs them to
+  REPORT_URL + "/batch" over one keep-alive session
+- If the server has no batch endpoint, falls back to one POST per record
+  (same session, so still no reconnect per frame)
+- Connection errors, timeouts, 429 and 5xx are retried REPORT_RETRIES
+  times with backoff. What still fails is spilled ("spill"), put back at
+  the front of the queue ("block") or counted as failed ("drop_oldest")
+- When the queue is full, REPORT_OVERFLOW decides what happens:
+    drop_oldest  - throw away the oldest queued record (default)
+    block        - wait for room (slows the forwarder down)
+    spill        - append to REPORT_SPILL_FILE, replayed when the queue drains
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ===== CONFIG =====
+REPORT_BATCH_SIZE = int(os.environ.get("REPORT_BATCH_SIZE", "200"))
+REPORT_FLUSH_MS   = float(os.environ.get("REPORT_FLUSH_MS", "200"))
+REPORT_QUEUE_MAX  = int(os.environ.get("REPORT_QUEUE_MAX", "50000"))
+REPORT_OVERFLOW   = os.environ.get("REPORT_OVERFLOW", "drop_oldest")
+REPORT_SPILL_FILE = os.environ.get("REPORT_SPILL_FILE", "/tmp/ids_report_spill.jsonl")
+REPORT_TIMEOUT    = float(os.environ.get("REPORT_TIMEOUT", "2.0"))
+REPORT_RETRIES    = int(os.environ.get("REPORT_RETRIES", "3"))
+REPORT_BACKOFF_MS = float(os.environ.get("REPORT_BACKOFF_MS", "200"))   # doubles per retry
+REPORT_MAX_BACKOFF_S = 5.0
+
+# Worth sending again; other statuses mean the server rejected the records
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+OVERFLOW_POLICIES = ("drop_oldest", "block", "spill")
+
+
+class BatchReporter:
+    """
+    Bounded, batching report queue with a single sender thread.
+
+    submit() never does network I/O; it only touches the in-memory queue
+    (or the spill file when the policy is "spill" and the queue is full).
+    """
+
+    def __init__(
+        self,
+        url: str,
+        batch_size: int = REPORT_BATCH_SIZE,
+        flush_ms: float = REPORT_FLUSH_MS,
+        queue_max: int = REPORT_QUEUE_MAX,
+        overflow: str = REPORT_OVERFLOW,
+        spill_file: str = REPORT_SPILL_FILE,
+        timeout: float = REPORT_TIMEOUT,
+        retries: int = REPORT_RETRIES,
+        backoff_ms: float = REPORT_BACKOFF_MS,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}")
+
+        self.url = url
+        self.batch_url = url.rstrip("/") + "/batch"
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_ms) / 1000.0
+        self.queue_max = max(1, queue_max)
+        self.overflow = overflow
+        self.spill_file = spill_file
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.backoff = max(0.0, backoff_ms) / 1000.0
+
+        self._buf = deque()
+        self._cond = threading.Condition()
+        self._spill_lock = threading.Lock()
+        # Leftovers from a previous run get replayed once the queue is idle
+        self._spilled = 1 if os.path.exists(spill_file) else 0
+        self._closed = False
+        # None = not probed yet, True/False = server does / doesn't have /batch
+        self._batch_supported = None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.stats = {
+            "submitted": 0,
+            "sent": 0,
+            "dropped": 0,
+            "spilled": 0,
+            "failed": 0,
+            "retried": 0,
+            "requeued": 0,
+            "batches": 0,
+        }
+
+        self._thread = threading.Thread(target=self._run, name="ids-reporter", daemon=True)
+        self._thread.start()
+
+    # -------- producer side --------
+    def submit(self, record: dict):
+        with self._cond:
+            if self._closed:
+                return
+            self.stats["submitted"] += 1
+
+            if len(self._buf) >= self.queue_max:
+                if self.overflow == "drop_oldest":
+                    self._buf.popleft()
+                    self.stats["dropped"] += 1
+                elif self.overflow == "block":
+                    while len(self._buf) >= self.queue_max and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        return
+                else:  # spill
+                    self._spill([record])
+                    return
+
+            self._buf.append(record)
+            if len(self._buf) >= self.batch_size:
+                self._cond.notify_all()
+
+    # -------- consumer side --------
+    def _take_batch(self):
+        """Wait for a full batch or the flush timer, then pop up to batch_size records."""
+        with self._cond:
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._buf) < self.batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            n = min(len(self._buf), self.batch_size)
+            batch = [self._buf.popleft() for _ in range(n)]
+            if n:
+                # Room freed up for "block" producers
+                self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._send(batch)
+            elif self._spilled:
+                self._replay_spill()
+
+            with self._cond:
+                if self._closed and not self._buf:
+                    return
+
+    def _send(self, batch: list) -> bool:
+        """
+        POST batch, retrying with backoff. Returns False if records were
+        left over after the last retry (then spilled / requeued / failed
+        according to the overflow policy).
+        """
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats["retried"] += len(batch)
+                time.sleep(delay)
+                delay = min(delay * 2, REPORT_MAX_BACKOFF_S)
+            batch = self._post(batch)
+            if not batch:
+                return True
+
+        if self.overflow == "spill":
+            print(f"[REPORT] {len(batch)} records not sent, spilling", file=sys.stderr)
+            self._spill(batch)
+        elif self.overflow == "block" and not self._closed:
+            print(f"[REPORT] {len(batch)} records not sent, requeued", file=sys.stderr)
+            with self._cond:
+                self._buf.extendleft(reversed(batch))
+            self.stats["requeued"] += len(batch)
+        else:
+            print(f"[REPORT] {len(batch)} records not sent, giving up", file=sys.stderr)
+            self.stats["failed"] += len(batch)
+        return False
+
+    def _post(self, batch: list) -> list:
+        """One attempt at sending batch. Returns the records worth retrying."""
+        if self._batch_supported is not False:
+            try:
+                r = self.session.post(self.batch_url, json=batch, timeout=self.timeout)
+            except requests.RequestException as e:
+                print(f"[REPORT] HTTP error: {e}", file=sys.stderr)
+                return batch
+            if r.status_code in (404, 405):
+                print("[REPORT] server has no /batch endpoint, sending one by one", file=sys.stderr)
+                self._batch_supported = False
+            elif r.status_code != 200:
+                print(f"[REPORT] batch error {r.status_code}: {r.text}", file=sys.stderr)
+                if r.status_code in RETRY_STATUSES:
+                    return batch
+                self.stats["failed"] += len(batch)
+                return []
+            else:
+                self._batch_supported = True
+                self.stats["sent"] += len(batch)
+                self.stats["batches"] += 1
+                return []
+
+        retry = []
+        for record in batch:
+            try:
+                r = self.session.post(self.url, json=record, timeout=self.timeout)
+            except requests.RequestException as e:
+                print(f"[REPORT] HTTP error: {e}", file=sys.stderr)
+                retry.append(record)
+                continue
+            if r.status_code != 200:
+                print(f"[REPORT] report error {r.status_code}: {r.text}", file=sys.stderr)
+                if r.status_code in RETRY_STATUSES:
+                    retry.append(record)
+                else:
+                    self.stats["failed"] += 1
+            else:
+                self.stats["sent"] += 1
+        return retry
+
+    # -------- spill file --------
+    def _spill(self, records: list):
+        try:
+            with self._spill_lock:
+                with open(self.spill_file, "a", encoding="utf-8") as f:
+                    for record in records:
+                        f.write(json.dumps(record) + "\n")
+                self._spilled += len(records)
+            self.stats["spilled"] += len(records)
+        except Exception as e:
+            print(f"[REPORT] spill write failed: {e}", file=sys.stderr)
+            self.stats["dropped"] += len(records)
+
+    def _replay_spill(self):
+        """Send spilled records once the in-memory queue has drained."""
+        replay_path = self.spill_file + ".replay"
+        with self._spill_lock:
+            try:
+                os.replace(self.spill_file, replay_path)
+            except FileNotFoundError:
+                self._spilled = 0
+                return
+            self._spilled = 0
+
+        try:
+            # Once a batch can't be sent, the rest goes straight back to the
+            # spill file instead of waiting out the retries batch by batch
+            sending = True
+            batch = []
+            with open(replay_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        batch.append(json.loads(line))
+                    except ValueError:
+                        continue
+                    if len(batch) >= self.batch_size:
+                        if sending:
+                            sending = self._send(batch)
+                        else:
+                            self._spill(batch)
+                        batch = []
+            if batch:
+                if sending:
+                    self._send(batch)
+                else:
+                    self._spill(batch)
+        finally:
+            try:
+                os.remove(replay_path)
+            except OSError:
+                pass
+
+    # -------- shutdown --------
+    def close(self, timeout: float = 5.0):
+        """Flush what is queued (best effort within timeout) and stop the worker."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self.session.close()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+jsonl_writer.py  (shared append-only JSONL log writer)
+
+Used by SERVER_ATTACK, SERVER_DEFENSE and entry.py instead of
+open/append/close (and sometimes fsync) per record.
+
+- The file stays open; callers only queue lines
+- One writer thread drains the queue as a group: one write() + flush()
+  for everything queued since the last round, every LOG_FLUSH_MS or as
+  soon as LOG_FLUSH_RECORDS lines are waiting
+- fsync policy (LOG_FSYNC, for entry.py CANLOG_FSYNC with default always):
+    never        - leave it to the OS (default)
+    always       - fsync after every group write (group commit)
+    records:N    - fsync once at least N records were written since the last one
+    ms:T         - fsync at most every T milliseconds
+- If the file is moved or deleted underneath us (logrotate, manual mv),
+  the writer notices within ROTATION_CHECK_S and reopens the path.
+  reopen() forces that, e.g. from a SIGHUP handler.
+- Optional size/time rotation into compressed segments with a manifest
+  (LOG_ROTATE_BYTES / LOG_ROTATE_SECONDS / LOG_COMPRESS, see log_segments.py)
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from log_segments import LOG_ROTATE_BYTES, LOG_ROTATE_SECONDS, LOG_COMPRESS, SegmentManager
+
+LOG_FSYNC = os.environ.get("LOG_FSYNC", "never")
+LOG_FLUSH_MS = float(os.environ.get("LOG_FLUSH_MS", "50"))
+LOG_FLUSH_RECORDS = int(os.environ.get("LOG_FLUSH_RECORDS", "1000"))
+LOG_MAX_PENDING = int(os.environ.get("LOG_MAX_PENDING", "100000"))
+ROTATION_CHECK_S = 1.0
+
+
+def parse_fsync_policy(spec: str):
+    """
+    'never' / 'always' / 'records:N' / 'ms:T'  ->  (every_records, every_seconds)
+    None means that trigger is off.
+    """
+    spec = (spec or "never").strip().lower()
+    if spec == "never":
+        return None, None
+    if spec == "always":
+        return 1, None
+    kind, _, value = spec.partition(":")
+    try:
+        if kind == "records" and int(value) > 0:
+            return int(value), None
+        if kind == "ms" and float(value) >= 0:
+            return None, float(value) / 1000.0
+    except ValueError:
+        pass
+    raise ValueError(f"Bad fsync policy {spec!r} (use never, always, records:N or ms:T)")
+
+
+class JsonlWriter:
+    """
+    Append-only JSONL file with group commit.
+
+    write() / write_line() never touch the file; they hand the line to the
+    writer thread and return. flush() blocks until everything queued so far
+    is written (and fsynced, with sync=True).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fsync: str = LOG_FSYNC,
+        flush_ms: float = LOG_FLUSH_MS,
+        flush_records: int = LOG_FLUSH_RECORDS,
+        max_pending: int = LOG_MAX_PENDING,
+        file_mode: int = None,
+        tag: str = "LOG",
+        rotate_bytes: int = LOG_ROTATE_BYTES,
+        rotate_seconds: float = LOG_ROTATE_SECONDS,
+        compress: str = LOG_COMPRESS,
+    ):
+        self.path = path
+        self.fsync_every, self.fsync_interval = parse_fsync_policy(fsync)
+        self.flush_interval = max(0.0, flush_ms) / 1000.0
+        self.flush_records = max(1, flush_records)
+        self.max_pending = max(1, max_pending)
+        self.file_mode = file_mode   # chmod applied when we create the file
+        self.tag = tag
+        self.error = None            # last write error, None once the file works again
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._queued = 0         # lines handed to us so far
+        self._written = 0        # lines written to the OS so far
+        self._synced = 0         # lines known to be on disk
+        self._unsynced = 0       # lines written since the last fsync
+        self._last_fsync = time.monotonic()
+        self._sync_requested = False
+        self._reopen_requested = False
+        self._closed = False
+
+        self._f = None
+        self._ino = None
+        self._next_rotation_check = 0.0
+        self._next_retry = 0.0
+
+        self._segments = None
+        if rotate_bytes > 0 or rotate_seconds > 0:
+            self._segments = SegmentManager(path, rotate_bytes, rotate_seconds, compress, tag)
+
+        self._thread = threading.Thread(target=self._run, name=f"jsonl-writer:{path}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # -------- producer side --------
+    def write(self, record: dict):
+        self.write_line(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def write_line(self, line: str):
+        self.write_lines([line])
+
+    def write_lines(self, lines: list):
+        with self._cond:
+            if self._closed:
+                raise ValueError(f"write to closed JsonlWriter({self.path})")
+            # Back-pressure instead of unbounded memory if the disk stalls
+            while len(self._pending) >= self.max_pending and not self._closed:
+                self._cond.wait()
+            self._pending.extend(lines)
+            self._queued += len(lines)
+            if len(self._pending) >= self.flush_records:
+                self._cond.notify_all()
+
+    def flush(self, sync: bool = False, timeout: float = None) -> bool:
+        """Wait until everything queued so far is written (and fsynced if sync)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._queued
+            if sync:
+                self._sync_requested = True
+            self._cond.notify_all()
+            while (self._synced if sync else self._written) < target:
+                if not self._thread.is_alive():
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def reopen(self):
+        """Close and reopen the path on the next write round (after external rotation)."""
+        with self._cond:
+            self._reopen_requested = True
+            self._cond.notify_all()
+
+    def close(self, timeout: float = 5.0):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if self._segments is not None:
+            self._segments.close()
+
+    # -------- writer thread --------
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not (self._closed or self._sync_requested or self._reopen_requested
+                           or len(self._pending) >= self.flush_records):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                lines = list(self._pending)
+                self._pending.clear()
+                want_sync = self._sync_requested
+                self._sync_requested = False
+                reopen = self._reopen_requested
+                self._reopen_requested = False
+                closing = self._closed
+                self._cond.notify_all()
+
+            if reopen:
+                self._close_file()
+            if lines:
+                self._write(lines)
+            elif self.error is not None and not closing:
+                self._retry()
+            self._maybe_fsync(explicit=want_sync, closing=closing)
+
+            with self._cond:
+                self._cond.notify_all()
+                if closing and not self._pending:
+                    break
+
+        self._close_file()
+
+    def _open(self):
+        directory = os.path.dirname(self.path) or "/"
+        os.makedirs(directory, exist_ok=True)
+        existed = os.path.exists(self.path)
+        self._f = open(self.path, "a", encoding="utf-8")
+        st = os.fstat(self._f.fileno())
+        self._ino = st.st_ino
+        if self._segments is not None:
+            self._segments.opened(st.st_size)
+        if not existed and self.file_mode is not None:
+            try:
+                os.chmod(self.path, self.file_mode)
+            except PermissionError:
+                pass
+        self._next_rotation_check = time.monotonic() + ROTATION_CHECK_S
+
+    def _close_file(self):
+        if self._f is None:
+            return
+        try:
+            if self._unsynced and self._fsync_enabled():
+                self._f.flush()
+                os.fsync(self._f.fileno())
+        except Exception:
+            pass
+        try:
+            self._f.close()
+        except Exception:
+            pass
+        self._f = None
+        self._ino = None
+
+    def _check_rotation(self):
+        """Reopen if the path no longer points at the file we hold open."""
+        now = time.monotonic()
+        if now < self._next_rotation_check:
+            return
+        self._next_rotation_check = now + ROTATION_CHECK_S
+        try:
+            moved = os.stat(self.path).st_ino != self._ino
+        except FileNotFoundError:
+            moved = True
+        if moved:
+            self._close_file()
+
+    def _retry(self):
+        """
+        Reopen the path after a failed write, at most every ROTATION_CHECK_S,
+        so `error` clears once the file is usable again even if callers stop
+        queueing lines while it is set.
+        """
+        now = time.monotonic()
+        if now < self._next_retry:
+            return
+        self._next_retry = now + ROTATION_CHECK_S
+        try:
+            self._close_file()
+            self._open()
+            self._f.flush()
+        except Exception as e:
+            self.error = e
+            self._close_file()
+            return
+        self.error = None
+        print(f"[{self.tag}] {self.path} writable again", file=sys.stderr, flush=True)
+
+    def _write(self, lines: list):
+        try:
+            if self._f is not None:
+                self._check_rotation()
+            if self._f is None:
+                self._open()
+            self._f.write("".join(lines))
+            self._f.flush()
+            if self.error is not None:
+                self.error = None
+                print(f"[{self.tag}] {self.path} writable again", file=sys.stderr, flush=True)
+            if self._segments is not None:
+                self._segments.wrote(len(lines))
+                ino = self._ino
+                if self._segments.should_rotate(os.fstat(self._f.fileno()).st_size):
+                    self._close_file()
+                    self._segments.rotate(ino)
+        except Exception as e:
+            self.error = e
+            self._next_retry = time.monotonic() + ROTATION_CHECK_S
+            print(f"[{self.tag}] write to {self.path} failed, dropped {len(lines)} lines: {e}",
+                  file=sys.stderr, flush=True)
+            self._close_file()
+        # Dropped lines count as "done" so flush() never waits forever
+        with self._cond:
+            self._written += len(lines)
+        self._unsynced += len(lines)
+
+    def _fsync_enabled(self) -> bool:
+        return self.fsync_every is not None or self.fsync_interval is not None
+
+    def _maybe_fsync(self, explicit: bool, closing: bool):
+        """
+        fsync when the policy says it's due, on closing (unless policy is
+        never), or always when a caller asked for flush(sync=True).
+        """
+        if not self._unsynced:
+            with self._cond:
+                self._synced = self._written
+            return
+
+        due = explicit or (closing and self._fsync_enabled())
+        if self.fsync_every is not None and self._unsynced >= self.fsync_every:
+            due = True
+        if self.fsync_interval is not None and time.monotonic() - self._last_fsync >= self.fsync_interval:
+            due = True
+        if not due:
+            return
+
+        if self._f is not None:
+            try:
+                os.fsync(self._f.fileno())
+            except Exception as e:
+                print(f"[{self.tag}] fsync of {self.path} failed: {e}", file=sys.stderr, flush=True)
+        self._last_fsync = time.monotonic()
+        self._unsynced = 0
+        with self._cond:
+            self._synced = self._written
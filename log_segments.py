@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+log_segments.py  (segment rotation, compression and reading for JSONL logs)
+
+When rotation is enabled on a JsonlWriter, the active file (e.g.
+can_log.jsonl) is closed once it reaches LOG_ROTATE_BYTES or has been
+open for LOG_ROTATE_SECONDS, renamed to a closed segment
+
+    can_log.20261017T210500Z.jsonl   ->   can_log.20261017T210500Z.jsonl.gz
+
+and compressed in the background (gzip, or zstd when the `zstandard`
+package is installed). Compression starts COMPRESS_DELAY_S after the
+rename: other processes appending to the same log only notice the
+rename on their next inode check (jsonl_writer.ROTATION_CHECK_S), and
+until then their lines still land in the renamed segment.
+can_log.manifest.json lists every closed segment with its first/last
+write time, record count and size, oldest first.
+
+iter_lines() / iter_records() read the whole logical stream: all segments
+in order (optionally only those overlapping a time range), then the
+active file.
+
+RUN CODE : python3 log_segments.py cat /opt/ctf_logs/logs/can_log.jsonl [--since TS] [--until TS]
+           python3 log_segments.py ls  /opt/ctf_logs/logs/can_log.jsonl
+"""
+
+import argparse
+import fcntl
+import gzip
+import io
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+LOG_ROTATE_BYTES = int(os.environ.get("LOG_ROTATE_BYTES", "0"))        # 0 = no size limit
+LOG_ROTATE_SECONDS = float(os.environ.get("LOG_ROTATE_SECONDS", "0"))  # 0 = no time limit
+LOG_COMPRESS = os.environ.get("LOG_COMPRESS", "gzip")                  # gzip / zstd / none
+
+COMPRESS_SUFFIX = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+# > jsonl_writer.ROTATION_CHECK_S, so every appender has moved to the new file
+COMPRESS_DELAY_S = 3.0
+
+
+def manifest_path(path: str) -> str:
+    root, _ = os.path.splitext(path)
+    return f"{root}.manifest.json"
+
+
+def read_manifest(path: str) -> dict:
+    try:
+        with open(manifest_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"active": os.path.basename(path), "active_first_ts": None, "segments": []}
+
+
+def _write_manifest(path: str, manifest: dict):
+    target = manifest_path(path)
+    tmp = f"{target}.tmp.{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, target)
+
+
+@contextmanager
+def _manifest_lock(path: str):
+    """Cross-process lock, several processes may append to the same log."""
+    with open(manifest_path(path) + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _open_segment(file_path: str):
+    """Open a (possibly compressed) segment for text reading."""
+    if file_path.endswith(".gz"):
+        return gzip.open(file_path, "rt", encoding="utf-8")
+    if file_path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{file_path} is zstd compressed, pip install zstandard to read it")
+        raw = open(file_path, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True),
+                                encoding="utf-8")
+    return open(file_path, "r", encoding="utf-8")
+
+
+class SegmentManager:
+    """
+    Rotation policy + manifest + background compressor for one log path.
+    JsonlWriter calls should_rotate() after each group write and rotate()
+    (from its writer thread, with the file closed) when it says so.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        rotate_bytes: int = LOG_ROTATE_BYTES,
+        rotate_seconds: float = LOG_ROTATE_SECONDS,
+        compress: str = LOG_COMPRESS,
+        tag: str = "LOG",
+    ):
+        if compress not in COMPRESS_SUFFIX:
+            raise ValueError(f"compress must be one of {sorted(COMPRESS_SUFFIX)}, got {compress!r}")
+        if compress == "zstd" and zstandard is None:
+            print(f"[{tag}] zstandard not installed, compressing segments with gzip", file=sys.stderr)
+            compress = "gzip"
+
+        self.path = path
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.tag = tag
+
+        self.first_ts = None     # wall time of first write into the active file
+        self.last_ts = None
+        self.records = 0
+
+        self._jobs = queue.Queue()
+        self._compressor = None
+        if compress != "none":
+            self._compressor = threading.Thread(target=self._compress_loop,
+                                                name=f"log-compress:{path}", daemon=True)
+            self._compressor.start()
+            # Segments left uncompressed by a previous run
+            for seg in read_manifest(path)["segments"]:
+                if not seg.get("compressed"):
+                    self._jobs.put((seg["file"], time.monotonic() + COMPRESS_DELAY_S))
+
+    @property
+    def enabled(self) -> bool:
+        return self.rotate_bytes > 0 or self.rotate_seconds > 0
+
+    # -------- called by the writer thread --------
+    def opened(self, size: int):
+        """The active file was (re)opened and already holds `size` bytes."""
+        self.records = 0
+        self.first_ts = None
+        if size and self.enabled:
+            self.first_ts = read_manifest(self.path).get("active_first_ts")
+
+    def wrote(self, n_records: int):
+        now = time.time()
+        if self.first_ts is None:
+            self.first_ts = now
+            if self.enabled:
+                with _manifest_lock(self.path):
+                    manifest = read_manifest(self.path)
+                    manifest["active_first_ts"] = now
+                    _write_manifest(self.path, manifest)
+        self.last_ts = now
+        self.records += n_records
+
+    def should_rotate(self, size: int) -> bool:
+        if self.rotate_bytes > 0 and size >= self.rotate_bytes:
+            return True
+        if self.rotate_seconds > 0 and self.first_ts is not None \
+                and time.time() - self.first_ts >= self.rotate_seconds:
+            return True
+        return False
+
+    def rotate(self, ino: int):
+        """
+        Turn the active file into a closed segment. `ino` is the inode the
+        writer had open; if another process already rotated it, do nothing.
+        """
+        with _manifest_lock(self.path):
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return
+            if st.st_ino != ino or st.st_size == 0:
+                return
+
+            root, ext = os.path.splitext(self.path)
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+            segment = f"{root}.{stamp}{ext}"
+            n = 1
+            while os.path.exists(segment) or os.path.exists(segment + COMPRESS_SUFFIX[self.compress]):
+                n += 1
+                segment = f"{root}.{stamp}-{n}{ext}"
+            os.rename(self.path, segment)
+
+            manifest = read_manifest(self.path)
+            manifest["segments"].append({
+                "file": os.path.basename(segment),
+                "first_ts": self.first_ts,
+                "last_ts": self.last_ts,
+                # records written by *this* process; other appenders aren't counted
+                "records": self.records,
+                "bytes": st.st_size,
+                "compressed": None,
+            })
+            manifest["active_first_ts"] = None
+            _write_manifest(self.path, manifest)
+
+        self.first_ts = None
+        self.last_ts = None
+        self.records = 0
+        if self._compressor is not None:
+            self._jobs.put((os.path.basename(segment), time.monotonic() + COMPRESS_DELAY_S))
+
+    def close(self, timeout: float = 30.0):
+        """Wait for queued compressions to finish."""
+        if self._compressor is None:
+            return
+        self._jobs.put(None)
+        self._compressor.join(timeout)
+
+    # -------- compressor thread --------
+    def _compress_loop(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            name, not_before = job
+            delay = not_before - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self._compress(name)
+            except Exception as e:
+                print(f"[{self.tag}] compressing {name} failed: {e}", file=sys.stderr, flush=True)
+
+    def _compress(self, name: str):
+        directory = os.path.dirname(self.path)
+        src = os.path.join(directory, name)
+        dst = src + COMPRESS_SUFFIX[self.compress]
+        tmp = dst + ".tmp"
+        if not os.path.exists(src):
+            return
+
+        # Compress again if a late appender grew the segment meanwhile
+        size = -1
+        while os.path.getsize(src) != size:
+            size = os.path.getsize(src)
+            with open(src, "rb") as fin:
+                if self.compress == "gzip":
+                    with gzip.open(tmp, "wb", compresslevel=6) as fout:
+                        while True:
+                            chunk = fin.read(1 << 20)
+                            if not chunk:
+                                break
+                            fout.write(chunk)
+                else:
+                    with open(tmp, "wb") as fout:
+                        zstandard.ZstdCompressor(level=3).copy_stream(fin, fout)
+        os.replace(tmp, dst)
+
+        with _manifest_lock(self.path):
+            manifest = read_manifest(self.path)
+            for seg in manifest["segments"]:
+                if seg["file"] == name:
+                    seg["file"] = os.path.basename(dst)
+                    seg["compressed"] = self.compress
+                    seg["bytes"] = size
+                    seg["compressed_bytes"] = os.path.getsize(dst)
+            _write_manifest(self.path, manifest)
+        # Only after the manifest points at the compressed copy
+        os.remove(src)
+
+
+# -------- readers --------
+def list_segments(path: str, since: float = None, until: float = None):
+    """Closed segments (full paths) overlapping [since, until], oldest first."""
+    directory = os.path.dirname(path)
+    out = []
+    for seg in read_manifest(path)["segments"]:
+        first, last = seg.get("first_ts"), seg.get("last_ts")
+        if since is not None and last is not None and last < since:
+            continue
+        if until is not None and first is not None and first > until:
+            continue
+        out.append(os.path.join(directory, seg["file"]))
+    return out
+
+
+def iter_lines(path: str, since: float = None, until: float = None):
+    """
+    Every line of the logical log: matching segments, then the active file.
+    The time filter works on whole segments (by write time); filter records
+    yourself if you need exact bounds.
+    """
+    for seg_path in list_segments(path, since, until):
+        candidates = [seg_path]
+        if not seg_path.endswith((".gz", ".zst")):
+            # May have been compressed (and removed) since we read the manifest
+            candidates += [seg_path + ".gz", seg_path + ".zst"]
+        for candidate in candidates:
+            try:
+                f = _open_segment(candidate)
+            except FileNotFoundError:
+                continue
+            with f:
+                yield from f
+            break
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from f
+    except FileNotFoundError:
+        pass
+
+
+def iter_records(path: str, since: float = None, until: float = None):
+    for line in iter_lines(path, since, until):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Read rotated JSONL logs as one stream")
+    ap.add_argument("command", choices=["cat", "ls"])
+    ap.add_argument("path", help="active log path, e.g. /opt/ctf_logs/logs/can_log.jsonl")
+    ap.add_argument("--since", type=float, default=None, help="epoch seconds")
+    ap.add_argument("--until", type=float, default=None, help="epoch seconds")
+    args = ap.parse_args()
+
+    if args.command == "ls":
+        for seg in read_manifest(args.path)["segments"]:
+            print(f"{seg['file']}  {seg.get('first_ts')}..{seg.get('last_ts')}  "
+                  f"records={seg.get('records')} bytes={seg.get('bytes')} "
+                  f"compressed={seg.get('compressed_bytes', '-')}")
+        print(f"{os.path.basename(args.path)}  (active)")
+        return
+
+    try:
+        for line in iter_lines(args.path, args.since, args.until):
+            sys.stdout.write(line)
+    except BrokenPipeError:
+        pass
+
+
+if __name__ == "__main__":
+    main()
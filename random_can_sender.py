@@ -4,17 +4,60 @@ random_can_sender.py
 
 Continuously sends random CAN frames on can0.
 Use this to simulate traffic.
+
+SENDER_MODE=bcm hands the timing to the kernel instead: BCM_IDS random IDs
+each get a cyclic BCM task every BCM_PERIOD_MS, and their payloads are
+re-randomized every BCM_REFRESH_S (see bcm_sender.py).
 """
 
 import can
+import os
 import random
 import time
 
+SENDER_MODE = os.environ.get("SENDER_MODE", "loop")      # loop / bcm
+BCM_IDS = int(os.environ.get("BCM_IDS", "10"))
+BCM_PERIOD_MS = float(os.environ.get("BCM_PERIOD_MS", "100"))
+BCM_REFRESH_S = float(os.environ.get("BCM_REFRESH_S", "1.0"))
+BCM_FRAMES = 8   # payloads per task, sent in turn by the kernel
+
+
+def random_payloads(dlc: int, count: int):
+    return [bytes(random.getrandbits(8) for _ in range(dlc)) for _ in range(count)]
+
+
+def run_bcm(bus):
+    from bcm_sender import CyclicSender
+
+    sender = CyclicSender("can0", bus=bus)
+    ids = random.sample(range(0x000, 0x800), BCM_IDS)
+    dlcs = {arb_id: random.randint(0, 8) for arb_id in ids}
+    for arb_id in ids:
+        sender.start(arb_id, random_payloads(dlcs[arb_id], BCM_FRAMES), BCM_PERIOD_MS / 1000.0,
+                     is_extended_id=False)
+
+    print(f"[SENDER] BCM: {len(ids)} cyclic tasks every {BCM_PERIOD_MS:g} ms "
+          f"({sender.frame_rate():.0f} frames/s). Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(BCM_REFRESH_S)
+            for arb_id in ids:
+                sender.update(arb_id, random_payloads(dlcs[arb_id], BCM_FRAMES), is_extended_id=False)
+    finally:
+        sender.close()
+
 
 def main():
     # Open SocketCAN interface can0
     bus = can.interface.Bus(channel="can0", bustype="socketcan")
 
+    if SENDER_MODE == "bcm":
+        try:
+            run_bcm(bus)
+        except KeyboardInterrupt:
+            print("\n[SENDER] Stopped.")
+        return
+
     print("[SENDER] Sending random CAN frames on can0. Press Ctrl+C to stop.")
     try:
         while True:
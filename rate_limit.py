@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+rate_limit.py  (per-secret_tag rate limiters for SERVER_ATTACK)
+
+All limiters share one interface:
+
+    limiter.check(tag, cost=1) -> (allowed: bool, seconds_remaining: int)
+
+and the same ban rule as the original check_rate_limit: once a tag goes
+over `max_requests` per `window` seconds it is refused for `ban_duration`
+seconds, then starts again from a clean slate.
+
+- DequeLimiter         exact sliding log, one timestamp per request
+                       (the original design, kept for comparison)
+- SlidingWindowLimiter sliding-window counter: two counters per tag,
+                       previous window weighted by how much of it overlaps
+- TokenBucketLimiter   bucket of `max_requests` tokens refilled at
+                       max_requests / window per second
+
+The last two use constant memory per tag. State is split over `stripes`
+independent lock + dict pairs picked by hash(tag), so teams don't
+serialize on one global lock. Tags idle for longer than the window (and
+not banned) are swept out of their stripe once per window.
+"""
+
+import abc
+import math
+import threading
+import time
+from collections import deque
+
+DEFAULT_STRIPES = 64
+
+
+class _Stripe:
+    __slots__ = ("lock", "state", "banned_until", "next_sweep")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = {}          # tag -> limiter specific state
+        self.banned_until = {}   # tag -> timestamp
+        self.next_sweep = 0.0
+
+
+class _StripedLimiter(abc.ABC):
+    """Shared ban / striping / eviction logic. Subclasses implement _charge()."""
+
+    def __init__(self, max_requests: int, window: float, ban_duration: float,
+                 stripes: int = DEFAULT_STRIPES, clock=time.time):
+        self.max_requests = max_requests
+        self.window = window
+        self.ban_duration = ban_duration
+        self.clock = clock
+        self._stripes = [_Stripe() for _ in range(max(1, stripes))]
+
+    def _stripe(self, tag: str) -> _Stripe:
+        return self._stripes[hash(tag) % len(self._stripes)]
+
+    def check(self, tag: str, cost: int = 1):
+        """
+        Returns (allowed: bool, seconds_remaining: int)
+        """
+        now = self.clock()
+        s = self._stripe(tag)
+        with s.lock:
+            if now >= s.next_sweep:
+                self._sweep(s, now)
+
+            # Already banned?
+            until = s.banned_until.get(tag)
+            if until:
+                if now < until:
+                    return False, int(until - now)
+                del s.banned_until[tag]
+
+            if not self._charge(s.state, tag, now, cost):
+                s.banned_until[tag] = now + self.ban_duration
+                s.state.pop(tag, None)
+                return False, int(self.ban_duration)
+
+        return True, 0
+
+    @abc.abstractmethod
+    def _charge(self, state: dict, tag: str, now: float, cost: int) -> bool:
+        """Charge cost requests to tag's entry in state; False = over the limit."""
+
+    @abc.abstractmethod
+    def _idle(self, entry, now: float) -> bool:
+        """True if entry holds nothing the window still needs (safe to evict)."""
+
+    def _sweep(self, s: _Stripe, now: float):
+        """Drop tags with nothing left to remember. Called with s.lock held."""
+        for tag in [t for t, entry in s.state.items() if self._idle(entry, now)]:
+            del s.state[tag]
+        for tag in [t for t, until in s.banned_until.items() if until <= now]:
+            del s.banned_until[tag]
+        s.next_sweep = now + self.window
+
+    def tracked_tags(self) -> int:
+        """Number of tags currently holding state (for monitoring)."""
+        return sum(len(s.state.keys() | s.banned_until.keys()) for s in self._stripes)
+
+
+class DequeLimiter(_StripedLimiter):
+    """Exact sliding log: memory grows with max_requests per tag."""
+
+    def _charge(self, state, tag, now, cost):
+        q = state.get(tag)
+        if q is None:
+            q = state[tag] = deque()
+
+        # Clean old timestamps
+        while q and now - q[0] > self.window:
+            q.popleft()
+
+        q.extend([now] * cost)
+        return len(q) <= self.max_requests
+
+    def _idle(self, q, now):
+        return not q or now - q[-1] > self.window
+
+
+class SlidingWindowLimiter(_StripedLimiter):
+    """
+    Sliding-window counter. Per tag: [window_index, prev_count, curr_count].
+    Estimated rate = prev_count * (unused share of previous window) + curr_count.
+    """
+
+    def _charge(self, state, tag, now, cost):
+        idx = math.floor(now / self.window)
+        entry = state.get(tag)
+        if entry is None:
+            entry = state[tag] = [idx, 0, 0]
+        elif entry[0] != idx:
+            # Roll forward; anything older than one window is forgotten
+            entry[1] = entry[2] if entry[0] == idx - 1 else 0
+            entry[2] = 0
+            entry[0] = idx
+
+        elapsed = now - idx * self.window
+        estimate = entry[1] * (1.0 - elapsed / self.window) + entry[2]
+        entry[2] += cost
+        return estimate + cost <= self.max_requests
+
+    def _idle(self, entry, now):
+        # Both counters have aged out once we're two windows past entry[0]
+        return math.floor(now / self.window) > entry[0] + 1
+
+
+class TokenBucketLimiter(_StripedLimiter):
+    """
+    Token bucket. Per tag: [tokens, last_refill_time].
+    Allows bursts of up to max_requests, sustained max_requests / window.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate = self.max_requests / self.window
+
+    def _charge(self, state, tag, now, cost):
+        entry = state.get(tag)
+        if entry is None:
+            entry = state[tag] = [float(self.max_requests), now]
+        else:
+            entry[0] = min(self.max_requests, entry[0] + (now - entry[1]) * self.rate)
+            entry[1] = now
+
+        if entry[0] < cost:
+            return False
+        entry[0] -= cost
+        return True
+
+    def _idle(self, entry, now):
+        # A bucket that has refilled completely carries no information
+        return entry[0] + (now - entry[1]) * self.rate >= self.max_requests
+
+
+LIMITERS = {
+    "deque": DequeLimiter,
+    "sliding_window": SlidingWindowLimiter,
+    "token_bucket": TokenBucketLimiter,
+}
+
+
+def make_limiter(kind: str, max_requests: int, window: float, ban_duration: float,
+                 stripes: int = DEFAULT_STRIPES):
+    try:
+        cls = LIMITERS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown rate limiter {kind!r}, choose one of {sorted(LIMITERS)}")
+    return cls(max_requests, window, ban_duration, stripes=stripes)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+send_scheduler.py  (drift-free periodic send scheduling for attack1.py)
+
+Every schedule has a fixed period and its n-th slot is due at exactly
+start + phase + n * period, so time spent sending or sleeping never
+accumulates as drift. Waiting sleeps until SPIN_S before the deadline
+and busy-waits the rest, which keeps kHz rates accurate at the cost of
+one core while spinning (SPIN_S = 0 turns spinning off).
+
+When a send overruns and slots are missed, the late policy decides:
+
+    catch_up   send the missed slots back to back until on time again,
+               but never more than MAX_BACKLOG slots behind (older ones
+               are dropped and counted as skipped)
+    skip       drop every missed slot and continue with the current one
+
+Lateness (actual start of each send minus its deadline) is recorded in
+a preallocated ring buffer for the jitter statistics.
+"""
+
+import heapq
+import os
+import time
+
+import numpy as np
+
+SPIN_S = float(os.environ.get("SCHED_SPIN_US", "500")) / 1e6
+MAX_BACKLOG = int(os.environ.get("SCHED_MAX_BACKLOG", "100"))
+JITTER_SAMPLES = 100000
+
+POLICIES = ("catch_up", "skip")
+
+
+class JitterStats:
+    """Lateness samples (seconds) in a fixed-size ring, plus exact count / max."""
+
+    def __init__(self, size: int = JITTER_SAMPLES):
+        self.samples = np.zeros(size, dtype=np.float64)
+        self.count = 0
+        self.max = 0.0
+        self.total = 0.0
+
+    def add(self, lateness: float):
+        self.samples[self.count % len(self.samples)] = lateness
+        self.count += 1
+        self.total += lateness
+        if lateness > self.max:
+            self.max = lateness
+
+    def summary(self) -> dict:
+        """Mean / percentiles / max in microseconds (percentiles over the last JITTER_SAMPLES)."""
+        if not self.count:
+            return {"count": 0, "mean_us": 0.0, "p50_us": 0.0, "p99_us": 0.0, "max_us": 0.0}
+        recent = self.samples[:min(self.count, len(self.samples))]
+        p50, p99 = (float(v) for v in np.percentile(recent, [50, 99]))
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count * 1e6,
+            "p50_us": p50 * 1e6,
+            "p99_us": p99 * 1e6,
+            "max_us": self.max * 1e6,
+        }
+
+
+class PeriodicScheduler:
+    """
+    Runs send(key) for every slot of every schedule.
+
+        sched = PeriodicScheduler([("0018", 0.010), ("0034", 0.020)], policy="skip")
+        sched.run(lambda can_id: ..., duration=60)
+        sched.stats()   # sent / skipped / caught_up / jitter
+    """
+
+    def __init__(self, schedules, policy: str = "catch_up", max_backlog: int = MAX_BACKLOG,
+                 spin_s: float = SPIN_S):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}, got {policy!r}")
+        self.schedules = [(key, float(period)) for key, period in schedules]
+        if any(period <= 0 for _, period in self.schedules):
+            raise ValueError("periods must be > 0")
+        self.policy = policy
+        self.max_backlog = max(1, max_backlog)
+        self.spin_s = max(0.0, spin_s)
+        self.jitter = JitterStats()
+        self.sent = 0
+        self.skipped = 0
+        self.caught_up = 0       # slots sent a whole period or more late (catch_up)
+        self.elapsed = 0.0
+        self._stop = False
+
+    def stop(self):
+        """Make run() return after the current send (safe from another thread)."""
+        self._stop = True
+
+    def _wait_until(self, deadline: float):
+        clock = time.perf_counter
+        while True:
+            remaining = deadline - clock()
+            if remaining <= 0:
+                return
+            if remaining > self.spin_s:
+                time.sleep(remaining - self.spin_s)
+
+    def run(self, send, duration: float):
+        clock = time.perf_counter
+        start = clock()
+        end = start + duration
+        n = len(self.schedules)
+        # Phases spread the schedules over their periods instead of all firing at start
+        phases = [period * i / n for i, (_, period) in enumerate(self.schedules)]
+        heap = [(start + phases[i], i, 0) for i in range(n)]   # (deadline, schedule, slot)
+        heapq.heapify(heap)
+
+        while heap and not self._stop:
+            deadline, i, slot = heap[0]
+            if deadline >= end:
+                break
+            self._wait_until(deadline)
+
+            key, period = self.schedules[i]
+            now = clock()
+            behind = int((now - deadline) / period)   # whole slots missed
+            if behind >= 1:
+                if self.policy == "skip":
+                    drop = behind
+                else:
+                    drop = max(0, behind - self.max_backlog)
+                    self.caught_up += 1
+                slot += drop
+                self.skipped += drop
+                deadline = start + phases[i] + slot * period
+
+            self.jitter.add(now - deadline)
+            send(key)
+            self.sent += 1
+            slot += 1
+            heapq.heapreplace(heap, (start + phases[i] + slot * period, i, slot))
+
+        self.elapsed = clock() - start
+        return self.stats()
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "caught_up": self.caught_up,
+            "jitter": self.jitter.summary(),
+        }
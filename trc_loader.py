@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+trc_loader.py  (vectorized TRC / CSV dataset parsing for attack1.py)
+
+Parses PEAK-style v1.x trace lines
+
+    643935)    308547.5  Rx         01F1  8  00 52 EF 00 0F EC D0 0E
+
+with NumPy over whole byte chunks instead of split()/int() per line, and
+returns column arrays:
+
+    ids      uint32  (n,)     arbitration id value
+    id_lens  uint8   (n,)     number of hex digits in the ID token (so "0018"
+                              keeps its leading zeros when turned back into a key)
+    dlc      uint8   (n,)
+    data     uint8   (n, 8)   payload, zero padded
+    ts       float64 (n,)     time offset in seconds (the trace stores ms), NaN
+                              if unreadable; taken from the token after the
+                              message number, so v1.3 files with a bus column work
+
+Acceptance rules match the old line-by-line parser: comment lines (';' or
+'//') and lines with fewer than 6 tokens are skipped, the first Rx/Tx token
+is followed by ID and DLC, data tokens are read until the first non-hex
+token (max 8), and lines with fewer data bytes than DLC are dropped.
+"""
+
+import csv
+import logging
+import os
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+CHUNK_SIZE = 4 * 1024 * 1024    # bytes per vectorized parse (peak memory ~15x this)
+RANGE_SIZE = 64 * 1024 * 1024   # bytes per process-pool task (load_trc workers > 1)
+_PAD = 32                       # sentinel newlines after each chunk
+
+NL = ord("\n")
+
+_HEX = np.full(256, 255, dtype=np.uint8)
+for _i, _c in enumerate(b"0123456789"):
+    _HEX[_c] = _i
+for _i, _c in enumerate(b"abcdef"):
+    _HEX[_c] = 10 + _i
+    _HEX[_c - 32] = 10 + _i
+
+_DEC = np.full(256, 255, dtype=np.uint8)
+for _i, _c in enumerate(b"0123456789"):
+    _DEC[_c] = _i
+
+_LOWER = np.arange(256, dtype=np.uint8)
+_LOWER[ord("A"):ord("Z") + 1] += 32
+
+
+def empty_columns():
+    return (
+        np.zeros(0, dtype=np.uint32),
+        np.zeros(0, dtype=np.uint8),
+        np.zeros(0, dtype=np.uint8),
+        np.zeros((0, 8), dtype=np.uint8),
+        np.zeros(0, dtype=np.float64),
+    )
+
+
+def parse_trc_chunk(buf: bytes):
+    """
+    Parse whole lines of a TRC file. `buf` should end at a line boundary
+    (a trailing partial line is parsed as if it ended there).
+    Returns (ids, id_lens, dlc, data, ts) in file order.
+
+    Works on token boundaries: one pass over the bytes finds where every
+    whitespace-separated token starts and ends, everything after that is
+    per-token / per-line array arithmetic.
+    """
+    if not buf:
+        return empty_columns()
+
+    a = np.frombuffer(buf + b"\n" * _PAD, dtype=np.uint8)
+
+    # Token = maximal run of bytes above ' ' (space, tab, CR, LF all separate)
+    is_end = a <= 32
+    edges = np.diff(is_end.view(np.int8))
+    tok_s = np.flatnonzero(edges == -1) + 1
+    tok_e = np.flatnonzero(edges == 1) + 1
+    if not is_end[0]:
+        tok_s = np.concatenate([[0], tok_s])
+    if len(tok_s) == 0:
+        return empty_columns()
+    n_tok = len(tok_s)
+    tok_len = tok_e - tok_s
+
+    # Line index of each token: count the newlines in front of it
+    nl_pos = np.flatnonzero(a == NL)
+    marks = np.bincount(np.searchsorted(tok_s, nl_pos), minlength=n_tok + 1)[:n_tok]
+    tok_line = np.cumsum(marks)
+
+    # Lines: first token (comment check) and token count
+    lines, line_first, line_ntok = np.unique(tok_line, return_index=True, return_counts=True)
+
+    # First Rx / Tx token of each line
+    c0 = _LOWER[a[tok_s]]
+    c1 = _LOWER[a[tok_s + 1]]
+    is_rx = (tok_len == 2) & ((c0 == ord("r")) | (c0 == ord("t"))) & (c1 == ord("x"))
+    rx = np.flatnonzero(is_rx)
+    rx_line, first = np.unique(tok_line[rx], return_index=True)
+    rx = rx[first]
+
+    # Skip comments and short lines
+    li = np.searchsorted(lines, rx_line)
+    first_char = a[tok_s[line_first[li]]]
+    keep = (first_char != ord(";")) & (first_char != ord("/")) & (line_ntok[li] >= 6)
+    rx, li = rx[keep], li[keep]
+    # Index of the last token on each Rx line
+    line_last = line_first[li] + line_ntok[li] - 1
+
+    def tok(offset):
+        """(start, length) of token rx+offset, length 0 if it's past the end of the line."""
+        t = np.minimum(rx + offset, line_last)
+        return tok_s[t], np.where(rx + offset <= line_last, tok_len[t], 0)
+
+    # ID token (hex, leading zeros kept through id_lens)
+    id_s, id_len = tok(1)
+    ok = (id_len >= 1) & (id_len <= 8)
+    ids = np.zeros(len(rx), dtype=np.uint32)
+    for k in range(8):
+        inside = k < id_len
+        v = _HEX[a[id_s + np.minimum(k, id_len)]]
+        ok &= ~inside | (v != 255)
+        ids = np.where(inside & (v != 255), ids * 16 + v, ids)
+
+    # DLC token (decimal)
+    dlc_s, dlc_len = tok(2)
+    ok &= (dlc_len >= 1) & (dlc_len <= 2)
+    dlc = np.zeros(len(rx), dtype=np.int32)
+    for k in range(2):
+        inside = k < dlc_len
+        v = _DEC[a[dlc_s + np.minimum(k, dlc_len)]]
+        ok &= ~inside | (v != 255)
+        dlc = np.where(inside & (v != 255), dlc * 10 + v, dlc)
+
+    # Data tokens until the first one that isn't 1-2 hex digits
+    data = np.zeros((len(rx), 8), dtype=np.uint8)
+    count = np.zeros(len(rx), dtype=np.int32)
+    alive = np.ones(len(rx), dtype=bool)
+    for j in range(8):
+        s, length = tok(3 + j)
+        hi = _HEX[a[s]]
+        lo = _HEX[a[s + 1]]
+        one = (length == 1) & (hi != 255)
+        two = (length == 2) & (hi != 255) & (lo != 255)
+        alive &= one | two
+        byte = np.where(two, hi.astype(np.int32) * 16 + lo, hi).astype(np.uint8)
+        data[:, j] = np.where(alive, byte, 0)
+        count += alive
+
+    ok &= count >= dlc
+
+    # Time offset (decimal ms, at most one '.'), second token of the line
+    t_idx = line_first[li] + 1
+    t_s = tok_s[t_idx]
+    t_len = np.where(t_idx < rx, tok_len[t_idx], 0)
+    t_ok = t_len >= 1
+    mant = np.zeros(len(rx), dtype=np.float64)
+    frac = np.zeros(len(rx), dtype=np.int32)
+    seen_dot = np.zeros(len(rx), dtype=bool)
+    for k in range(min(int(t_len.max(initial=0)), 24)):
+        inside = k < t_len
+        c = a[t_s + np.minimum(k, t_len)]
+        v = _DEC[c]
+        digit = inside & (v != 255)
+        dot = inside & (c == ord(".")) & ~seen_dot
+        t_ok &= ~inside | digit | dot
+        mant = np.where(digit, mant * 10 + v, mant)
+        frac += digit & seen_dot
+        seen_dot |= dot
+    t_ok &= t_len <= 24
+    ts = np.where(t_ok, mant / 10.0 ** frac / 1000.0, np.nan)
+
+    return ids[ok], id_len[ok].astype(np.uint8), dlc[ok].astype(np.uint8), data[ok], ts[ok]
+
+
+def id_keys(ids: np.ndarray, id_lens: np.ndarray) -> np.ndarray:
+    """One uint64 per row combining value and digit count (unique per ID string)."""
+    return ids.astype(np.uint64) | (id_lens.astype(np.uint64) << np.uint64(32))
+
+
+def key_to_str(key: int) -> str:
+    key = int(key)
+    return f"{key & 0xFFFFFFFF:0{key >> 32}X}"
+
+
+def apply_cap(keys: np.ndarray, cap: int, seen: dict) -> np.ndarray:
+    """
+    Boolean mask keeping the first `cap` rows per key, counting rows already
+    kept from earlier chunks in `seen` (updated in place).
+    """
+    if cap is None or len(keys) == 0:
+        return np.ones(len(keys), dtype=bool)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    uniq, group_start, group_size = np.unique(sorted_keys, return_index=True, return_counts=True)
+    prior = np.array([seen.get(int(u), 0) for u in uniq], dtype=np.int64)
+    rank = np.arange(len(keys)) - np.repeat(group_start, group_size) + np.repeat(prior, group_size)
+    mask = np.empty(len(keys), dtype=bool)
+    mask[order] = rank < cap
+    for u, p, n in zip(uniq, prior, group_size):
+        seen[int(u)] = min(cap, int(p) + int(n))
+    return mask
+
+
+def _iter_line_chunks(f, start: int, end: int, chunk_size: int):
+    """Yield the bytes of [start, end) in pieces of about chunk_size that end on a newline."""
+    f.seek(start)
+    remaining = end - start
+    carry = b""
+    while remaining > 0:
+        block = f.read(min(chunk_size, remaining))
+        if not block:
+            break
+        remaining -= len(block)
+        buf = carry + block
+        cut = buf.rfind(b"\n") + 1
+        if cut == 0:
+            carry = buf
+            continue
+        carry = buf[cut:]
+        yield buf[:cut]
+    if carry:
+        yield carry
+
+
+def _parse_range(path: str, start: int, end: int, cap: int, chunk_size: int, log: bool = False):
+    """
+    Parse one line-aligned byte range. Returns (columns, stats) with at
+    most `cap` rows per ID, the first ones in file order.
+    """
+    parts = []
+    seen = {}
+    stats = {"bytes": 0, "lines": 0, "parsed": 0, "kept": 0}
+    with open(path, "rb") as f:
+        for buf in _iter_line_chunks(f, start, end, chunk_size):
+            columns = parse_trc_chunk(buf)
+            keep = apply_cap(id_keys(columns[0], columns[1]), cap, seen)
+            parts.append(tuple(c[keep] for c in columns))
+
+            stats["bytes"] += len(buf)
+            stats["lines"] += buf.count(b"\n")
+            stats["parsed"] += len(keep)
+            stats["kept"] += int(keep.sum())
+            if log:
+                _log_progress(stats)
+    return merge_columns(parts), stats
+
+
+def _log_progress(stats: dict):
+    logging.info(f"Уншсан: {stats['bytes'] / 1e6:,.0f} MB | "
+                 f"Хадгалсан: {stats['kept']:,} | Алгассан: {stats['parsed'] - stats['kept']:,}")
+
+
+def split_ranges(path: str, range_size: int = RANGE_SIZE):
+    """[(start, end), ...] of about range_size bytes each, every boundary just after a newline."""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        pos = range_size
+        while pos < size:
+            f.seek(pos - 1)
+            f.readline()           # finish the line that byte pos-1 is on
+            pos = f.tell()
+            if pos >= size:
+                break
+            bounds.append(pos)
+            pos += range_size
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def load_trc(path: str, cap: int = None, chunk_size: int = CHUNK_SIZE,
+             workers: int = 1, range_size: int = RANGE_SIZE):
+    """
+    Parse a whole TRC file in chunks. `cap` keeps at most that many messages
+    per ID (first ones in file order), applied after each chunk is parsed.
+    Returns (ids, id_lens, dlc, data, ts, stats).
+
+    workers > 1 (0 = one per CPU) parses line-aligned byte ranges of
+    range_size in a process pool. Each range is capped on its own, then the
+    ranges are merged in file order with the cap applied again, so the
+    result is identical to the single-process one.
+    """
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    ranges = split_ranges(path, range_size) if workers > 1 else [(0, os.path.getsize(path))]
+    if workers <= 1 or len(ranges) <= 1:
+        columns, stats = _parse_range(path, 0, os.path.getsize(path), cap, chunk_size, log=True)
+        return columns + (stats,)
+
+    parts = []
+    seen = {}
+    stats = {"bytes": 0, "lines": 0, "parsed": 0, "kept": 0}
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        jobs = [pool.submit(_parse_range, path, start, end, cap, chunk_size) for start, end in ranges]
+        for job in jobs:   # file order, whatever order they finish in
+            columns, part_stats = job.result()
+            keep = apply_cap(id_keys(columns[0], columns[1]), cap, seen)
+            parts.append(tuple(c[keep] for c in columns))
+
+            for k in ("bytes", "lines", "parsed"):
+                stats[k] += part_stats[k]
+            stats["kept"] += int(keep.sum())
+            _log_progress(stats)
+
+    return merge_columns(parts) + (stats,)
+
+
+def merge_columns(parts):
+    if not parts:
+        return empty_columns()
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+def load_csv(path: str):
+    """CSV with ID, LEN, D1..D8 columns (hex). Returns (ids, id_lens, dlc, data, ts), ts all NaN."""
+    id_strs, lens, cols = [], [], [[] for _ in range(8)]
+    with open(path, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            id_strs.append(row["ID"].strip().upper())
+            lens.append(row["LEN"])
+            for i in range(8):
+                cols[i].append(row.get(f"D{i + 1}", "0") or "0")
+
+    if not id_strs:
+        return empty_columns()
+
+    ids = np.array([int(s, 16) for s in id_strs], dtype=np.uint32)
+    id_lens = np.array([len(s) for s in id_strs], dtype=np.uint8)
+    dlc = np.array(lens, dtype=np.int64).astype(np.uint8)
+    data = np.empty((len(ids), 8), dtype=np.uint8)
+    for i in range(8):
+        data[:, i] = np.array([int(x, 16) for x in cols[i]], dtype=np.uint8)
+    return ids, id_lens, dlc, data, np.full(len(ids), np.nan)
+
+
+def index_by_key(keys: np.ndarray) -> dict:
+    """{key: row indices (file order)} using one stable sort."""
+    order = np.argsort(keys, kind="stable")
+    uniq, starts = np.unique(keys[order], return_index=True)
+    bounds = np.append(starts, len(order))
+    return {int(u): order[bounds[i]:bounds[i + 1]] for i, u in enumerate(uniq)}
+
+
+# -------- dict views for code written against the old list-of-dicts loader --------
+class MessageList(Sequence):
+    """
+    Read-only list of {'id', 'dlc', 'data'} dicts over the column arrays
+    (all rows, or only `rows`). Dicts are built on access, so holding the
+    view costs nothing; `data` is a fresh list each time.
+    """
+
+    def __init__(self, columns, rows=None, names=None):
+        self.ids, self.id_lens, self.dlc, self.data = columns[:4]
+        self.rows = rows
+        self._names = {} if names is None else names   # key -> ID string cache
+
+    def __len__(self):
+        return len(self.dlc) if self.rows is None else len(self.rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        row = i if self.rows is None else self.rows[i]
+        key = int(self.ids[row]) | int(self.id_lens[row]) << 32
+        name = self._names.get(key)
+        if name is None:
+            name = self._names[key] = key_to_str(key)
+        return {"id": name, "dlc": int(self.dlc[row]), "data": self.data[row].tolist()}
+
+
+class MessagesById(Mapping):
+    """{ID string: MessageList} built from one stable sort of the ID column."""
+
+    def __init__(self, columns, index: dict = None):
+        self.columns = columns
+        if index is None:
+            index = index_by_key(id_keys(columns[0], columns[1]))
+        self._names = {key: key_to_str(key) for key in index}
+        self.rows = {self._names[key]: rows for key, rows in index.items()}
+        self._lists = {}
+
+    def __getitem__(self, can_id: str):
+        view = self._lists.get(can_id)
+        if view is None:
+            view = self._lists[can_id] = MessageList(self.columns, self.rows[can_id], self._names)
+        return view
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
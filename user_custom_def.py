@@ -14,14 +14,18 @@ from base_IDS import run_forwarder
 
 def handle_frame(msg: can.Message, out_bus: can.BusABC, build_record):
 
-#SEND MESSAGE BY
-'''
-msg = can.Message(
-        arbitration_id=can_id,
-        data=data_bytes,
-        is_extended_id=False
-        )
-'''
+    #SEND MESSAGE BY
+    '''
+    msg = can.Message(
+            arbitration_id=can_id,
+            data=data_bytes,
+            is_extended_id=False
+            )
+    '''
+
+    # Built-in timing detector (ids_detector.py), e.g.
+    #   from base_IDS import detector
+    #   if detector.observe(msg) == "injection": return None
 
     try:
         out_bus.send(msg)
@@ -33,5 +37,18 @@ msg = can.Message(
     return record
 
 
+# Optional batch version: gets every burst of received frames as one list
+# (use run_forwarder(handle_frame, user_handle_frames=handle_frames)).
+#
+# def handle_frames(batch, out_bus: can.BusABC, build_record):
+#     records = []
+#     for msg in batch:
+#         out_bus.send(msg)
+#         records.append(build_record(msg))
+#     return records
+
+
 if __name__ == "__main__":
+    # Plain ID / DLC / byte-mask rules can go in a rule file instead
+    # (see frame_filter.py): run_forwarder(handle_frame, rules="rules.json")
     run_forwarder(handle_frame)